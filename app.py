@@ -1,392 +1,110 @@
 import streamlit as st
-import requests
 import datetime
-import json
-import os
-from PIL import Image
+import time
 
 # --- 1. 設定頁面與 CSS (App-Like UI) ---
-st.set_page_config(page_title="Hokkaido Trip Dec 2025", layout="centered", page_icon="❄️")
-
-# 配色定義 (截圖取色)
-COLORS = {
-    'bg_main': '#F9F8F6',       # 背景
-    'surface': '#FFFFFF',       # 卡片/未選中日期
-    'text_primary': '#4A3B32',  # 深棕色主文字 (截圖風格)
-    'text_secondary': '#9C8E7E',# 淺灰褐
-    'accent_dark': '#3E3A36',   # 底部導覽列背景 / 選中日期背景
-    'accent_gold': '#DEB887',   # 點綴金
-    'line_light': '#E0DCD8',    # 線條
-    'selected_text': '#FFFFFF', # 選中文字色
-}
-
-# 注入 CSS
-st.markdown(f"""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Noto+Serif+TC:wght@400;600;700&family=Shippori+Mincho:wght@400;500;700&display=swap');
-
-    /* 1. 全局設定 */
-    :root {{
-        --primary-color: {COLORS['accent_dark']};
-        --background-color: {COLORS['bg_main']};
-        --secondary-background-color: {COLORS['surface']};
-        --text-color: {COLORS['text_primary']};
-    }}
-
-    .stApp {{
-        background-color: {COLORS['bg_main']} !important;
-        font-family: 'Shippori Mincho', 'Noto Serif TC', serif;
-        color: {COLORS['text_primary']} !important;
-        padding-bottom: 100px; /* 為了避開底部導覽列 */
-    }}
-    
-    h1, h2, h3, h4, h5, h6, p, div, span, label, li {{
-        color: {COLORS['text_primary']} !important;
-    }}
+st.set_page_config(layout="centered", page_icon="❄️")
 
-    #MainMenu, footer, header {{visibility: hidden;}}
+# 效能計時 (?perf=1 或 PERF_PANEL=1 開啟；關閉時幾乎沒有成本)
+import perf
+PERF_ENABLED = perf.begin_run(st.query_params.get("perf") or st.query_params.get("debug"))
 
-    /* -----------------------------------------
-       ★ 底部固定導覽列 (Floating Bottom Bar) ★
-       ----------------------------------------- */
-    
-    /* 定位容器 */
-    .bottom-nav-container {{
-        position: fixed;
-        bottom: 30px;
-        left: 50%;
-        transform: translateX(-50%);
-        z-index: 9999;
-        width: 90%;
-        max-width: 400px;
-        background-color: {COLORS['accent_dark']};
-        border-radius: 50px;
-        padding: 10px 20px;
-        box-shadow: 0 10px 25px rgba(0,0,0,0.2);
-        display: flex;
-        justify-content: space-around;
-        align-items: center;
-    }}
-
-    /* 為了讓 Streamlit 的按鈕能放進去，我們需要針對特定的 key 做 CSS Hack */
-    /* 這裡我們會在 Python 端用特殊的容器包裝底部按鈕 */
-
-    div[data-testid="stHorizontalBlock"][gap="large"] {{
-        background-color: {COLORS['accent_dark']};
-        border-radius: 40px;
-        padding: 10px 15px;
-        position: fixed;
-        bottom: 30px;
-        left: 50%;
-        transform: translateX(-50%);
-        z-index: 999;
-        width: 90%;
-        max-width: 380px;
-        box-shadow: 0 8px 20px rgba(62, 58, 54, 0.3);
-        justify-content: space-around !important;
-    }}
-
-    /* 底部按鈕樣式 */
-    div[data-testid="stHorizontalBlock"][gap="large"] button {{
-        background-color: transparent !important;
-        border: none !important;
-        color: #888 !important; /* 未選中顏色 */
-        font-size: 1.5rem !important;
-        padding: 0 !important;
-        margin: 0 !important;
-        box-shadow: none !important;
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-    }}
-    
-    /* 底部按鈕 - 選中/懸停 */
-    div[data-testid="stHorizontalBlock"][gap="large"] button:hover,
-    div[data-testid="stHorizontalBlock"][gap="large"] button:focus {{
-        color: #FFFFFF !important; /* 選中變白 */
-    }}
-    
-    /* -----------------------------------------
-       ★ 日期選擇器 (In-Page Date Selector) ★
-       ----------------------------------------- */
-    
-    /* 日期捲軸容器 */
-    div[data-testid="stHorizontalBlock"][gap="medium"] {{
-        overflow-x: auto !important;
-        flex-wrap: nowrap !important;
-        padding-bottom: 10px;
-        gap: 10px !important;
-        /* 隱藏捲軸 */
-        -webkit-overflow-scrolling: touch;
-        scrollbar-width: none; 
-    }}
-    div[data-testid="stHorizontalBlock"][gap="medium"]::-webkit-scrollbar {{ 
-        display: none; 
-    }}
-
-    /* 日期按鈕通用樣式 (方圓形) */
-    div[data-testid="stHorizontalBlock"][gap="medium"] button {{
-        border-radius: 16px !important; /* 方圓角 */
-        width: 55px !important;
-        height: 65px !important;
-        min-width: 55px !important;
-        padding: 5px !important;
-        display: flex;
-        flex-direction: column;
-        align-items: center;
-        justify-content: center;
-        border: 1px solid #EEE !important;
-        transition: all 0.2s ease;
-        line-height: 1.2 !important;
-    }}
-
-    /* 日期按鈕 - 未選中 */
-    div[data-testid="stHorizontalBlock"][gap="medium"] button[kind="secondary"] {{
-        background-color: #FFFFFF !important;
-        color: {COLORS['text_primary']} !important;
-        box-shadow: 0 2px 5px rgba(0,0,0,0.02) !important;
-    }}
-
-    /* 日期按鈕 - 選中 (Primary) - 深色背景 */
-    div[data-testid="stHorizontalBlock"][gap="medium"] button[kind="primary"] {{
-        background-color: {COLORS['accent_dark']} !important;
-        color: #FFFFFF !important;
-        border: 1px solid {COLORS['accent_dark']} !important;
-        box-shadow: 0 4px 12px rgba(62, 58, 54, 0.3) !important;
-    }}
-    /* 強制覆蓋內部文字顏色 */
-    div[data-testid="stHorizontalBlock"][gap="medium"] button[kind="primary"] p {{
-        color: #FFFFFF !important;
-    }}
-
-
-    /* -----------------------------------------
-       通用元件樣式 (卡片、按鈕)
-       ----------------------------------------- */
-
-    /* 標題樣式 */
-    .page-title {{
-        font-family: 'Shippori Mincho', serif;
-        font-size: 1.8rem;
-        font-weight: 600;
-        margin-top: 10px;
-        margin-bottom: 20px;
-    }}
-
-    /* 簡約卡片 */
-    .minimal-card {{
-        background: {COLORS['surface']};
-        border: 1px solid {COLORS['line_light']};
-        border-radius: 16px;
-        padding: 1.5rem;
-        margin-bottom: 1.2rem;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.02);
-    }}
-
-    /* 住宿卡片容器 */
-    div[data-testid="stVerticalBlockBorderWrapper"] {{
-        border-color: {COLORS['line_light']} !important;
-        border-radius: 16px !important;
-        background-color: {COLORS['surface']} !important;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.02);
-    }}
-    
-    /* 一般功能按鈕 */
-    .stButton button {{
-        height: auto !important;
-        padding: 8px 20px !important;
-        background-color: #FFFFFF !important;
-        border: 1px solid {COLORS['line_light']} !important;
-        color: {COLORS['text_secondary']} !important;
-        border-radius: 24px;
-        font-weight: 500 !important;
-    }}
-    .stButton button:hover {{
-        border-color: {COLORS['accent_gold']} !important;
-        color: {COLORS['accent_gold']} !important;
-    }}
-
-    /* Google Map Link */
-    a[href*="maps.google.com"] {{
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        background-color: #FFFFFF !important;
-        color: {COLORS['text_primary']} !important;
-        border: 1px solid {COLORS['line_light']} !important;
-        border-radius: 24px !important;
-        padding: 0.5rem 1rem !important;
-        text-decoration: none !important;
-        font-weight: 500 !important;
-        width: 100%;
-        box-shadow: 0 1px 2px rgba(0,0,0,0.05);
-        margin-bottom: 10px;
-    }}
-
-    /* Expander */
-    div[data-testid="stExpander"] {{
-        background-color: #FFFFFF !important;
-        border: 1px solid {COLORS['line_light']} !important;
-        color: {COLORS['text_primary']} !important;
-        box-shadow: none !important;
-        margin-top: 10px;
-    }}
-    div[data-testid="stExpander"] summary {{
-        background-color: transparent !important;
-        color: {COLORS['text_primary']} !important;
-    }}
-    div[data-testid="stExpander"] svg {{
-        fill: {COLORS['text_secondary']} !important;
-        color: {COLORS['text_secondary']} !important;
-    }}
-
-    /* Checkbox */
-    div[data-testid="stCheckbox"] label span[data-baseweb="checkbox"] {{
-        background-color: #FFFFFF !important;
-        border-color: {COLORS['line_light']} !important;
-    }}
-    div[data-testid="stCheckbox"] label[aria-checked="true"] span[data-baseweb="checkbox"] {{
-        background-color: {COLORS['accent_gold']} !important;
-        border-color: {COLORS['accent_gold']} !important;
-    }}
-
-    /* Timeline */
-    .timeline-point {{
-        width: 9px;
-        height: 9px;
-        background-color: {COLORS['text_primary']};
-        border-radius: 50%;
-        margin-right: 12px;
-        border: 2px solid {COLORS['bg_main']}; 
-    }}
-    .timeline-line {{
-        position: absolute;
-        left: 3px;
-        top: 24px;
-        bottom: -20px;
-        width: 1px;
-        background-color: {COLORS['line_light']};
-    }}
-    
-    /* Delete Btn */
-    .delete-btn button {{
-        border: none !important;
-        color: #E57373 !important;
-        padding: 0px 8px !important;
-        background: transparent !important;
-    }}
-    </style>
-""", unsafe_allow_html=True)
+# 配色與 CSS 是靜態資料，在 styles 模組裡每個 process 只建一次
+# 注入 CSS (每個配色只編譯一次，rerun 只送一個小 <link>)
+from styles import COLORS, stylesheet_tags
+with perf.span("css"):
+    st.markdown(stylesheet_tags(COLORS), unsafe_allow_html=True)
 
 # --- 2. 資料與狀態管理 ---
 # 初始化 Session State
 if 'view_tab' not in st.session_state: st.session_state.view_tab = 'home' # home, itinerary, packing
 if 'selected_day' not in st.session_state: st.session_state.selected_day = 0 # 0-4
-if 'tickets' not in st.session_state: st.session_state.tickets = {}
-if 'packing_list' not in st.session_state:
-    st.session_state.packing_list = [
-        { "category": "Documents", "items": ["護照", "VJW QR", "機票截圖"] },
-        { "category": "Clothing", "items": ["發熱衣", "防風外套", "毛帽"] },
-        { "category": "Electronics", "items": ["網卡", "行動電源", "充電線"] }
-    ]
-
-APP_DATA = {
-  "flight": { 
-    "outbound": { "code": "TR892", "time": "12:30", "arrival": "17:20" }, 
-    "inbound": { "code": "TR893", "time": "18:40", "arrival": "22:15" } 
-  },
-  "days": [
-    { 
-      "id": 0, "date": "08", "weekday": "MON", "full_date": "12/08 (一)", 
-      "location": "Sapporo", "coords": { "lat": 43.0618, "lon": 141.3545 }, 
-      "hotel": "JR-EAST METS", "hotel_note": "札幌站北口", 
-      "activities": [
-        { "time": "17:20", "text": "航班抵達 CTS", "type": "transport", "desc": "往 B1 搭 JR。", "guideText": "新千歲機場結構簡單...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=New+Chitose+Airport" },
-        { "time": "19:45", "text": "飯店 Check-in", "type": "hotel", "desc": "JR-EAST METS", "guideText": "這間飯店最大優勢是...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=JR-EAST+HOTEL+METS+SAPPORO", "contact": "+81-11-729-0011" },
-        { "time": "20:15", "text": "晚餐：湯咖哩", "type": "food", "desc": "Suage+ / GARAKU", "menu": ["知床雞野菜湯咖哩", "起司飯"], "notes": ["不可預約"], "guideText": "北海道靈魂美食...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Suage+Plus+Sapporo", "contact": "現場候位", "stayTime": "1.5 小時" },
-        { "time": "22:30", "text": "夜間咖啡", "type": "food", "desc": "ESPRESSO D WORKS", "menu": ["巴斯克起司蛋糕"], "notes": ["營業至24:00"], "guideText": "札幌有「收尾聖代」文化...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=ESPRESSO+D+WORKS+Sapporo", "contact": "營業至 23:30", "stayTime": "1 小時" }
-      ]
-    },
-    { 
-      "id": 1, "date": "09", "weekday": "TUE", "full_date": "12/09 (二)", 
-      "location": "Sapporo → Niseko", "coords": {"lat": 42.8048, "lon": 140.6874}, 
-      "hotel": "Park Hyatt Niseko", "hotel_note": "Ski-in Ski-out", 
-      "activities": [
-          { "time": "11:30", "text": "午餐：Uni Murakami", "type": "food", "desc": "海膽丼", "menu": ["生海膽丼"], "notes": ["建議訂位"], "guideText": "函館名店的分店...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Uni+Murakami+Sapporo", "contact": "011-290-1000", "stayTime": "1.5 小時" },
-          { "time": "15:00", "text": "JR 移動", "type": "transport", "desc": "往俱知安", "guideText": "這段鐵路風景極美...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Sapporo+Station" },
-          { "time": "18:00", "text": "Check-in", "type": "hotel", "desc": "Park Hyatt", "guideText": "二世谷頂級奢華代表...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Park+Hyatt+Niseko+Hanazono", "contact": "+81-136-27-1234" }
-      ]
-    },
-    { 
-      "id": 2, "date": "10", "weekday": "WED", "full_date": "12/10 (三)", 
-      "location": "Niseko", "coords": {"lat": 42.8048, "lon": 140.6874}, 
-      "hotel": "Park Hyatt Niseko", "hotel_note": "連泊 Day 2", 
-      "activities": [
-          { "time": "09:00", "text": "全日滑雪", "type": "activity", "desc": "粉雪天堂", "guideText": "Hanazono雪場對新手友善...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Niseko+Hanazono+Resort" },
-          { "time": "12:00", "text": "午餐：Hanazono EDGE", "type": "food", "desc": "雪場餐廳", "menu": ["蟹肉拉麵"], "notes": ["人潮眾多"], "guideText": "近年翻新的雪場餐廳...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Hanazono+EDGE", "contact": "無預約服務", "stayTime": "1 小時" },
-          { "time": "18:00", "text": "Hirafu 晚餐", "type": "food", "desc": "居酒屋/燒肉", "menu": ["成吉思汗烤肉"], "notes": ["需提前預約"], "guideText": "Hirafu是二世谷最熱鬧的區域...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Hirafu+Niseko+Restaurants", "contact": "需查閱特定餐廳", "stayTime": "2 小時" }
-      ]
-    },
-    { 
-      "id": 3, "date": "11", "weekday": "THU", "full_date": "12/11 (四)", 
-      "location": "Niseko", "coords": {"lat": 42.8048, "lon": 140.6874}, 
-      "hotel": "Park Hyatt Niseko", "hotel_note": "連泊 Day 3", 
-      "activities": [
-          { "time": "13:00", "text": "午餐：手工蕎麥麵", "type": "food", "desc": "Ichimura", "menu": ["鴨肉蕎麥麵"], "notes": ["Cash Only"], "guideText": "使用二世谷清甜泉水...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Niseko+Sobadokoro+Rakuichi", "contact": "0136-23-0603", "stayTime": "1 小時" },
-          { "time": "18:00", "text": "晚餐：China Kitchen", "type": "food", "desc": "飯店內中餐", "menu": ["北京烤鴨"], "notes": ["Smart Casual"], "guideText": "玩累了不想出門...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=China+Kitchen+Park+Hyatt+Niseko", "contact": "內線直撥餐廳", "stayTime": "2 小時" }
-      ]
-    },
-    { 
-      "id": 4, "date": "12", "weekday": "FRI", "full_date": "12/12 (五)", 
-      "location": "CTS Airport", "coords": {"lat": 42.7752, "lon": 141.6923}, 
-      "hotel": "Home Sweet Home", "hotel_note": "機場日", 
-      "activities": [
-          { "time": "09:20", "text": "巴士出發", "type": "transport", "desc": "前往機場", "guideText": "從二世谷搭巴士直達機場...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Niseko+Welcome+Center" },
-          { "time": "13:00", "text": "拉麵道場", "type": "food", "desc": "一幻 / 白樺山莊", "menu": ["鮮蝦鹽味拉麵"], "notes": ["行李需寄放"], "guideText": "機場國內線3樓的拉麵一級戰區...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=Hokkaido+Ramen+Dojo", "contact": "機場國內線 3F", "stayTime": "1 小時" },
-          { "time": "14:30", "text": "甜點 & 伴手禮巡禮", "type": "food", "desc": "國內線 2F 掃貨", "menu": ["北菓樓 夢不思議泡芙"], "notes": ["保冷袋必備"], "guideText": "新千歲機場國內線2F是伴手禮一級戰區！", "mapUrl": "https://www.google.com/maps/search/?api=1&query=New+Chitose+Airport+Domestic+Terminal+2F", "contact": "國內線 2F", "stayTime": "2.5 小時" },
-          { "time": "18:40", "text": "TR893 起飛", "type": "transport", "desc": "返台", "guideText": "酷航櫃台通常在起飛前3小時...", "mapUrl": "https://www.google.com/maps/search/?api=1&query=New+Chitose+Airport+International+Terminal" }
-      ]
-    }
-  ]
-}
+
+# 票券與行李清單存在共用的 SQLite (trip_store)，兩支手機看到同一份；變更只寫入該筆
+from trip_store import trip_store
+PACKING_EXPAND_LIMIT = 60
+
+# 行程資料放在 trips/<trip>/ 的 JSON 檔：啟動只讀索引，選到哪天才讀那天的 activities
+# 一個 server 可放多個行程，用 ?trip=<資料夾名稱> 選擇；沒給就是預設行程
+from trip_data import load_trip, trip_dir, list_trips, DEFAULT_TRIP_ID, DEFAULT_PACKING_LIST, load_packing_template, packing_templates, TripDataError
+try:
+    TRIP = load_trip(trip_dir(st.query_params.get("trip") or DEFAULT_TRIP_ID))
+except (OSError, TripDataError) as e:
+    st.error(f"行程資料讀取失敗：{e}")
+    st.markdown("  \n".join(f"[{t}](?trip={t})" for t in list_trips()))
+    st.stop()
+st.set_page_config(page_title=f"{TRIP.index['title']} · {TRIP.index['subtitle'].title()}")
+
+# 票券與行李清單依行程分開存放 (trip_store 的 trip 欄位)
+trip_store.adopt_legacy(DEFAULT_TRIP_ID)
+tickets = trip_store.tickets(TRIP.id)
+packing = trip_store.packing(TRIP.id)
+packing.seed(DEFAULT_PACKING_LIST)
 
 # --- 3. 核心功能函式 ---
-def get_weather(lat, lon):
-    try:
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m,weather_code&timezone=Asia%2FTokyo"
-        res = requests.get(url, timeout=2).json()
-        if 'current' in res:
-            temp = res['current']['temperature_2m']
-            code = res['current']['weather_code']
-            w_text = "陰"
-            if code == 0: w_text = "晴"
-            elif code in [1,2,3]: w_text = "多雲"
-            elif code in [61,63,65,80,81,82]: w_text = "雨"
-            elif code in [71,73,75,85,86]: w_text = "雪"
-            return temp, w_text
-        return None, None
-    except:
-        return -2, "雪(預測)"
-
-def get_exchange_rate():
-    try:
-        url = "https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@latest/v1/currencies/jpy.json"
-        res = requests.get(url, timeout=2).json()
-        rate = res['jpy']['twd']
-        return rate
-    except:
-        return 0.215
+# 天氣 (整趟行程一次的批次預報) / 匯率表走 providers 的 process 共用快取，rerun 不會每次打 API
+from providers import fetch_home_bundle, get_trip_forecast, current_weather, day_forecast, day_hourly, provider_cache, provider_client, get_fx_table
+from fx import format_money, find_prices
+# 背景預先抓取：整個 server 只啟動一次，在快取過期前刷新，頁面不必等上游
+import prefetch
+prefetch.start_prefetch()
+# 記下這個 session 的活動時間；閒置太久的 session 會釋放上傳檔、最後被關閉 (見 sessions.py)
+import sessions
+sessions.touch()
+
+# 首頁天氣直接取行程中的座標 (trip.json 的 home_weather)，和行程表共用同一次批次請求
+HOME_WEATHER_LOCATIONS = TRIP.home_weather
+
+def format_age(fetched_at):
+    # 資料實際的更新時間；None 代表從沒抓到過，畫面上是預估值
+    if fetched_at is None: return "預估值"
+    minutes = int((time.time() - fetched_at) // 60)
+    if minutes < 1: return "剛剛更新"
+    if minutes < 60: return f"{minutes} 分鐘前"
+    if minutes < 60 * 24: return f"{minutes // 60} 小時前"
+    return f"{minutes // (60 * 24)} 天前"
+
+# 價格換算：整張匯率表在 providers 快取 (每個 TTL 下載一次)，這裡一次換算多個金額
+PRICE_CURRENCIES = ("twd", "usd", "hkd")
+
+def render_price_converter(fx_table, key, amount_label="日圓金額"):
+    amount = st.number_input(amount_label, min_value=0, step=100, key=key, label_visibility="collapsed",
+                             placeholder="¥ 輸入價格換算", value=None)
+    if amount:
+        codes = [c for c in PRICE_CURRENCIES if c in fx_table]
+        converted = fx_table.convert_pairs([amount] * len(codes), ["jpy"] * len(codes), codes)
+        st.caption(f"{format_money(amount, 'jpy')} ≈ " + " · ".join(format_money(v, c) for v, c in zip(converted, codes)))
+
+def menu_price_notes(menu, fx_table):
+    # 菜單上寫了日圓價格的 ("¥1,200"、"850円")，整張卡片的價格一起換算成台幣
+    prices = [(n, p) for n, item in enumerate(menu) for p in find_prices(item)[:1]]
+    if not prices or "twd" not in fx_table:
+        return {}
+    converted = fx_table.convert([p for _, p in prices], "jpy", "twd")
+    return {n: format_money(v, 'twd') for (n, _), v in zip(prices, converted)}
+
+# 行程卡片 HTML 在 process 內只組一次 (依資料內容與配色做 key)
+from cards import ItineraryCards, fragment_cache
 
 # --- 4. 票券視窗 ---
+# 上傳的圖片縮圖壓縮後依 hash 存檔，session_state 只存 ref
+from ticket_images import store_ticket_image, image_path, TicketImageError
+
+# fragment / dialog 只重跑自己時不會經過最上面的 sessions.touch()，一律加上 @sessions.touched，
+# 一直在行程表、行李清單或票券視窗裡操作的 session 才不會被當成閒置
 @st.dialog("Digital Voucher")
+@sessions.touched
+@perf.timed("ticket_modal")
 def ticket_modal(ticket_key, title):
+    # dialog 本身就是 fragment：裡面的互動只重跑這個視窗，不會重跑整頁
     default_ticket = {"orderNumber": "", "url": "", "note": "", "image": None}
-    existing = st.session_state.tickets.get(ticket_key, default_ticket)
+    existing = tickets.get(ticket_key, default_ticket)
+    editing_key = f"is_editing_{ticket_key}"
     
-    if 'is_editing' not in st.session_state:
-        st.session_state.is_editing = not (existing.get("orderNumber") or existing.get("url"))
+    if editing_key not in st.session_state:
+        st.session_state[editing_key] = not (existing.get("orderNumber") or existing.get("url"))
 
-    if not st.session_state.is_editing:
+    if not st.session_state[editing_key]:
         st.markdown(f"""
         <div class="wallet-pass">
             <div class="pass-header">
@@ -412,32 +130,44 @@ def ticket_modal(ticket_key, title):
         """, unsafe_allow_html=True)
         
         if existing.get('image'):
-            st.image(existing['image'], caption="E-Ticket", use_container_width=True)
+            # 預設只送縮圖；放大時才送壓縮後的完整圖 (同內容同 URL，瀏覽器會快取)
+            st.image(image_path(existing['image'], thumb=True), caption="E-Ticket", use_container_width=True)
+            with st.expander("放大票券"):
+                st.image(image_path(existing['image']), use_container_width=True)
         if existing.get('url'): st.link_button("🔗 OPEN LINK", existing['url'], use_container_width=True)
         if st.button("Edit Voucher", key="edit_btn", use_container_width=True):
-            st.session_state.is_editing = True
-            st.rerun()
+            st.session_state[editing_key] = True
+            st.rerun(scope="fragment")
     else:
         st.markdown("### Edit Details")
         new_order = st.text_input("Confirmation No.", value=existing.get("orderNumber", ""))
         new_url = st.text_input("Link URL", value=existing.get("url", ""))
         new_note = st.text_area("Notes", value=existing.get("note", ""))
-        new_image = st.file_uploader("Upload Ticket Image", type=['png', 'jpg', 'jpeg'])
+        upload_key = f"{sessions.UPLOAD_KEY_PREFIX}{ticket_key}"
+        new_image = st.file_uploader("Upload Ticket Image", type=['png', 'jpg', 'jpeg'], key=upload_key)
         
         if st.button("Save Changes", type="primary", use_container_width=True):
-            final_image = new_image if new_image else existing.get('image')
-            st.session_state.tickets[ticket_key] = {"orderNumber": new_order, "url": new_url, "note": new_note, "image": final_image}
-            st.session_state.is_editing = False
-            st.rerun()
+            final_image = existing.get('image')
+            if new_image:
+                try:
+                    final_image = store_ticket_image(new_image.getvalue())
+                except TicketImageError:
+                    st.error("無法讀取這張圖片，請重新上傳 PNG / JPG。")
+                    return
+            tickets.put(ticket_key, {"orderNumber": new_order, "url": new_url, "note": new_note, "image": final_image})
+            st.session_state[editing_key] = False
+            # 頁面上沒有顯示票券內容，只需重跑視窗切回票券檢視
+            st.rerun(scope="fragment")
 
 # --- 5. 頁面元件與邏輯 ---
 
+@perf.timed("render_home_page")
 def render_home_page():
     # Home Header
     st.markdown(f"""
     <div style='text-align:center; padding: 40px 0 20px;'>
-        <h1 style='font-family: "Shippori Mincho", serif; font-size: 2.5rem; margin-bottom: 8px; letter-spacing: 1px; font-weight: 500;'>Hokkaido</h1>
-        <p style='color:{COLORS['text_secondary']}; letter-spacing: 0.3em; font-size: 0.8rem; font-weight: 400;'>DECEMBER 2025</p>
+        <h1 style='font-family: "Shippori Mincho", serif; font-size: 2.5rem; margin-bottom: 8px; letter-spacing: 1px; font-weight: 500;'>{TRIP.index['title']}</h1>
+        <p style='color:{COLORS['text_secondary']}; letter-spacing: 0.3em; font-size: 0.8rem; font-weight: 400;'>{TRIP.index['subtitle']}</p>
         <div style="width: 60px; height: 1px; background-color: {COLORS['line_light']}; margin: 20px auto;"></div>
     </div>
     """, unsafe_allow_html=True)
@@ -453,9 +183,14 @@ def render_home_page():
     </div></a>""", unsafe_allow_html=True)
 
     # Info Grid
-    rate = get_exchange_rate()
-    temp1, weather1 = get_weather(43.06, 141.35)
-    temp2, weather2 = get_weather(42.80, 140.68)
+    with perf.span("fetch_home_bundle"):
+        info = fetch_home_bundle(TRIP.days)
+    rate = info['rate']
+    weather_rows = "".join(
+        f"<div style=\"display:flex; justify-content:space-between; font-size:0.8rem; margin-bottom:4px;\"><span>{name}</span><strong>{current_weather(info['forecast'], coords)[0]}°</strong></div>"
+        for name, coords in HOME_WEATHER_LOCATIONS)
+    out_date = datetime.date.fromisoformat(TRIP.days[0]['iso_date']).strftime('%b %d').upper()
+    in_date = datetime.date.fromisoformat(TRIP.days[-1]['iso_date']).strftime('%b %d').upper()
 
     c1, c2 = st.columns(2)
     with c1:
@@ -463,18 +198,19 @@ def render_home_page():
         <div style="background:{COLORS['surface']}; border-radius:16px; padding:15px; border:1px solid {COLORS['line_light']}; height:100%;">
             <div style="font-size:0.7rem; font-weight:700; color:{COLORS['text_secondary']}; margin-bottom:6px;">EXCHANGE</div>
             <div style="font-family:'Shippori Mincho', serif; font-size:1.6rem; font-weight:600;">{rate:.4f}</div>
-            <div style="font-size:0.7rem; color:{COLORS['text_secondary']};">JPY / TWD</div>
+            <div style="font-size:0.7rem; color:{COLORS['text_secondary']};">JPY / TWD · {format_age(info['rate_at'])}</div>
         </div>
         """, unsafe_allow_html=True)
     with c2:
         st.markdown(f"""
         <div style="background:{COLORS['surface']}; border-radius:16px; padding:15px; border:1px solid {COLORS['line_light']}; height:100%;">
             <div style="font-size:0.7rem; font-weight:700; color:{COLORS['text_secondary']}; margin-bottom:6px;">WEATHER</div>
-            <div style="display:flex; justify-content:space-between; font-size:0.8rem; margin-bottom:4px;"><span>Sapporo</span><strong>{temp1}°</strong></div>
-            <div style="display:flex; justify-content:space-between; font-size:0.8rem;"><span>Niseko</span><strong>{temp2}°</strong></div>
+            {weather_rows}
+            <div style="font-size:0.7rem; color:{COLORS['text_secondary']}; margin-top:4px;">{format_age(info['forecast_at'])}</div>
         </div>
         """, unsafe_allow_html=True)
-    
+
+    render_fx_converter(info['fx'])
     st.write("")
 
     # Flights
@@ -482,11 +218,11 @@ def render_home_page():
     st.markdown(f"<h3 style='font-size:1rem; margin-bottom:1rem; font-weight: 500; border-bottom: 1px solid {COLORS['line_light']}; padding-bottom: 8px;'>✈️ 航班</h3>", unsafe_allow_html=True)
     f1, f2 = st.columns(2)
     with f1:
-        st.markdown(f"<div style='text-align:center;'><div style='font-size:0.8rem; color:{COLORS['text_secondary']};'>DEC 08 (OUT)</div><div style='font-size:1.4rem; font-weight:500; font-family:\"Shippori Mincho\", serif;'>{APP_DATA['flight']['outbound']['time']}</div><div style='font-size:0.8rem; color:{COLORS['text_secondary']};'>↓</div><div style='font-size:1.4rem; font-weight:500; font-family:\"Shippori Mincho\", serif;'>{APP_DATA['flight']['outbound']['arrival']}</div><div style='font-size:0.9rem; font-weight:bold; margin-top:4px;'>{APP_DATA['flight']['outbound']['code']}</div></div>", unsafe_allow_html=True)
+        st.markdown(f"<div style='text-align:center;'><div style='font-size:0.8rem; color:{COLORS['text_secondary']};'>{out_date} (OUT)</div><div style='font-size:1.4rem; font-weight:500; font-family:\"Shippori Mincho\", serif;'>{TRIP.flight['outbound']['time']}</div><div style='font-size:0.8rem; color:{COLORS['text_secondary']};'>↓</div><div style='font-size:1.4rem; font-weight:500; font-family:\"Shippori Mincho\", serif;'>{TRIP.flight['outbound']['arrival']}</div><div style='font-size:0.9rem; font-weight:bold; margin-top:4px;'>{TRIP.flight['outbound']['code']}</div></div>", unsafe_allow_html=True)
         st.write("")
         if st.button("Ticket", key="fw_w", use_container_width=True): ticket_modal("flight_wei", "Flight Out")
     with f2:
-        st.markdown(f"<div style='text-align:center; border-left:1px solid {COLORS['line_light']};'><div style='font-size:0.8rem; color:{COLORS['text_secondary']};'>DEC 12 (IN)</div><div style='font-size:1.4rem; font-weight:500; font-family:\"Shippori Mincho\", serif;'>{APP_DATA['flight']['inbound']['time']}</div><div style='font-size:0.8rem; color:{COLORS['text_secondary']};'>↓</div><div style='font-size:1.4rem; font-weight:500; font-family:\"Shippori Mincho\", serif;'>{APP_DATA['flight']['inbound']['arrival']}</div><div style='font-size:0.9rem; font-weight:bold; margin-top:4px;'>{APP_DATA['flight']['inbound']['code']}</div></div>", unsafe_allow_html=True)
+        st.markdown(f"<div style='text-align:center; border-left:1px solid {COLORS['line_light']};'><div style='font-size:0.8rem; color:{COLORS['text_secondary']};'>{in_date} (IN)</div><div style='font-size:1.4rem; font-weight:500; font-family:\"Shippori Mincho\", serif;'>{TRIP.flight['inbound']['time']}</div><div style='font-size:0.8rem; color:{COLORS['text_secondary']};'>↓</div><div style='font-size:1.4rem; font-weight:500; font-family:\"Shippori Mincho\", serif;'>{TRIP.flight['inbound']['arrival']}</div><div style='font-size:0.9rem; font-weight:bold; margin-top:4px;'>{TRIP.flight['inbound']['code']}</div></div>", unsafe_allow_html=True)
         st.write("")
         if st.button("Ticket", key="fi_c", use_container_width=True): ticket_modal("flight_chien", "Flight In")
     st.markdown('</div>', unsafe_allow_html=True)
@@ -507,137 +243,278 @@ def render_home_page():
     """, unsafe_allow_html=True)
 
 
+def select_day(i):
+    st.session_state.selected_day = i
+
+
+# 全文搜尋：索引在 search 模組依行程版本快取，查詢只做 n-gram 交集
+from search import trip_index, snippet
+# 時間衝突 (停留時間超過下一站、轉乘太趕) 依每天的檔案版本快取，只重算有改的那天
+from schedule import schedule_checker
+# AI 導覽 (google-generativeai)：依內容 hash 永久快取，一天一個請求；沒設定 API key 時不顯示
+from guide import guide_service
+import html
+
+def render_search_results(query):
+    try:
+        hits = trip_index(TRIP).search(query)
+    except (OSError, TripDataError) as e:
+        st.error(f"行程資料讀取失敗：{e}")
+        return
+    if not hits:
+        st.caption("找不到符合的行程")
+        return
+    for n, ((day_idx, act_idx), field, text) in enumerate(hits):
+        day, act = TRIP.days[day_idx], TRIP.activities(day_idx)[act_idx]
+        before, match, after = (html.escape(x) for x in snippet(text, query))
+        c1, c2 = st.columns([5,1])
+        c1.markdown(f"<div style='font-size:0.85rem;'><b>{day['full_date']} {act['time']}</b> {html.escape(act['text'])}<br>"
+                    f"<span style='color:{COLORS['text_secondary']};'>{before}<mark>{match}</mark>{after}</span></div>", unsafe_allow_html=True)
+        c2.button("前往", key=f"search_hit_{n}", on_click=select_day, args=(day_idx,))
+
+
+# 匯出 (行事曆 .ics / 離線 HTML)：依行程內容 hash 快取，下載幾次都只產生一次
+# export (zoneinfo、卡片模板) 只在按下下載時才載入，不算在冷啟動裡
+def export_ics():
+    from export import ics_bytes
+    return ics_bytes(TRIP)
+
+
+def export_html():
+    from export import html_bytes
+    return html_bytes(TRIP, COLORS)
+
+
+@perf.timed("render_itinerary_page")
 def render_itinerary_page():
     # Itinerary Title
     st.markdown(f"""<div class="page-title">行程表</div>""", unsafe_allow_html=True)
-    
+    # 匯出只在按下時產生 (callable)，同一份行程的內容 hash 沒變就直接用快取
+    c1, c2 = st.columns(2)
+    c1.download_button("📅 加入行事曆", export_ics, file_name=f"{TRIP.id}.ics", mime="text/calendar",
+                       key="export_ics", use_container_width=True)
+    c2.download_button("📄 離線版行程", export_html, file_name=f"{TRIP.id}.html", mime="text/html",
+                       key="export_html", use_container_width=True)
+    render_day_view()
+
+
+# 切換日期只重跑這個 fragment，不會重跑 CSS、首頁 API 與其他頁面
+def render_activity_detail(cards, geo, fx_table, day, day_idx, i):
+    act = day['activities'][i]
+    if 'guideText' in act:
+        st.markdown(cards.guide_text(day, i), unsafe_allow_html=True)
+    if guide_service.enabled:
+        ai_text = guide_service.cached(act)
+        if ai_text:
+            st.markdown(f"✨ {ai_text}")
+        elif st.button("✨ AI 導覽", key=f"ai_{day_idx}_{i}"):
+            # 當天還沒生成過的 activity 會一起送出 (一個請求)，這裡只串流這一段
+            st.write_stream(guide_service.stream(day, i))
+    if act['type'] == 'food' and 'menu' in act:
+        st.markdown(cards.menu(day, i, menu_price_notes(act['menu'], fx_table)), unsafe_allow_html=True)
+    if act['type'] == 'food':
+        # 餐點 / 伴手禮的價格現場換算
+        render_price_converter(fx_table, f"px_{day_idx}_{i}")
+    nearby = [(a['text'], TRIP.days[d]['full_date'], round(km, 1)) for km, (d, _), a in geo.nearest_food(day_idx, i)]
+    links = cards.detail_links(day, i, nearby)
+    if links:
+        st.markdown(links, unsafe_allow_html=True)
+
+    # Buttons
+    if act['type'] == 'transport':
+        c1, c2 = st.columns(2)
+        if c1.button("Ticket (W)", key=f"t_{day_idx}_{i}_w"): ticket_modal(f"t_{day_idx}_{i}_w", "Ticket W")
+        if c2.button("Ticket (C)", key=f"t_{day_idx}_{i}_c"): ticket_modal(f"t_{day_idx}_{i}_c", "Ticket C")
+
+
+@st.fragment
+@sessions.touched
+def render_fx_converter(fx_table):
+    with st.expander("💱 匯率換算"):
+        c1, c2, c3 = st.columns([2, 1, 1])
+        codes = fx_table.menu_codes()
+        raw = c1.text_input("金額", placeholder="可一次輸入多個：1200 850 3000", key="fx_amounts")
+        src = c2.selectbox("從", codes, index=codes.index("jpy"), key="fx_src")
+        dst = c3.selectbox("到", codes, index=codes.index("twd") if "twd" in codes else 0, key="fx_dst")
+        amounts = []
+        for token in raw.replace(",", " ").replace("、", " ").split():
+            try:
+                amounts.append(float(token))
+            except ValueError:
+                pass
+        if amounts:
+            converted = fx_table.convert(amounts, src, dst)
+            st.markdown("  \n".join(f"{format_money(a, src)} → **{format_money(v, dst)}**" for a, v in zip(amounts, converted)))
+        stamp = " · 預估匯率" if fx_table.fallback else (f" · {fx_table.date}" if fx_table.date else "")
+        st.caption(f"1 {src.upper()} = {fx_table.rate(src, dst):.4f} {dst.upper()}{stamp}")
+
+
+@st.fragment
+@sessions.touched
+@perf.timed("render_day_view")
+def render_day_view():
+    query = st.text_input("搜尋", placeholder="🔍 搜尋行程、菜單、備註 (例：海膽丼、Cash Only)", label_visibility="collapsed", key="search_query")
+    if query.strip():
+        with st.container(border=True):
+            render_search_results(query)
+
+    # 距離矩陣與時間衝突都依檔案版本快取，沒改過的日子不會重算
+    # 整個行程的版本只算一次 (每天的檔案 stat 一次)；版本沒變時兩邊都直接用上次的結果，不逐天檢查
+    # geo 需要 NumPy，第一次打開行程表才載入 (首頁冷啟動用不到)
+    from geo import trip_geo
+    try:
+        version = TRIP.version()
+        geo = trip_geo(TRIP, version)
+        fx_table = get_fx_table()
+        trip_conflicts = schedule_checker.trip(TRIP, geo.travel_minutes, version)
+    except (OSError, TripDataError) as e:
+        st.error(f"行程資料讀取失敗：{e}")
+        return
+    flagged = {d for d, c in trip_conflicts.items() if c}
+
     # ★ Date Horizontal Scroll ★ (In-Page Navigation)
     # 使用 gap="medium" 來與底部導覽列的 CSS 區隔
     with st.container():
-        cols = st.columns(5, gap="medium")
-        for i, day in enumerate(APP_DATA['days']):
+        cols = st.columns(len(TRIP.days), gap="medium")
+        for i, day in enumerate(TRIP.days):
             with cols[i]:
                 # 判斷此日期是否被選中
                 is_selected = (st.session_state.selected_day == i)
                 # 顯示日期方塊
-                if st.button(f"{day['date']}\n{day['weekday']}", key=f"date_sel_{i}", type="primary" if is_selected else "secondary"):
-                    st.session_state.selected_day = i
-                    st.rerun()
+                # on_click 在重跑前就更新狀態，不需要再 st.rerun() 多跑一次
+                st.button(f"{day['date']}{' ⚠' if i in flagged else ''}\n{day['weekday']}", key=f"date_sel_{i}", type="primary" if is_selected else "secondary",
+                          on_click=select_day, args=(i,))
     
     st.write("") # Spacer
 
     # Display Selected Day Content
     day_idx = st.session_state.selected_day
-    day = APP_DATA['days'][day_idx]
+    try:
+        day = TRIP.day(day_idx)
+    except (OSError, TripDataError) as e:
+        st.error(f"行程資料讀取失敗：{e}")
+        return
+    cards = ItineraryCards(TRIP.day_version(day_idx), COLORS)
+    forecast = get_trip_forecast(TRIP.days)
+    fc = day_forecast(forecast, day)
+    fc_html = f"<span style='margin-left:10px;'>{fc['text']} {fc['max']}° / {fc['min']}°</span>" if fc else ""
     
     # Day Header
-    st.markdown(f"""
-    <div style="text-align:center; margin: 10px 0 20px 0;">
-        <div style="font-size: 1.5rem; font-weight: 600; color: {COLORS['text_primary']}; margin-bottom: 5px;">{day['full_date']}</div>
-        <div style="font-size: 0.9rem; color: {COLORS['text_secondary']}; display:flex; align-items:center; justify-content:center; gap:6px;">
-            <span>📍</span> {day['location']}
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(cards.day_header(day, fc_html), unsafe_allow_html=True)
+    # 逐時預報 (和每日預報是同一次批次請求)；超出可預報範圍的日子沒有資料就不顯示
+    hours = day_hourly(forecast, day)
+    if hours:
+        st.markdown(cards.hourly(day, hours), unsafe_allow_html=True)
 
     # Hotel
     with st.container(border=True):
-        st.markdown(f"""
-        <div style="display:flex; justify-content:space-between; align-items:start;">
-            <div>
-                <div style="font-size:0.7rem; font-weight:600; color:{COLORS['text_secondary']}; letter-spacing:0.1em; margin-bottom:6px;">ACCOMMODATION</div>
-                <div style="font-weight:500; font-size:1.2rem; margin-bottom:4px; font-family:'Shippori Mincho', serif;">{day['hotel']}</div>
-                <div style="font-size:0.85rem; color:{COLORS['text_secondary']};">{day['hotel_note']}</div>
-            </div>
-            <div style="font-size:1.8rem; color:{COLORS['line_light']};">🛏️</div>
-        </div>
-        <div style="border-top: 1px dashed {COLORS['line_light']}; margin: 16px 0 12px 0;"></div>
-        """, unsafe_allow_html=True)
+        st.markdown(cards.hotel(day), unsafe_allow_html=True)
         if st.button("Booking Info", key=f"h_btn_{day_idx}", use_container_width=True):
             ticket_modal(f"hotel_{day_idx}", f"Hotel: {day['hotel']}")
 
     st.write("")
 
     # Timeline Activities
+    conflicts = trip_conflicts[day_idx]
     for i, act in enumerate(day['activities']):
-        st.markdown(f"""
-        <div style="position: relative; padding-left: 24px; margin-bottom: 1.5rem;">
-            <div class="timeline-point" style="position: absolute; left: 0; top: 6px;"></div>
-            {'<div class="timeline-line"></div>' if i < len(day['activities']) - 1 else ''}
-            <div style="font-family:'Shippori Mincho', serif; font-size:0.9rem; font-weight:600; color:{COLORS['text_primary']}; margin-bottom: 8px;">{act['time']}</div>
-            <div class="minimal-card" style="display:flex; justify-content:space-between; align-items:center; padding: 1.2rem;">
-                <div>
-                    <div style="font-weight:500; font-size:1.1rem; color:{COLORS['text_primary']}; font-family: 'Shippori Mincho', serif; margin-bottom: 4px;">{act['text']}</div>
-                    <div style="font-size:0.85rem; color:{COLORS['text_secondary']};">{act['desc']}</div>
-                </div>
-                <div style="font-size:1.5rem; color:{COLORS['line_light']};">{'🍴' if act['type'] == 'food' else '🚆' if act['type'] == 'transport' else '📍'}</div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(cards.activity(day, i), unsafe_allow_html=True)
+        if i in conflicts:
+            st.markdown(cards.conflicts(day, i, conflicts[i]), unsafe_allow_html=True)
+
+        # 詳情只在打開時才組 (收合時不送任何內容到前端)；開關會觸發這個 fragment 的 rerun
+        with st.expander("查看詳情", key=f"detail_{day_idx}_{i}", on_change="rerun") as detail:
+            if detail.open:
+                render_activity_detail(cards, geo, fx_table, day, day_idx, i)
+
+        # 到下一站的距離與預估交通時間 (距離矩陣在 geo 模組依行程版本快取)
+        leg = geo.leg(day_idx, i)
+        if leg:
+            st.markdown(cards.transit(day, i, leg), unsafe_allow_html=True)
 
-        with st.expander("查看詳情"):
-            if 'guideText' in act:
-                st.markdown(f"<p style='font-size:0.9rem; color:{COLORS['text_primary']};'>{act['guideText']}</p>", unsafe_allow_html=True)
-            if act['type'] == 'food' and 'menu' in act:
-                st.markdown(f"""
-                <div style="background:#FFF; border:1px solid {COLORS['line_light']}; padding:12px; border-radius:8px; margin-top:10px;">
-                    <div style="font-size:0.7rem; color:{COLORS['accent_warm']}; font-weight:600; margin-bottom:5px;">RECOMMENDED</div>
-                    <ul style="margin:0; padding-left:20px; font-size:0.9rem;">{''.join([f'<li>{m}</li>' for m in act['menu']])}</ul>
-                </div>
-                """, unsafe_allow_html=True)
-            st.write("")
-            if 'mapUrl' in act:
-                st.markdown(f'<a href="{act["mapUrl"]}" target="_blank" style="display:flex; align-items:center; justify-content:center; background-color:#FFFFFF; color:{COLORS["text_primary"]}; border:1px solid {COLORS["line_light"]}; border-radius:24px; padding:0.5rem 1rem; text-decoration:none; font-weight:500; width:100%; box-shadow:0 1px 2px rgba(0,0,0,0.05); margin-bottom:10px;">📍 Google Map</a>', unsafe_allow_html=True)
-            
-            # Buttons
-            if act['type'] == 'transport':
-                c1, c2 = st.columns(2)
-                if c1.button("Ticket (W)", key=f"t_{day_idx}_{i}_w"): ticket_modal(f"t_{day_idx}_{i}_w", "Ticket W")
-                if c2.button("Ticket (C)", key=f"t_{day_idx}_{i}_c"): ticket_modal(f"t_{day_idx}_{i}_c", "Ticket C")
 
+def toggle_item(item_id):
+    packing.set_checked(item_id, st.session_state[f"pack_{item_id}"])
 
+
+def add_packing_item():
+    new_cat, new_item = st.session_state.pack_new_cat, st.session_state.pack_new_item
+    if new_item:
+        packing.add_item(new_cat if new_cat else "Personal", new_item)
+        st.session_state.pack_new_item = ""
+
+
+def import_packing_template():
+    name = st.session_state.pack_template
+    try:
+        template = load_packing_template(name)
+    except (OSError, TripDataError) as e:
+        st.session_state.pack_notice = f"範本讀取失敗：{e}"
+        return
+    added = packing.import_template(template['categories'])
+    st.session_state.pack_notice = f"已匯入 {added} 項 ({template['title']})"
+
+
+def toggle_category(category):
+    key = f"pack_open_{category}"
+    st.session_state[key] = not st.session_state[key]
+
+
+@perf.timed("render_packing_page")
 def render_packing_page():
     st.markdown(f"""<div class="page-title" style="text-align:center;">Packing List</div>""", unsafe_allow_html=True)
-    
-    total = sum(len(cat['items']) for cat in st.session_state.packing_list)
-    checked = sum(1 for k, v in st.session_state.packing.items() if v)
-    st.markdown(f"""<style>.stProgress > div > div > div > div {{ background-color: {COLORS['accent_gold']}; }}</style>""", unsafe_allow_html=True)
+    render_packing_list()
+
+
+# 勾選 / 刪除 / 新增只重跑清單本身
+@st.fragment
+@sessions.touched
+@perf.timed("render_packing_list")
+def render_packing_list():
+    packing_list = packing.categories()
+    checked, total = packing.counts()
     st.progress(checked / total if total > 0 else 0)
     st.write("")
+    # 清單很長時分類預設收合，只送出展開的那幾類的 widget
+    expand_default = total <= PACKING_EXPAND_LIMIT
 
-    for i, cat in enumerate(st.session_state.packing_list[:]):
+    for i, cat in enumerate(packing_list):
         with st.container(border=True):
-            c1, c2 = st.columns([8,1])
-            c1.markdown(f"**{cat['category']}**")
-            if c2.button("🗑️", key=f"del_cat_{i}"):
-                st.session_state.packing_list.pop(i)
-                st.rerun()
+            open_key = f"pack_open_{cat['category']}"
+            if open_key not in st.session_state: st.session_state[open_key] = expand_default
+            is_open = st.session_state[open_key]
+            c0, c1, c2 = st.columns([1,7,1])
+            c0.button("▾" if is_open else "▸", key=f"fold_cat_{i}", on_click=toggle_category, args=(cat['category'],))
+            c1.markdown(f"**{cat['category']}** · {cat['checked']}/{len(cat['items'])}")
+            c2.button("🗑️", key=f"del_cat_{i}", on_click=packing.delete_category, args=(cat['category'],))
+            if not is_open: continue
             
             st.markdown(f"<div style='border-bottom:1px solid {COLORS['line_light']}; margin-bottom:10px;'></div>", unsafe_allow_html=True)
             
-            for j, item in enumerate(cat['items']):
+            for item in cat['items']:
                 rc1, rc2 = st.columns([6,1])
                 with rc1:
-                    key = f"pack_{item}"
-                    st.session_state.packing[key] = st.checkbox(item, value=st.session_state.packing.get(key, False), key=key)
+                    # 以資料庫為準 (另一支手機可能剛勾過)，勾選時只更新這一筆
+                    key = f"pack_{item['id']}"
+                    st.session_state[key] = item['checked']
+                    st.checkbox(item['name'], key=key, on_change=toggle_item, args=(item['id'],))
                 with rc2:
                     st.markdown('<div class="delete-btn">', unsafe_allow_html=True)
-                    if st.button("✕", key=f"del_item_{i}_{j}"):
-                        st.session_state.packing_list[i]['items'].pop(j)
-                        st.rerun()
+                    st.button("✕", key=f"del_item_{item['id']}", on_click=packing.delete_item, args=(item['id'],))
                     st.markdown('</div>', unsafe_allow_html=True)
     
     st.markdown("---")
     c1, c2, c3 = st.columns([2,3,1])
-    new_cat = c1.text_input("Cat", placeholder="Category", label_visibility="collapsed")
-    new_item = c2.text_input("Item", placeholder="Item Name", label_visibility="collapsed")
-    if c3.button("Add", use_container_width=True):
-        if new_item:
-            target = new_cat if new_cat else "Personal"
-            found = next((c for c in st.session_state.packing_list if c['category'] == target), None)
-            if found: found['items'].append(new_item)
-            else: st.session_state.packing_list.append({"category": target, "items": [new_item]})
-            st.rerun()
+    c1.text_input("Cat", placeholder="Category", label_visibility="collapsed", key="pack_new_cat")
+    c2.text_input("Item", placeholder="Item Name", label_visibility="collapsed", key="pack_new_item")
+    c3.button("Add", use_container_width=True, on_click=add_packing_item)
+
+    templates = packing_templates()
+    if templates:
+        c1, c2 = st.columns([5,1])
+        c1.selectbox("Template", list(templates), format_func=templates.get, label_visibility="collapsed", key="pack_template")
+        c2.button("Import", key="pack_import", use_container_width=True, on_click=import_packing_template)
+        # callback 裡不能直接顯示元件 (fragment rerun)，訊息留到這裡顯示一次
+        if 'pack_notice' in st.session_state: st.caption(st.session_state.pop('pack_notice'))
 
 
 # --- 7. 主程式邏輯 (Main Logic) ---
@@ -656,20 +533,44 @@ st.write("")
 st.write("")
 st.write("")
 
-# 底部導覽列容器
+def set_tab(tab):
+    st.session_state.view_tab = tab
+
+# 底部導覽列容器 (on_click 先切換 tab，點一次只跑一次完整 rerun)
 bottom_nav = st.columns(3, gap="large")
 
 with bottom_nav[0]:
-    if st.button("🏠", key="btm_home", type="primary" if st.session_state.view_tab == 'home' else "secondary"):
-        st.session_state.view_tab = 'home'
-        st.rerun()
+    st.button("🏠", key="btm_home", type="primary" if st.session_state.view_tab == 'home' else "secondary", on_click=set_tab, args=('home',))
 
 with bottom_nav[1]:
-    if st.button("📅", key="btm_cal", type="primary" if st.session_state.view_tab == 'itinerary' else "secondary"):
-        st.session_state.view_tab = 'itinerary'
-        st.rerun()
+    st.button("📅", key="btm_cal", type="primary" if st.session_state.view_tab == 'itinerary' else "secondary", on_click=set_tab, args=('itinerary',))
 
 with bottom_nav[2]:
-    if st.button("🎒", key="btm_pack", type="primary" if st.session_state.view_tab == 'packing' else "secondary"):
-        st.session_state.view_tab = 'packing'
-        st.rerun()
+    st.button("🎒", key="btm_pack", type="primary" if st.session_state.view_tab == 'packing' else "secondary", on_click=set_tab, args=('packing',))
+
+# --- 9. 效能面板 (隱藏，?perf=1) ---
+def render_perf_panel(run):
+    from export import export_cache
+    def ms(x): return f"{x * 1000:.1f}"
+    with st.expander(f"⏱ Performance · {ms(run['total'])} ms", expanded=True):
+        rows = "\n".join(f"| {name} | {ms(sec)} |" for name, sec in run['spans'])
+        st.markdown(f"**本次 rerun**\n\n| phase | ms |\n|---|---:|\n{rows}")
+        snap = perf.stats.snapshot()
+        rows = "\n".join(f"| {name} | {ms(s['p50'])} | {ms(s['p95'])} | {ms(s['p99'])} | {s['count']} |" for name, s in sorted(snap.items()))
+        st.markdown(f"**最近 {perf.WINDOW} 次 (整個 process)**\n\n| phase | p50 | p95 | p99 | n |\n|---|---:|---:|---:|---:|\n{rows}")
+        c, h, e = provider_cache.stats(), provider_client.stats(), export_cache.stats()
+        st.caption(f"provider cache hit {c['hit']} · miss {c['miss']} · stale {c['stale']} · coalesced {c['coalesced']} · error {c['error']}"
+                   f" ｜ upstream requests {h['requests']} · retries {h['retries']} · fast fail {h['fast_fail']}"
+                   f"{' · circuit open: ' + ', '.join(h['open']) if h['open'] else ''}"
+                   f" ｜ card fragments hit {fragment_cache.hits} · miss {fragment_cache.misses}"
+                   f" ｜ exports rendered {e['renders']} · cached {e['hits']}")
+        if prefetch.prefetch_scheduler is not None:
+            jobs = prefetch.prefetch_scheduler.stats()
+            st.caption("prefetch " + " · ".join(f"{name} {j['runs']} runs / {j['failures']} failed" for name, j in jobs.items()))
+        s = sessions.session_tracker.stats()
+        st.caption(f"sessions tracked {s['tracked']} · idle compacted {s['compacted_now']} ｜ released {s['compacted']} · evicted {s['evicted']} · gone {s['gone']}")
+        st.download_button("metrics.txt (Prometheus)", perf.prometheus_text(snap), file_name="metrics.txt")
+
+run = perf.end_run()
+if run is not None:
+    render_perf_panel(run)
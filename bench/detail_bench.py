@@ -0,0 +1,116 @@
+# 行程表「查看詳情」在活動很多的一天的成本 (streamlit.testing.v1.AppTest，headless)
+#
+#   python bench/detail_bench.py [--activities 60] [--reruns 20] [--eager]
+#
+# 把真實行程複製到暫存資料夾，第一天換成 --activities 個 activity (由真實資料重複而成)，量：
+#   day_rerun    切到這一天的 rerun 耗時 p50 / p95
+#   payload      這次 rerun 送到前端的元素數與 protobuf 大小 (所有元素 ByteSize 加總)
+#   opened       打開其中一個詳情後的同樣數字 (支援時)
+#   eager        (--eager) 每個 activity 的詳情都渲染時的同樣數字，也就是改成依開關渲染之前的做法
+#                (把所有詳情都設成打開；放在 lazy 旁邊比較)
+# 天氣 / 匯率由 bench/stub_providers.py 提供。結果以 JSON 印到 stdout。
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+APP = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+from stub_providers import StubProviders  # noqa: E402
+
+
+def make_trip(tmp, n):
+    src = os.path.join(ROOT, "trips", "hokkaido-2025")
+    dst = os.path.join(tmp, "trips", "hokkaido-2025")
+    shutil.copytree(src, dst)
+    acts = []
+    for name in sorted(os.listdir(os.path.join(src, "days"))):
+        with open(os.path.join(src, "days", name), encoding="utf-8") as f:
+            acts.extend(json.load(f)["activities"])
+    day = []
+    for k in range(n):
+        act = dict(acts[k % len(acts)])
+        minute = 6 * 60 + k * 15
+        act["time"] = f"{minute // 60 % 24:02d}:{minute % 60:02d}"
+        act.pop("stayTime", None)
+        day.append(act)
+    with open(os.path.join(dst, "days", "0.json"), "w", encoding="utf-8") as f:
+        json.dump({"activities": day}, f, ensure_ascii=False)
+    return dst
+
+
+def payload(at):
+    count, size = 0, 0
+    stack = [at._tree]
+    while stack:
+        node = stack.pop()
+        proto = getattr(node, "proto", None)
+        if proto is not None and hasattr(proto, "ByteSize"):
+            count += 1
+            size += proto.ByteSize()
+        children = getattr(node, "children", None)
+        if children:
+            stack.extend(children.values())
+    return {"elements": count, "bytes": size}
+
+
+def timed_reruns(at, reruns):
+    xs = []
+    for _ in range(reruns):
+        t = time.perf_counter()
+        at.button(key="date_sel_0").click().run()
+        xs.append((time.perf_counter() - t) * 1000)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    xs.sort()
+    return {"p50_ms": round(statistics.median(xs), 2), "p95_ms": round(xs[int(len(xs) * 0.95) - 1], 2)}
+
+
+def measure(at, reruns):
+    return {"day_rerun": timed_reruns(at, reruns), "payload": payload(at)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--activities", type=int, default=60)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--eager", action="store_true", help="also measure with every detail rendered")
+    args = parser.parse_args()
+    with StubProviders() as stub, tempfile.TemporaryDirectory() as tmp:
+        trip = make_trip(tmp, args.activities)
+        os.environ.update(stub.env(), TRIPS_DIR=os.path.dirname(trip), TRIP_DIR=trip, PREFETCH="off", GUIDE_CLIENT="off",
+                          PROVIDER_CACHE_PATH=os.path.join(tmp, "providers.sqlite3"),
+                          TRIP_STORE_PATH=os.path.join(tmp, "trip.sqlite3"))
+        from streamlit.testing.v1 import AppTest
+        at = AppTest.from_file(APP, default_timeout=60)
+        at.session_state["view_tab"] = "itinerary"
+        at.run()
+        result = {"activities": args.activities, "lazy": measure(at, args.reruns)}
+        # 詳情改成依開關狀態渲染後，才有 key 可以從 session_state 打開
+        if "detail_0_0" in at.session_state:
+            at.session_state["detail_0_0"] = True
+            at.run()
+            result["opened"] = measure(at, args.reruns)
+            if args.eager:
+                for i in range(args.activities):
+                    at.session_state[f"detail_0_{i}"] = True
+                at.run()
+                result["eager"] = measure(at, args.reruns)
+                lazy, eager = result["lazy"], result["eager"]
+                result["eager_vs_lazy"] = {
+                    "elements": [eager["payload"]["elements"], lazy["payload"]["elements"]],
+                    "bytes": [eager["payload"]["bytes"], lazy["payload"]["bytes"]],
+                    "p50_ms": [eager["day_rerun"]["p50_ms"], lazy["day_rerun"]["p50_ms"]],
+                }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# 匯出 (.ics / 離線 HTML) 的正確性與快取效果
+#
+#   python bench/export_bench.py [--downloads 500]
+#
+# 把真實行程複製到暫存資料夾後檢查：
+#   cache      第一次產生的時間 vs 之後 --downloads 次下載的平均時間；整段只產生一次
+#   ics        每個 activity 一個 VEVENT、每行不超過 75 octets 且以 CRLF 結尾、展開續行後 SUMMARY 與資料一致
+#   touch      只改檔案 mtime (內容不變) 不會重新產生
+#   edit       改了某一天的內容才會重新產生，且新內容出現在輸出裡
+# 結果以 JSON 印到 stdout；任何一項不符合就以非 0 結束。
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+
+def check_ics(trip, data):
+    text = data.decode("utf-8")
+    raw_lines = text.split("\r\n")
+    unfolded = text.replace("\r\n ", "").split("\r\n")
+    summaries = [line[len("SUMMARY:"):] for line in unfolded if line.startswith("SUMMARY:")]
+    expected = [act['text'] for d in range(len(trip.days)) for act in trip.activities(d)]
+    out = {
+        "events": unfolded.count("BEGIN:VEVENT"),
+        "activities": len(expected),
+        "max_line_octets": max(len(line.encode("utf-8")) for line in raw_lines),
+        "bare_lf": text.replace("\r\n", "").count("\n"),
+    }
+    out["ok"] = (out["events"] == len(expected) and out["max_line_octets"] <= 75 and out["bare_lf"] == 0
+                 and summaries == [t.replace(";", "\\;").replace(",", "\\,") for t in expected])
+    return out
+
+
+def check_cache(trip, downloads):
+    from export import export_cache, html_bytes, ics_bytes
+    from styles import COLORS
+    out = {}
+    for name, get in (("ics", lambda: ics_bytes(trip)), ("html", lambda: html_bytes(trip, COLORS))):
+        before = export_cache.renders
+        t = time.perf_counter()
+        first = get()
+        first_ms = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        for _ in range(downloads):
+            assert get() is first
+        out[name] = {"bytes": len(first), "first_ms": round(first_ms, 2),
+                     "cached_us": round((time.perf_counter() - t) / downloads * 1e6, 2),
+                     "renders": export_cache.renders - before}
+    out["ok"] = all(out[name]["renders"] == 1 for name in ("ics", "html"))
+    return out
+
+
+def check_changes(trip_path):
+    from export import export_cache, html_bytes
+    from styles import COLORS
+    from trip_data import load_trip
+    day_file = os.path.join(trip_path, "days", "0.json")
+    html_bytes(load_trip(trip_path), COLORS)
+    renders = export_cache.renders
+
+    st = os.stat(day_file)
+    os.utime(day_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    html_bytes(load_trip(trip_path), COLORS)
+    touched = export_cache.renders - renders
+
+    with open(day_file, encoding="utf-8") as f:
+        data = json.load(f)
+    data["activities"][0]["text"] = "匯出測試：改過的行程"
+    with open(day_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.utime(day_file, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10 ** 9))
+    edited = html_bytes(load_trip(trip_path), COLORS)
+    out = {"touch_renders": touched, "edit_renders": export_cache.renders - renders - touched,
+           "edit_visible": "匯出測試：改過的行程" in edited.decode("utf-8")}
+    out["ok"] = touched == 0 and out["edit_renders"] == 1 and out["edit_visible"]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--downloads", type=int, default=500)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        trip_path = os.path.join(tmp, "hokkaido-2025")
+        shutil.copytree(os.path.join(ROOT, "trips", "hokkaido-2025"), trip_path)
+        from export import ics_bytes
+        from trip_data import load_trip
+        trip = load_trip(trip_path)
+        # cache 要先跑，才量得到第一次產生的時間
+        result = {"cache": check_cache(trip, args.downloads)}
+        result["ics"] = check_ics(trip, ics_bytes(trip))
+        result["changes"] = check_changes(trip_path)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(0 if all(r["ok"] for r in result.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
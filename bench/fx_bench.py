@@ -0,0 +1,80 @@
+# 匯率表：多 session 共用一次下載，以及大量金額的向量化換算
+#
+#   python bench/fx_bench.py [--sessions 200] [--amounts 1000000] [--latency 0.05]
+#
+# 量：
+#   sessions      --sessions 個執行緒同時要匯率表 (對本機 stub)，上游實際被打幾次、整體耗時
+#   convert       --amounts 筆金額一次換算 (單一幣別對 / 每筆各自的幣別對)，對照逐筆用 Python 算
+# 結果以 JSON 印到 stdout。
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+from stub_providers import StubProviders  # noqa: E402
+
+
+def ms(fn):
+    t = time.perf_counter()
+    result = fn()
+    return round((time.perf_counter() - t) * 1000, 2), result
+
+
+def bench_sessions(stub, sessions):
+    import providers
+    with ThreadPoolExecutor(max_workers=min(sessions, 64)) as pool:
+        elapsed, tables = ms(lambda: list(pool.map(lambda _: providers.get_fx_table(), range(sessions))))
+    return {
+        "sessions": sessions,
+        "elapsed_ms": elapsed,
+        "upstream_requests": stub.config.requests["fx"],
+        "distinct_tables": len({id(t) for t in tables}),
+        "currencies": len(tables[0].codes),
+    }
+
+
+def bench_convert(table, n, rng):
+    codes = table.codes
+    amounts = np.array([rng.randrange(100, 50000) for _ in range(n)], dtype=float)
+    srcs = [rng.choice(codes) for _ in range(n)]
+    dsts = [rng.choice(codes) for _ in range(n)]
+    rates = dict(zip(codes, (table.rate("jpy", c) for c in codes)))
+
+    single_ms, _ = ms(lambda: table.convert(amounts, "jpy", "twd"))
+    pairs_ms, vec = ms(lambda: table.convert_pairs(amounts, srcs, dsts))
+    loop_ms, loop = ms(lambda: [a * rates[d] / rates[s] for a, s, d in zip(amounts.tolist(), srcs, dsts)])
+    return {
+        "amounts": n,
+        "single_pair_ms": single_ms,
+        "mixed_pairs_ms": pairs_ms,
+        "python_loop_ms": loop_ms,
+        "max_abs_diff": float(np.max(np.abs(vec - np.array(loop)))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--amounts", type=int, default=1_000_000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    with StubProviders(latency=args.latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        # providers 在 import 時讀環境變數，所以要先設好再 import
+        os.environ.update(stub.env(), PROVIDER_CACHE_PATH=os.path.join(tmp, "providers.sqlite3"))
+        sessions = bench_sessions(stub, args.sessions)
+        import providers
+        convert = bench_convert(providers.get_fx_table(), args.amounts, random.Random(0))
+    print(json.dumps({"sessions": sessions, "convert": convert}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# 距離矩陣與最近鄰查詢的成本
+#
+#   python bench/geo_bench.py [--points 1000 5000] [--queries 2000]
+#
+# 對照組：每次都整個重算矩陣 / 線性掃過所有地點。結果以 JSON 印到 stdout。
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geo import DistanceMatrix, GridIndex, haversine, haversine_matrix  # noqa: E402
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def timed_us(fn, n):
+    lat = []
+    for i in range(n):
+        t = time.perf_counter()
+        fn(i)
+        lat.append((time.perf_counter() - t) * 1e6)
+    return {"p50": round(statistics.median(lat), 1), "p95": round(percentile(lat, 0.95), 1)}
+
+
+def run(n, queries, rng):
+    # 北海道西南部 (札幌 ~ 二世谷 ~ 新千歲) 範圍內的隨機地點
+    pts = [(i, rng.uniform(42.6, 43.2), rng.uniform(140.5, 141.8)) for i in range(n)]
+    lat = np.array([p[1] for p in pts])
+    lon = np.array([p[2] for p in pts])
+
+    t = time.perf_counter()
+    matrix = DistanceMatrix(pts)
+    build_ms = (time.perf_counter() - t) * 1000
+    full = timed_us(lambda i: haversine_matrix(lat, lon), 5)
+    edit = timed_us(lambda i: matrix.set_point(i % n, rng.uniform(42.6, 43.2), rng.uniform(140.5, 141.8)), 200)
+    add = timed_us(lambda i: matrix.set_point(("new", i), rng.uniform(42.6, 43.2), rng.uniform(140.5, 141.8)), 200)
+
+    grid = GridIndex()
+    for key, a, b in pts:
+        grid.insert(key, a, b)
+    qs = [(rng.uniform(42.6, 43.2), rng.uniform(140.5, 141.8)) for _ in range(queries)]
+    nearest = timed_us(lambda i: grid.nearest(*qs[i], k=3), queries)
+    linear = timed_us(lambda i: np.argsort(haversine(qs[i][0], qs[i][1], lat, lon))[:3], queries)
+    for q in qs[:50]:
+        exact = np.argsort(haversine(q[0], q[1], lat, lon))[:3].tolist()
+        assert [key for _, key in grid.nearest(*q, k=3)] == exact
+    return {
+        "points": n,
+        "matrix_build_ms": round(build_ms, 2),
+        "matrix_full_recompute_us": full,
+        "matrix_edit_point_us": edit,
+        "matrix_add_point_us": add,
+        "nearest_grid_us": nearest,
+        "nearest_linear_numpy_us": linear,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    print(json.dumps([run(n, args.queries, rng) for n in args.points], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# AI 導覽在多人同時點開時的上游請求數與首字延遲 (用 FakeClient，不需要 API key)
+#
+#   python bench/guide_bench.py [--users 50] [--delay 0.02] [--concurrency 2] [--rate 10]
+#
+# 每個使用者隨機挑一天、一個 activity 點「AI 導覽」並讀完串流。
+# 預期：上游請求數 = 天數 (同一天合併成一個請求、生成中的共用)，第二輪全部命中快取。
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from guide import FakeClient, GuideService, GuideStore  # noqa: E402
+from trip_data import load_trip  # noqa: E402
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def round_trip(service, days, users, rng):
+    first, total = [], []
+    lock = threading.Lock()
+
+    def user(day, i):
+        t = time.perf_counter()
+        ttft = None
+        for chunk in service.stream(day, i):
+            if ttft is None:
+                ttft = time.perf_counter() - t
+        with lock:
+            first.append(ttft * 1000)
+            total.append((time.perf_counter() - t) * 1000)
+
+    picks = []
+    for _ in range(users):
+        day = rng.choice(days)
+        picks.append((day, rng.randrange(len(day['activities']))))
+    threads = [threading.Thread(target=user, args=p) for p in picks]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return {"ttft_ms": {"p50": round(statistics.median(first), 1), "p95": round(percentile(first, 0.95), 1)},
+            "stream_ms": {"p50": round(statistics.median(total), 1), "p95": round(percentile(total, 0.95), 1)}}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--rate", type=int, default=10)
+    args = parser.parse_args()
+
+    trip = load_trip()
+    days = trip.all_days()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeClient(delay=args.delay)
+        service = GuideService(client, GuideStore(os.path.join(tmp, "guide.sqlite3")),
+                               rate_per_minute=args.rate, max_concurrency=args.concurrency)
+        cold = round_trip(service, days, args.users, rng)
+        cold_calls = client.calls
+        warm = round_trip(service, days, args.users, rng)
+        # 新的 process (新的 GuideStore 物件) 讀同一個檔：仍然不必再生成
+        restarted = GuideService(client, GuideStore(os.path.join(tmp, "guide.sqlite3")))
+        cached_after_restart = sum(restarted.cached(act) is not None for day in days for act in day['activities'])
+
+    print(json.dumps({
+        "users": args.users,
+        "days": len(days),
+        "activities": sum(len(d['activities']) for d in days),
+        "upstream_calls_cold": cold_calls,
+        "upstream_calls_warm": client.calls - cold_calls,
+        "cold": cold,
+        "warm": warm,
+        "cached_after_restart": cached_after_restart,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
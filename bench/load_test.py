@@ -0,0 +1,338 @@
+# 多人同時使用的壓力測試：在本機啟動真的 streamlit server，用 N 個 websocket session 同時重播操作
+#
+#   python bench/load_test.py [--sessions 1 5 10 25] [--rounds 5] [--upload-kb 800] [--idle 30]
+#
+# 每個 N 都啟動一個新的 server (天氣 / 匯率由 bench/stub_providers.py 提供，資料庫放暫存資料夾)。
+# 每個 session 就像一個瀏覽器分頁，和前端一樣送 BackMsg、收 ForwardMsg 到 script_finished，每一輪依序：
+#   nav      首頁 → 行程表 → 切換日期 (fragment) → 行李清單
+#   packing  勾 / 取消勾一個行李項目
+#   ticket   打開航班票券 → (Edit Voucher) → 填訂位代號 (第一輪另外上傳 --upload-kb 的票券圖) → Save Changes
+# 報告每個 N：
+#   throughput_rps     所有 rerun 數 / 重播總時間
+#   latency_ms         每次操作 (送出 → script_finished) 的 p50 / p95 / p99，及依操作分類
+#   rss_mb             server 的 RSS：暖機後 (baseline)、N 個 session 跑完仍連著 (loaded)、閒置 --idle 秒後 (idle)
+#   per_session_kb     (loaded - baseline) / N 與 (idle - baseline) / N
+# server 以 SESSION_COMPACT_AFTER = --idle / 2 執行，量得到閒置整理 (sessions.py) 釋放的記憶體；
+# 要比重播時單一 session 兩次操作的最長間隔還長，不然重播中途就會被整理掉 (N 很大時調高 --idle)。
+# server 以固定的 MALLOC_MMAP_THRESHOLD_ 執行：大塊記憶體 (上傳的原檔) 釋放後直接還給 OS，RSS 才看得出來。
+# 開始前先檢查 sessions.py 閒置整理 / 釋放用到的 Streamlit 內部 API 還在；缺任何一個就印出清單並 exit 1
+# (sessions.py 遇到缺少時只記 warning 不整理，不先擋下來的話 idle 數字會悄悄失真)。
+# 結果以 JSON 印到 stdout。
+import argparse
+import asyncio
+import inspect
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import FileURLsRequest, UploadedFileInfo
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+APP = os.path.join(ROOT, "app.py")
+sys.path.insert(0, BENCH_DIR)
+from stub_providers import StubProviders  # noqa: E402
+
+WIDGETS = ("button", "checkbox", "text_input", "file_uploader")
+_EARLY = "FINISHED_EARLY_FOR_RERUN"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid):
+    # smaps_rollup 是逐頁加總；status 的 VmRSS 是各 CPU 計數器的近似值，從別的 process 讀可能差好幾十 MB
+    for name, field in (("smaps_rollup", "Rss:"), ("status", "VmRSS:")):
+        try:
+            with open(f"/proc/{pid}/{name}") as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            continue
+    return 0.0
+
+
+def ticket_image(kb):
+    # 隨機雜訊的 JPEG 幾乎不能壓縮，邊長依目標大小估算
+    from PIL import Image
+    side = max(16, int((kb * 1024 / 1.2) ** 0.5))
+    img = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+class Server:
+    """streamlit run app.py on a free port, in its own process."""
+
+    def __init__(self, env):
+        self.port = free_port()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", APP, "--server.headless", "true",
+             "--server.port", str(self.port), "--server.enableXsrfProtection", "false",
+             "--browser.gatherUsageStats", "false"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"streamlit exited with {self.proc.returncode}")
+            try:
+                if requests.get(f"{self.base_url}/_stcore/health", timeout=1).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError("streamlit did not become healthy")
+
+    def rss_mb(self):
+        return rss_mb(self.proc.pid)
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+class Session:
+    """One browser tab: a websocket plus the widgets the last run rendered."""
+
+    def __init__(self, server, image=None):
+        self.server = server
+        self.image = image
+        self.ws = None
+        self.session_id = None
+        self.widgets = {}   # key (或沒有 key 的 widget 用 label) -> (type, id, fragment_id)
+        self.latencies = {}
+        self.reruns = 0
+
+    async def connect(self):
+        self.ws = await websockets.connect(f"ws://127.0.0.1:{self.server.port}/_stcore/stream",
+                                           subprotocols=["streamlit"], max_size=None)
+        await self._rerun("load", [])
+
+    async def close(self):
+        await self.ws.close()
+
+    async def _recv(self):
+        msg = ForwardMsg()
+        msg.ParseFromString(await self.ws.recv())
+        return msg
+
+    def _track(self, msg):
+        kind = msg.WhichOneof("type")
+        if kind == "new_session":
+            self.session_id = msg.new_session.initialize.session_id or self.session_id
+            if not msg.new_session.fragment_ids_this_run:
+                self.widgets.clear()
+        elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+            el = msg.delta.new_element
+            wtype = el.WhichOneof("type")
+            if wtype in WIDGETS:
+                proto = getattr(el, wtype)
+                key = proto.id.rsplit("-", 1)[-1]
+                self.widgets[proto.label if key == "None" else key] = (wtype, proto.id, msg.delta.fragment_id)
+        return kind
+
+    async def _rerun(self, op, states, fragment_id=""):
+        back = BackMsg()
+        back.rerun_script.query_string = ""
+        back.rerun_script.page_script_hash = ""
+        if fragment_id:
+            back.rerun_script.fragment_id = fragment_id
+        back.rerun_script.widget_states.widgets.extend(states)
+        t = time.perf_counter()
+        await self.ws.send(back.SerializeToString())
+        while True:
+            msg = await self._recv()
+            if self._track(msg) == "script_finished":
+                if ForwardMsg.ScriptFinishedStatus.Name(msg.script_finished) != _EARLY:
+                    break
+        self.latencies.setdefault(op, []).append((time.perf_counter() - t) * 1000)
+        self.reruns += 1
+
+    def has(self, key):
+        return key in self.widgets
+
+    async def click(self, op, key, extra=()):
+        _, wid, fragment_id = self.widgets[key]
+        await self._rerun(op, [*extra, WidgetState(id=wid, trigger_value=True)], fragment_id)
+
+    async def set_value(self, op, key, **value):
+        _, wid, fragment_id = self.widgets[key]
+        await self._rerun(op, [WidgetState(id=wid, **value)], fragment_id)
+
+    async def upload(self, key):
+        # 和前端一樣：先要上傳網址，PUT 檔案，再把 file_uploader 的值設成這個檔案
+        back = BackMsg()
+        back.file_urls_request.CopyFrom(FileURLsRequest(request_id="load", file_names=["ticket.jpg"],
+                                                        session_id=self.session_id))
+        await self.ws.send(back.SerializeToString())
+        while True:
+            msg = await self._recv()
+            if msg.WhichOneof("type") == "file_urls_response":
+                urls = msg.file_urls_response.file_urls[0]
+                break
+        url = urls.upload_url if urls.upload_url.startswith("http") else self.server.base_url + urls.upload_url
+        resp = await asyncio.to_thread(requests.put, url, files={"file": ("ticket.jpg", self.image, "image/jpeg")})
+        resp.raise_for_status()
+        state = WidgetState(id=self.widgets[key][1])
+        state.file_uploader_state_value.uploaded_file_info.append(
+            UploadedFileInfo(name="ticket.jpg", size=len(self.image), file_id=urls.file_id, file_urls=urls))
+        return state
+
+    async def play_round(self, n, rng):
+        # nav
+        await self.click("nav", "btm_home")
+        await self.click("nav", "btm_cal")
+        days = sorted(k for k in self.widgets if k.startswith("date_sel_"))
+        if days:
+            await self.click("fragment", rng.choice(days))
+        await self.click("nav", "btm_pack")
+        # packing
+        boxes = [k for k, w in self.widgets.items() if w[0] == "checkbox" and k.startswith("pack_")]
+        if not boxes and self.has("fold_cat_0"):
+            await self.click("packing", "fold_cat_0")
+            boxes = [k for k, w in self.widgets.items() if w[0] == "checkbox" and k.startswith("pack_")]
+        if boxes:
+            key = rng.choice(boxes)
+            await self.set_value("packing", key, bool_value=rng.random() < 0.5)
+        # ticket
+        await self.click("nav", "btm_home")
+        await self.click("ticket", "fw_w")
+        if self.has("edit_btn"):
+            await self.click("ticket", "edit_btn")
+        if self.has("Save Changes"):
+            extra = [WidgetState(id=self.widgets["Confirmation No."][1], string_value=f"LOAD{n}-{rng.randrange(10 ** 6)}")]
+            if self.image and n == 0:
+                extra.append(await self.upload("upload_flight_wei"))
+            await self.click("ticket", "Save Changes", extra)
+
+
+def percentiles(xs):
+    xs = sorted(xs)
+    if not xs:
+        return {}
+    pick = lambda q: round(xs[min(len(xs) - 1, int(len(xs) * q))], 1)  # noqa: E731
+    return {"p50": round(statistics.median(xs), 1), "p95": pick(0.95), "p99": pick(0.99), "n": len(xs)}
+
+
+async def replay(server, n, rounds, image, seed):
+    sessions = [Session(server, image) for _ in range(n)]
+    await asyncio.gather(*(s.connect() for s in sessions))
+    t = time.perf_counter()
+
+    async def play(i, s):
+        rng = random.Random(seed + i)
+        for r in range(rounds):
+            await s.play_round(r, rng)
+
+    await asyncio.gather(*(play(i, s) for i, s in enumerate(sessions)))
+    wall = time.perf_counter() - t
+    by_op = {}
+    for s in sessions:
+        for op, xs in s.latencies.items():
+            if op != "load":
+                by_op.setdefault(op, []).extend(xs)
+    reruns = sum(len(xs) for xs in by_op.values())
+    return sessions, {
+        "seconds": round(wall, 2),
+        "reruns": reruns,
+        "throughput_rps": round(reruns / wall, 1),
+        "latency_ms": dict(percentiles([x for xs in by_op.values() for x in xs]),
+                           by_op={op: percentiles(xs) for op, xs in sorted(by_op.items())}),
+    }
+
+
+async def measure(env, n, args, image):
+    server = Server(env)
+    try:
+        server.wait_ready()
+        # 暖機：第一個 session 載入所有模組、填好快取，之後的 RSS 才是「每個 session」的成本
+        warm, _ = await replay(server, 1, 1, None, 10 ** 6)
+        await warm[0].close()
+        await asyncio.sleep(1)
+        baseline = server.rss_mb()
+        sessions, out = await replay(server, n, args.rounds, image, 0)
+        await asyncio.sleep(1)
+        loaded = server.rss_mb()
+        await asyncio.sleep(args.idle)
+        idle = server.rss_mb()
+        await asyncio.gather(*(s.close() for s in sessions))
+    finally:
+        server.stop()
+    out["rss_mb"] = {"baseline": round(baseline, 1), "loaded": round(loaded, 1), "idle": round(idle, 1)}
+    out["per_session_kb"] = {"loaded": round((loaded - baseline) * 1024 / n), "idle": round((idle - baseline) * 1024 / n)}
+    return out
+
+
+def missing_internals():
+    """Streamlit internals used by sessions.py that this version no longer has."""
+    from streamlit.runtime.runtime import AsyncObjects, Runtime
+    from streamlit.runtime.session_manager import SessionManager
+    from streamlit.runtime.uploaded_file_manager import UploadedFileManager
+
+    checks = {
+        "Runtime._get_async_objs": hasattr(Runtime, "_get_async_objs"),
+        "AsyncObjects.eventloop": "eventloop" in getattr(AsyncObjects, "__annotations__", {}),
+        "Runtime._session_mgr": "self._session_mgr" in inspect.getsource(Runtime.__init__),
+        "SessionManager.get_active_session_info": hasattr(SessionManager, "get_active_session_info"),
+        "UploadedFileManager.remove_session_files": hasattr(UploadedFileManager, "remove_session_files"),
+        "Runtime.close_session": hasattr(Runtime, "close_session"),
+    }
+    return [name for name, ok in checks.items() if not ok]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 25])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--upload-kb", type=int, default=800, help="ticket image size (0 = no upload)")
+    parser.add_argument("--idle", type=float, default=30.0, help="seconds to wait before the idle RSS reading")
+    parser.add_argument("--latency", type=float, default=0.0, help="stub provider latency")
+    args = parser.parse_args()
+    missing = missing_internals()
+    if missing:
+        print(json.dumps({"missing_internals": missing}, indent=2))
+        sys.exit(1)
+    image = ticket_image(args.upload_kb) if args.upload_kb else None
+    results = {"rounds": args.rounds, "upload_bytes": len(image) if image else 0, "runs": {}}
+    with StubProviders(latency=args.latency) as stub:
+        for n in args.sessions:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, **stub.env(), PREFETCH="off", GUIDE_CLIENT="off",
+                           TRIP_STORE_PATH=os.path.join(tmp, "trip.sqlite3"),
+                           PROVIDER_CACHE_PATH=os.path.join(tmp, "providers.sqlite3"),
+                           GUIDE_STORE_PATH=os.path.join(tmp, "guide.sqlite3"),
+                           TICKET_IMAGE_DIR=os.path.join(tmp, "tickets"),
+                           SESSION_COMPACT_AFTER=str(args.idle / 2), SESSION_SWEEP_INTERVAL="1",
+                           MALLOC_MMAP_THRESHOLD_="131072")
+                results["runs"][n] = asyncio.run(measure(env, n, args, image))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
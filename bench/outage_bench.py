@@ -0,0 +1,89 @@
+# 上游故障時的 provider client 行為 (連線池 / 重試 / 斷路器)，對本機 stub 量測
+#
+#   python bench/outage_bench.py [--calls 20] [--reset 0.5]
+#
+# 量：
+#   keepalive   正常時連續呼叫：共用連線池 vs 每次 requests.get 新開連線
+#   error       一律 503：每次呼叫的延遲 (斷路器跳開前後)、實際打到上游幾次
+#   timeout     上游不回應：同上
+#   recovery    故障中把 stub 切回正常，背景試打成功、恢復正常呼叫所需的時間
+# 結果以 JSON 印到 stdout。
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+from http_client import CircuitOpenError, ProviderClient  # noqa: E402
+from stub_providers import StubProviders  # noqa: E402
+
+
+def call_ms(fn):
+    t = time.perf_counter()
+    try:
+        fn()
+        ok = True
+    except (requests.RequestException, CircuitOpenError, ValueError):
+        ok = False
+    return (time.perf_counter() - t) * 1000, ok
+
+
+def summary(samples):
+    xs = [ms for ms, _ in samples]
+    return {"p50_ms": round(statistics.median(xs), 2), "max_ms": round(max(xs), 2), "ok": sum(ok for _, ok in samples)}
+
+
+def bench_keepalive(stub, calls):
+    url = stub.env()["FX_API_URL"]
+    client = ProviderClient()
+    pooled = [call_ms(lambda: client.get_json(url)) for _ in range(calls)]
+    bare = [call_ms(lambda: requests.get(url, timeout=2).json()) for _ in range(calls)]
+    return {"pooled": summary(pooled), "bare_requests_get": summary(bare)}
+
+
+def bench_outage(stub, mode, calls, reset):
+    url = stub.env()["FX_API_URL"]
+    stub.config.mode = mode
+    before = stub.config.requests["fx"]
+    client = ProviderClient(reset_timeout=reset)
+    samples = [call_ms(lambda: client.get_json(url)) for _ in range(calls)]
+    threshold = client.threshold
+    out = {
+        "before_open": summary(samples[:threshold]),
+        "after_open": summary(samples[threshold:]),
+        "upstream_requests": stub.config.requests["fx"] - before,
+        "client": client.stats(),
+    }
+    # 故障排除：等背景試打把斷路器關回去
+    stub.config.mode = "ok"
+    t = time.perf_counter()
+    while client.stats()["open"] and time.perf_counter() - t < reset * 10 + 5:
+        time.sleep(0.01)
+    out["recovery_ms"] = round((time.perf_counter() - t) * 1000, 1)
+    out["after_recovery"] = summary([call_ms(lambda: client.get_json(url))])
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--reset", type=float, default=0.5, help="breaker reset timeout in seconds")
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    with StubProviders(latency=args.latency, timeout_sleep=2.5) as stub:
+        result = {
+            "keepalive": bench_keepalive(stub, args.calls),
+            "error": bench_outage(stub, "error", args.calls, args.reset),
+            "timeout": bench_outage(stub, "timeout", args.calls, args.reset),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# 行李清單在大量項目下的反應時間
+#
+#   python bench/packing_bench.py [--items 1000 5000] [--ops 2000]
+#
+# 每個規模都先用 import_template 一次匯入，再量：
+#   toggle / add / delete 單筆延遲、counts() (累計計數) 與 categories() (整份給畫面用)，
+#   以及舊做法 (每次 rerun 掃整份清單算進度) 的成本當對照。
+# 結果以 JSON 印到 stdout。
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trip_store import TripStore  # noqa: E402
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def timed_us(fn, n):
+    lat = []
+    for i in range(n):
+        t = time.perf_counter()
+        fn(i)
+        lat.append((time.perf_counter() - t) * 1e6)
+    return {"p50": round(statistics.median(lat), 1), "p95": round(percentile(lat, 0.95), 1)}
+
+
+def template(n, categories=25):
+    return [{"category": f"cat{c}", "items": [f"item{i}" for i in range(c, n, categories)]} for c in range(categories)]
+
+
+def run(store, n, ops):
+    packing = store.packing(f"bench{n}")
+    t = time.perf_counter()
+    added = packing.import_template(template(n))
+    import_ms = (time.perf_counter() - t) * 1000
+    ids = [item['id'] for cat in packing.categories() for item in cat['items']]
+
+    toggle = timed_us(lambda i: packing.set_checked(ids[i % len(ids)], i % 2 == 0), ops)
+    counts = timed_us(lambda i: packing.counts(), ops)
+    listing = timed_us(lambda i: packing.categories(), 50)
+
+    def scan(_):
+        cats = packing.categories()
+        sum(len(c['items']) for c in cats), sum(1 for c in cats for item in c['items'] if item['checked'])
+    scan_counts = timed_us(scan, 50)
+
+    new_ids = []
+    add = timed_us(lambda i: new_ids.append(packing.add_item(f"cat{i % 25}", f"extra{i}")), ops // 4)
+    delete = timed_us(lambda i: packing.delete_item(new_ids[i]), len(new_ids))
+
+    # 模擬另一個 process 寫入：rev 對不上，下一次讀取要整份重讀
+    store._packing.clear()
+    reload = timed_us(lambda i: (store._packing.clear(), packing.counts()), 20)
+
+    checked, total = packing.counts()
+    assert total == added == n, (total, added, n)
+    assert checked == sum(1 for cat in packing.categories() for item in cat['items'] if item['checked'])
+    return {
+        "items": n,
+        "import_ms": round(import_ms, 1),
+        "toggle_us": toggle,
+        "add_us": add,
+        "delete_us": delete,
+        "counts_us": counts,
+        "categories_us": listing,
+        "scan_counts_us": scan_counts,
+        "cold_reload_us": reload,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TripStore(os.path.join(tmp, "bench.sqlite3"))
+        results = [run(store, n, args.ops) for n in args.items]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
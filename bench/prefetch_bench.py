@@ -0,0 +1,133 @@
+# 背景預先抓取排程的檢查 (假時鐘) 與效果 (本機 stub)
+#
+#   python bench/prefetch_bench.py [--latency 0.3] [--hours 6]
+#
+# 檢查：
+#   schedule      假時鐘跑 --hours 小時：第一次立刻執行，之後每次間隔都落在 interval × (1 ± jitter)
+#   concurrency   5 個會卡住的工作、上限 2：同時最多 2 個在跑，跑完前不會重複排入
+#   warm_render   排程先跑一輪後，頁面讀天氣 / 匯率不會 miss、不打上游
+# 結果以 JSON 印到 stdout；任何一項不符合就以非 0 結束。
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+from stub_providers import StubProviders  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class InlineExecutor:
+    # 排入就直接在呼叫端執行，假時鐘的檢查才是確定性的
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def check_schedule(hours):
+    import random
+    from prefetch import PrefetchScheduler
+    clock = FakeClock()
+    sched = PrefetchScheduler(clock=clock, rng=random.Random(0).random, executor=InlineExecutor())
+    runs = {"forecast": [], "fx": []}
+    sched.add("forecast", lambda: runs["forecast"].append(clock.now), 450, jitter=0.1)
+    sched.add("fx", lambda: runs["fx"].append(clock.now), 2700, jitter=0.1)
+    while clock.now < hours * 3600:
+        sched.run_due()
+        clock.now += 1
+    out = {"ok": True}
+    for name, interval in (("forecast", 450), ("fx", 2700)):
+        gaps = [b - a for a, b in zip(runs[name], runs[name][1:])]
+        # 假時鐘每次前進 1 秒，所以允許 1 秒的誤差
+        ok = runs[name][0] == 0 and all(interval * 0.9 <= g <= interval * 1.1 + 1 for g in gaps)
+        out[name] = {"runs": len(runs[name]), "min_gap": min(gaps), "max_gap": max(gaps), "ok": ok}
+        out["ok"] &= ok
+    return out
+
+
+def check_concurrency():
+    from prefetch import PrefetchScheduler
+    clock = FakeClock()
+    sched = PrefetchScheduler(clock=clock, executor=ThreadPoolExecutor(max_workers=2))
+    release, lock = threading.Event(), threading.Lock()
+    state = {"running": 0, "peak": 0, "calls": 0}
+
+    def job():
+        with lock:
+            state["running"] += 1
+            state["calls"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        release.wait(5)
+        with lock:
+            state["running"] -= 1
+
+    for n in range(5):
+        sched.add(f"job{n}", job, 10)
+    first = sched.run_due()
+    time.sleep(0.1)
+    clock.now += 60  # 早就到期了，但都還在跑 (或排隊)，不應再排入
+    again = sched.run_due()
+    release.set()
+    time.sleep(0.2)
+    out = {"submitted": len(first), "resubmitted_while_running": len(again), "peak_running": state["peak"],
+           "calls": state["calls"]}
+    out["ok"] = len(first) == 5 and not again and state["peak"] == 2 and state["calls"] == 5
+    return out
+
+
+def check_warm_render(stub):
+    import prefetch
+    import providers
+    from trip_data import load_trip
+    sched = prefetch.add_provider_jobs(prefetch.PrefetchScheduler(clock=FakeClock(), executor=InlineExecutor()))
+    t = time.perf_counter()
+    sched.run_due()
+    prefetch_ms = (time.perf_counter() - t) * 1000
+    before = sum(stub.config.requests.values())
+    misses = providers.provider_cache.stats()["miss"]
+    t = time.perf_counter()
+    providers.fetch_home_bundle(load_trip().days)
+    render_ms = (time.perf_counter() - t) * 1000
+    out = {
+        "prefetch_ms": round(prefetch_ms, 1),
+        "render_fetch_ms": round(render_ms, 2),
+        "render_upstream_requests": sum(stub.config.requests.values()) - before,
+        "render_misses": providers.provider_cache.stats()["miss"] - misses,
+        "jobs": sched.stats(),
+    }
+    out["ok"] = out["render_upstream_requests"] == 0 and out["render_misses"] == 0 and \
+        all(j["failures"] == 0 for j in out["jobs"].values())
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--hours", type=float, default=6)
+    args = parser.parse_args()
+    with StubProviders(latency=args.latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        # providers 在 import 時讀環境變數，所以要先設好再 import prefetch
+        os.environ.update(stub.env(), PROVIDER_CACHE_PATH=os.path.join(tmp, "providers.sqlite3"), PREFETCH="off")
+        result = {
+            "schedule": check_schedule(args.hours),
+            "concurrency": check_concurrency(),
+            "warm_render": check_warm_render(stub),
+        }
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if all(r["ok"] for r in result.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
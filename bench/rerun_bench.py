@@ -0,0 +1,177 @@
+# app.py 的 rerun benchmark (streamlit.testing.v1.AppTest，headless)
+#
+#   python bench/rerun_bench.py                       # 結果 JSON 印到 stdout
+#   python bench/rerun_bench.py --out new.json --baseline old.json
+#   python bench/rerun_bench.py --latency 0.3 --mode error
+#
+# 天氣 / 匯率由 bench/stub_providers.py 提供 (可設定延遲與故障模式)，
+# 票券、行李與 provider 的 SQLite 都放在暫存資料夾，不會動到本機資料。
+# 每個互動回報 wall / CPU 時間與 Python 尖峰記憶體 (tracemalloc) 的 p50 / p95。
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+APP = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_providers import StubProviders  # noqa: E402
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round((len(xs) - 1) * p)))]
+
+
+def summarize(xs, digits=2):
+    return {"p50": round(statistics.median(xs), digits), "p95": round(percentile(xs, 0.95), digits)}
+
+
+class Recorder:
+    def __init__(self, memory):
+        self.memory = memory
+        self.samples = {}
+
+    def measure(self, name, fn):
+        if self.memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        w, c = time.perf_counter(), time.process_time()
+        fn()
+        wall, cpu = time.perf_counter() - w, time.process_time() - c
+        s = self.samples.setdefault(name, {"wall_ms": [], "cpu_ms": [], "peak_kib": []})
+        if self.memory:
+            s["peak_kib"].append((tracemalloc.get_traced_memory()[1] - base) / 1024)
+        else:
+            s["wall_ms"].append(wall * 1000)
+            s["cpu_ms"].append(cpu * 1000)
+
+
+def _check(at):
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+
+def button(at, label=None, key=None):
+    if key:
+        return at.button(key=key)
+    return next(b for b in at.button if b.label == label)
+
+
+def run_session(rec, iterations, days):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=30)
+    rec.measure("first_run", lambda: at.run())
+    _check(at)
+    for _ in range(iterations):
+        # 底部導覽列
+        for key, name in (("btm_cal", "nav_itinerary"), ("btm_pack", "nav_packing"), ("btm_home", "nav_home")):
+            rec.measure(name, lambda: button(at, key=key).click().run())
+            _check(at)
+
+        # 日期切換 (全部日期點一輪)
+        button(at, key="btm_cal").click().run()
+        for i in range(days):
+            rec.measure("day_select", lambda: button(at, key=f"date_sel_{i}").click().run())
+            _check(at)
+
+        # 行李勾選
+        button(at, key="btm_pack").click().run()
+        for i in range(len(at.checkbox)):
+            cb = at.checkbox[i]
+            rec.measure("packing_toggle", lambda: (cb.uncheck() if cb.value else cb.check()).run())
+            _check(at)
+
+        # 票券視窗：開啟 → (編輯) → 儲存
+        button(at, key="btm_home").click().run()
+        rec.measure("ticket_open", lambda: button(at, key="fw_w").click().run())
+        _check(at)
+        if any(b.label == "Edit Voucher" for b in at.button):
+            button(at, "Edit Voucher").click().run()
+        next(t for t in at.text_input if t.label == "Confirmation No.").input(f"BENCH{time.time_ns() % 10000}")
+        rec.measure("ticket_save", lambda: button(at, "Save Changes").click().run())
+        _check(at)
+
+
+def compare(result, baseline):
+    print(f"{'interaction':<16}{'p50 base':>10}{'p50 now':>10}{'ratio':>8}", file=sys.stderr)
+    for name, now in result["interactions"].items():
+        base = baseline.get("interactions", {}).get(name)
+        if not base:
+            continue
+        b, n = base["wall_ms"]["p50"], now["wall_ms"]["p50"]
+        print(f"{name:<16}{b:>10.1f}{n:>10.1f}{(n / b if b else 0):>8.2f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--memory-iterations", type=int, default=2,
+                        help="extra pass under tracemalloc (kept separate so it does not skew timings)")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub provider latency in seconds")
+    parser.add_argument("--mode", default="ok", choices=["ok", "error", "timeout", "garbage", "flaky"])
+    parser.add_argument("--fail-rate", type=float, default=0.3)
+    parser.add_argument("--out")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    with StubProviders(latency=args.latency, mode=args.mode, fail_rate=args.fail_rate) as stub, \
+            tempfile.TemporaryDirectory() as tmp:
+        # 必須在 app 第一次 import providers / trip_store 之前設定
+        os.environ.update(stub.env())
+        os.environ["PROVIDER_CACHE_PATH"] = os.path.join(tmp, "providers.sqlite3")
+        os.environ["TRIP_STORE_PATH"] = os.path.join(tmp, "trip.sqlite3")
+        os.environ["TICKET_IMAGE_DIR"] = os.path.join(tmp, "tickets")
+        from trip_data import load_trip
+        days = len(load_trip().days)
+
+        timing = Recorder(memory=False)
+        run_session(timing, args.iterations, days)
+        memory = Recorder(memory=True)
+        tracemalloc.start()
+        run_session(memory, args.memory_iterations, days)
+        tracemalloc.stop()
+        upstream = dict(stub.config.requests)
+
+    import streamlit
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "streamlit": streamlit.__version__,
+            "iterations": args.iterations,
+            "stub": {"latency": args.latency, "mode": args.mode, "fail_rate": args.fail_rate},
+            "upstream_requests": upstream,
+        },
+        "interactions": {
+            name: {
+                "n": len(s["wall_ms"]),
+                "wall_ms": summarize(s["wall_ms"]),
+                "cpu_ms": summarize(s["cpu_ms"]),
+                "peak_kib": summarize(memory.samples[name]["peak_kib"], 1),
+            }
+            for name, s in timing.samples.items()
+        },
+    }
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# 時間衝突檢查在大型行程上的成本
+#
+#   python bench/schedule_bench.py [--days 100 1000] [--per-day 20]
+#
+# 合成行程：每天 --per-day 個 activity，時間隨機、部分帶 stayTime。量：
+#   full_check     第一次檢查整個行程 (每天排序後掃一次)
+#   edit_recheck   改了其中一天之後再檢查整個行程 (只有那天會重算)
+#   one_day_sweep  把所有 activity 放在同一天掃一次 (n log n)，對照 pairwise 的 O(n²)
+# 結果以 JSON 印到 stdout。
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from schedule import ScheduleChecker, day_intervals, find_conflicts  # noqa: E402
+
+
+class SyntheticTrip:
+    # 只實作 ScheduleChecker 用到的介面 (path / days / day_version / version / activities)
+    def __init__(self, days, per_day, rng):
+        self.path = f"synthetic-{days}"
+        self.days = [{"id": d} for d in range(days)]
+        self._acts = [self._make_day(per_day, rng) for _ in range(days)]
+        self._versions = [0] * days
+
+    @staticmethod
+    def _make_day(n, rng):
+        acts = []
+        for _ in range(n):
+            minute = rng.randrange(6 * 60, 23 * 60)
+            act = {"time": f"{minute // 60:02d}:{minute % 60:02d}"}
+            if rng.random() < 0.6:
+                act["stayTime"] = rng.choice(["30 分", "1 小時", "1.5 小時", "2 小時"])
+            acts.append(act)
+        return acts
+
+    def day_version(self, day_idx):
+        return self._versions[day_idx]
+
+    def version(self):
+        return tuple(self._versions)
+
+    def activities(self, day_idx):
+        return self._acts[day_idx]
+
+    def edit(self, day_idx, rng):
+        self._acts[day_idx][0]["stayTime"] = rng.choice(["45 分", "3 小時"])
+        self._versions[day_idx] += 1
+
+
+def pairwise(starts, ends):
+    n, count = len(starts), 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            if starts[i] < ends[j] and starts[j] < ends[i]:
+                count += 1
+    return count
+
+
+def ms(fn):
+    t = time.perf_counter()
+    result = fn()
+    return round((time.perf_counter() - t) * 1000, 2), result
+
+
+def run(days, per_day, rng):
+    trip = SyntheticTrip(days, per_day, rng)
+    checker = ScheduleChecker()
+    full_ms, result = ms(lambda: checker.trip(trip))
+    before = checker.rechecks
+    trip.edit(days // 2, rng)
+    edit_ms, _ = ms(lambda: checker.trip(trip))
+
+    acts = [act for d in range(days) for act in trip.activities(d)]
+    starts, ends = day_intervals(acts)
+    sweep_ms, conflicts = ms(lambda: find_conflicts(starts, ends))
+    out = {
+        "activities": len(acts),
+        "full_check_ms": full_ms,
+        "days_with_conflicts": sum(1 for c in result.values() if c),
+        "edit_recheck_ms": edit_ms,
+        "edit_rechecked_days": checker.rechecks - before,
+        "one_day_sweep_ms": sweep_ms,
+        "one_day_flagged": len(conflicts),
+    }
+    if len(acts) <= 5000:
+        out["one_day_pairwise_ms"], _ = ms(lambda: pairwise(starts, ends))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--per-day", type=int, default=20)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    print(json.dumps([run(d, args.per_day, rng) for d in args.days], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# 全文搜尋在大型 (多行程) 語料上的建索引時間、記憶體與查詢延遲
+#
+#   python bench/search_bench.py [--copies 500] [--queries 2000]
+#
+# 語料是 trips/ 裡真實的 activities 複製 --copies 份 (每份的文字稍作變化)，
+# 全部放進同一個 SearchIndex。結果以 JSON 印到 stdout。
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search import SearchIndex, activity_fields  # noqa: E402
+from trip_data import load_trip  # noqa: E402
+
+QUERIES = ["海膽", "海膽丼", "cash only", "Cash", "拉麵", "溫泉", "丼", "札幌", "ニセコ", "機場", "不存在的字串", "a"]
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    trip = load_trip()
+    acts = [activity_fields(act) for i in range(len(trip.days)) for act in trip.activities(i)]
+
+    def build():
+        index = SearchIndex()
+        for copy in range(args.copies):
+            for n, fields in enumerate(acts):
+                index.add((copy, n), {k: f"{v} #{copy}" for k, v in fields.items()})
+        return index
+
+    t = time.perf_counter()
+    index = build()
+    build_s = time.perf_counter() - t
+    # 記憶體另外量一次，tracemalloc 會拖慢建索引
+    tracemalloc.start()
+    build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_query = {}
+    lat = []
+    for i in range(args.queries):
+        q = QUERIES[i % len(QUERIES)]
+        t = time.perf_counter()
+        hits = index.search(q)
+        us = (time.perf_counter() - t) * 1e6
+        lat.append(us)
+        per_query.setdefault(q, {"hits": len(hits), "us": []})["us"].append(us)
+
+    print(json.dumps({
+        "docs": len(index.docs),
+        "grams": len(index._postings),
+        "build_ms": round(build_s * 1000, 1),
+        "build_peak_mib": round(peak / 2**20, 1),
+        "query_us": {"p50": round(statistics.median(lat), 1), "p95": round(percentile(lat, 0.95), 1),
+                     "max": round(max(lat), 1)},
+        "per_query": {q: {"hits": v["hits"], "p50_us": round(statistics.median(v["us"]), 1)} for q, v in per_query.items()},
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
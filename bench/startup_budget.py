@@ -0,0 +1,120 @@
+# 冷啟動預算檢查：import 時間 (-X importtime) 與第一次渲染首頁的時間
+#
+#   python bench/startup_budget.py [--import-budget 40] [--render-budget 1500] [--runs 5]
+#
+# 在新的 Python process 裡 (-X importtime) 用 AppTest 跑第一次首頁，量：
+#   app_import_ms   app 自己的模組 (perf / styles / providers ...) import 的累計時間
+#   first_render_ms 第一次 at.run() 的時間 (含 import、讀行程、對本機 stub 抓天氣 / 匯率)
+#   heavy_loaded    首頁不該載入的重量級套件 (NumPy / PIL / google-generativeai) 有沒有被載入
+# 量的是部署後的冷啟動：先跑一次不計時的 process 把 bytecode 編譯到暫存的 PYTHONPYCACHEPREFIX
+# (不受 PYTHONDONTWRITEBYTECODE 或舊的 __pycache__ 影響，否則量到的大半是編譯時間)，
+# 再跑 --runs 次取最好的一次 (單核機器上其他 process 的干擾只會讓數字變大)。
+# 結果以 JSON 印到 stdout；超過預算或載入了不該載入的套件就以非 0 結束 (可放進 CI)。
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+APP = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+HEAVY = ("numpy", "PIL", "google.generativeai")
+_LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def app_modules():
+    return {f[:-3] for f in os.listdir(ROOT) if f.endswith(".py") and f != "app.py"}
+
+
+def child():
+    # 在 -X importtime 的子 process 裡執行
+    from stub_providers import StubProviders
+    with StubProviders() as stub, tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(stub.env(), PREFETCH="off", GUIDE_CLIENT="off",
+                          PROVIDER_CACHE_PATH=os.path.join(tmp, "providers.sqlite3"),
+                          TRIP_STORE_PATH=os.path.join(tmp, "trip.sqlite3"))
+        from streamlit.testing.v1 import AppTest
+        at = AppTest.from_file(APP, default_timeout=60)
+        t = time.perf_counter()
+        at.run()
+        first = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        at.run()
+        second = (time.perf_counter() - t) * 1000
+        out = {"first_render_ms": round(first, 1), "second_render_ms": round(second, 1),
+               "exception": [e.message for e in at.exception],
+               "heavy_loaded": [m for m in HEAVY if m in sys.modules]}
+    print(json.dumps(out))
+
+
+def parse_importtime(stderr, modules):
+    # 只算 app 自己的模組在最外層 (被 app.py 直接 import) 的累計時間
+    per_module = {}
+    for line in stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m and not m.group(3) and m.group(4) in modules:
+            per_module[m.group(4)] = int(m.group(2)) / 1000
+    return per_module
+
+
+def run_child(env, importtime):
+    flags = ["-X", "importtime"] if importtime else []
+    proc = subprocess.run([sys.executable, *flags, os.path.abspath(__file__), "--child"],
+                          capture_output=True, text=True, cwd=ROOT, env=env)
+    try:
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        sys.stderr.write(proc.stderr[-4000:])
+        sys.exit(2)
+    per_module = parse_importtime(proc.stderr, app_modules())
+    result["app_import_ms"] = round(sum(per_module.values()), 1)
+    result["slowest_imports_ms"] = dict(sorted(per_module.items(), key=lambda kv: -kv[1])[:5])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--import-budget", type=float, default=40.0, help="ms for the app's own modules")
+    parser.add_argument("--render-budget", type=float, default=1500.0, help="ms for the first AppTest run")
+    parser.add_argument("--runs", type=int, default=5, help="measured runs; the best one is compared to the budget")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=os.path.join(tmp, "pycache"))
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        run_child(env, importtime=False)  # 編譯 bytecode，不計
+        runs = [run_child(env, importtime=True) for _ in range(max(1, args.runs))]
+    result = min(runs, key=lambda r: r["app_import_ms"])
+    result["first_render_ms"] = min(r["first_render_ms"] for r in runs)
+    result["exception"] = [m for r in runs for m in r["exception"]]
+    result["heavy_loaded"] = sorted({m for r in runs for m in r["heavy_loaded"]})
+    result["runs"] = {"app_import_ms": [r["app_import_ms"] for r in runs],
+                      "first_render_ms": [r["first_render_ms"] for r in runs]}
+    result["budget"] = {"import_ms": args.import_budget, "render_ms": args.render_budget}
+    failures = []
+    if result["exception"]:
+        failures.append("app raised an exception")
+    if result["app_import_ms"] > args.import_budget:
+        failures.append(f"app imports took {result['app_import_ms']} ms (budget {args.import_budget})")
+    if result["first_render_ms"] > args.render_budget:
+        failures.append(f"first render took {result['first_render_ms']} ms (budget {args.render_budget})")
+    if result["heavy_loaded"]:
+        failures.append(f"home page loaded {', '.join(result['heavy_loaded'])}")
+    result["failures"] = failures
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
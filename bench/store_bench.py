@@ -0,0 +1,68 @@
+# trip_store 讀取延遲與寫入吞吐量
+#
+#   python bench/store_bench.py [--items 1000] [--reads 5000] [--writes 2000]
+#
+# 結果以 JSON 印到 stdout，方便和上一次的結果比較。
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trip_store import TripStore  # noqa: E402
+
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TripStore(os.path.join(tmp, "bench.sqlite3"))
+        tickets, packing = store.tickets("bench"), store.packing("bench")
+        for i in range(args.items):
+            tickets.put(f"t_{i}", {"orderNumber": f"X{i}", "url": "", "note": "", "image": None})
+        ids = [packing.add_item(f"cat{i % 20}", f"item{i}") for i in range(args.items)]
+
+        lat = []
+        for i in range(args.reads):
+            t = time.perf_counter()
+            tickets.get(f"t_{i % args.items}")
+            lat.append((time.perf_counter() - t) * 1e6)
+
+        t = time.perf_counter()
+        for i in range(args.writes):
+            packing.set_checked(ids[i % len(ids)], i % 2)
+        toggle_s = time.perf_counter() - t
+
+        t = time.perf_counter()
+        for i in range(args.writes):
+            tickets.put(f"t_{i % args.items}", {"orderNumber": f"Y{i}", "url": "", "note": "", "image": None})
+        put_s = time.perf_counter() - t
+
+        t = time.perf_counter()
+        for _ in range(50):
+            packing.categories()
+        list_ms = (time.perf_counter() - t) / 50 * 1000
+
+    print(json.dumps({
+        "items": args.items,
+        "ticket_get_us": {"p50": round(statistics.median(lat), 1), "p95": round(percentile(lat, 0.95), 1)},
+        "packing_toggle_per_s": round(args.writes / toggle_s),
+        "ticket_put_per_s": round(args.writes / put_s),
+        "packing_list_load_ms": round(list_ms, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# 本機的 Open-Meteo / currency-api 替身，給 benchmark 與壓力測試使用
+#
+#   python bench/stub_providers.py --port 8765 --latency 0.3 --mode ok
+#
+# 然後以 WEATHER_API_URL=http://127.0.0.1:8765/v1/forecast
+#        FX_API_URL=http://127.0.0.1:8765/currencies/jpy.json 啟動 app。
+#
+# mode:
+#   ok       正常回應
+#   error    一律回 503
+#   timeout  睡到超過 app 的 timeout 才回應
+#   garbage  回傳無法解析的內容
+#   flaky    依 --fail-rate 隨機回 503
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FX_TABLE = {"jpy": {"twd": 0.2101, "usd": 0.00667, "eur": 0.00612, "hkd": 0.0519, "krw": 9.21, "cny": 0.0478}}
+
+
+class StubConfig:
+    def __init__(self, latency=0.0, mode="ok", fail_rate=0.0, timeout_sleep=3.0):
+        self.latency = latency
+        self.mode = mode
+        self.fail_rate = fail_rate
+        self.timeout_sleep = timeout_sleep
+        self.lock = threading.Lock()
+        self.requests = {"forecast": 0, "fx": 0}
+
+
+def _forecast_payload(query):
+    lats = query.get("latitude", ["0"])[0].split(",")
+    start = query.get("start_date", [None])[0]
+    end = query.get("end_date", [None])[0]
+    out = []
+    for i, _ in enumerate(lats):
+        loc = {"current": {"temperature_2m": -3.0 - i, "weather_code": 71}}
+        if start and end:
+            first, last = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+            dates = [(first + datetime.timedelta(days=n)).isoformat() for n in range((last - first).days + 1)]
+            loc["daily"] = {"time": dates, "weather_code": [71] * len(dates),
+                            "temperature_2m_max": [-1.0] * len(dates), "temperature_2m_min": [-8.0] * len(dates)}
+            loc["hourly"] = {"time": [f"{d}T{h:02d}:00" for d in dates for h in range(24)],
+                             "temperature_2m": [-4.0] * (24 * len(dates)), "weather_code": [71] * (24 * len(dates))}
+        out.append(loc)
+    return out[0] if len(out) == 1 else out
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        # keep-alive，才量得到 client 端連線池的效果；header 與 body 分開送，關掉 Nagle 免得每次多等 40ms
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            kind = "fx" if url.path.endswith(".json") else "forecast"
+            with config.lock:
+                config.requests[kind] += 1
+            if config.latency:
+                time.sleep(config.latency)
+            mode = config.mode
+            if mode == "flaky":
+                mode = "error" if random.random() < config.fail_rate else "ok"
+            if mode == "timeout":
+                time.sleep(config.timeout_sleep)
+            if mode == "error":
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = b"<html>not json" if mode == "garbage" else json.dumps(
+                FX_TABLE if kind == "fx" else _forecast_payload(parse_qs(url.query))).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client 已經逾時放棄
+
+    return Handler
+
+
+class StubProviders:
+    """Threaded stub server; use as a context manager in benchmarks."""
+
+    def __init__(self, port=0, **config):
+        self.config = StubConfig(**config)
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(self.config))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def env(self):
+        return {"WEATHER_API_URL": f"{self.base_url}/v1/forecast", "FX_API_URL": f"{self.base_url}/currencies/jpy.json"}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--mode", default="ok", choices=["ok", "error", "timeout", "garbage", "flaky"])
+    parser.add_argument("--fail-rate", type=float, default=0.3)
+    args = parser.parse_args()
+    with StubProviders(args.port, latency=args.latency, mode=args.mode, fail_rate=args.fail_rate) as stub:
+        for k, v in stub.env().items():
+            print(f"{k}={v}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
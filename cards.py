@@ -0,0 +1,218 @@
+# 行程表卡片 HTML
+# 卡片的輸入只有行程資料與配色，所以同一張卡片在 process 內只組一次字串，
+# 之後的 rerun (包含其他元件觸發的) 都直接重用。
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """Process-wide LRU of rendered HTML fragments.
+
+    key 會帶上資料版本與配色，所以行程或主題一改，舊的片段自然不再命中，
+    之後被 LRU 淘汰，不需要手動清除。
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        with self._lock:
+            html = self._items.get(key)
+            if html is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        html = build()
+        with self._lock:
+            self._items[key] = html
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+
+fragment_cache = FragmentCache()
+
+
+def content_version(data):
+    return hashlib.md5(json.dumps(data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def theme_key(colors):
+    return tuple(sorted(colors.items()))
+
+
+def day_header_html(day, colors, forecast_html=""):
+    return f"""
+    <div style="text-align:center; margin: 10px 0 20px 0;">
+        <div style="font-size: 1.5rem; font-weight: 600; color: {colors['text_primary']}; margin-bottom: 5px;">{day['full_date']}</div>
+        <div style="font-size: 0.9rem; color: {colors['text_secondary']}; display:flex; align-items:center; justify-content:center; gap:6px;">
+            <span>📍</span> {day['location']}{forecast_html}
+        </div>
+    </div>
+    """
+
+
+def hourly_html(hours, colors):
+    cells = "".join(f"<div style='text-align:center;'><div>{h:02d}</div><div style='color:{colors['text_primary']};'>{temp}°</div>"
+                    f"<div>{text}</div></div>" for h, temp, text in hours)
+    return f"""
+    <div style="display:flex; justify-content:center; gap:16px; margin: -12px 0 20px 0; font-size:0.7rem; color:{colors['text_secondary']};">
+        {cells}
+    </div>
+    """
+
+
+def hotel_card_html(day, colors):
+    return f"""
+        <div style="display:flex; justify-content:space-between; align-items:start;">
+            <div>
+                <div style="font-size:0.7rem; font-weight:600; color:{colors['text_secondary']}; letter-spacing:0.1em; margin-bottom:6px;">ACCOMMODATION</div>
+                <div style="font-weight:500; font-size:1.2rem; margin-bottom:4px; font-family:'Shippori Mincho', serif;">{day['hotel']}</div>
+                <div style="font-size:0.85rem; color:{colors['text_secondary']};">{day['hotel_note']}</div>
+            </div>
+            <div style="font-size:1.8rem; color:{colors['line_light']};">🛏️</div>
+        </div>
+        <div style="border-top: 1px dashed {colors['line_light']}; margin: 16px 0 12px 0;"></div>
+        """
+
+
+def activity_card_html(act, is_last, colors):
+    return f"""
+        <div style="position: relative; padding-left: 24px; margin-bottom: 1.5rem;">
+            <div class="timeline-point" style="position: absolute; left: 0; top: 6px;"></div>
+            {'' if is_last else '<div class="timeline-line"></div>'}
+            <div style="font-family:'Shippori Mincho', serif; font-size:0.9rem; font-weight:600; color:{colors['text_primary']}; margin-bottom: 8px;">{act['time']}</div>
+            <div class="minimal-card" style="display:flex; justify-content:space-between; align-items:center; padding: 1.2rem;">
+                <div>
+                    <div style="font-weight:500; font-size:1.1rem; color:{colors['text_primary']}; font-family: 'Shippori Mincho', serif; margin-bottom: 4px;">{act['text']}</div>
+                    <div style="font-size:0.85rem; color:{colors['text_secondary']};">{act['desc']}</div>
+                </div>
+                <div style="font-size:1.5rem; color:{colors['line_light']};">{'🍴' if act['type'] == 'food' else '🚆' if act['type'] == 'transport' else '📍'}</div>
+            </div>
+        </div>
+        """
+
+
+def transit_html(leg, colors):
+    icon = "🚶" if leg['mode'] == "walk" else "🚗"
+    minutes = max(1, round(leg['minutes'] / 5) * 5) if leg['minutes'] >= 10 else max(1, round(leg['minutes']))
+    return f"""
+        <div style="padding-left: 24px; margin: -0.8rem 0 1rem 0; font-size:0.75rem; color:{colors['text_secondary']};">
+            {icon} 約 {minutes} 分 · {leg['km']:.1f} km
+        </div>
+        """
+
+
+def conflict_html(conflicts, acts, colors):
+    lines = []
+    for c in conflicts:
+        other = acts[c.other]
+        if c.kind == "overlap":
+            lines.append(f"⚠️ 與 {other['time']} {other['text']} 重疊 {c.minutes} 分")
+        else:
+            lines.append(f"⏱ 與 {other['time']} {other['text']} 之間只有 {c.minutes} 分 (預估需要 {c.needed} 分)")
+    return f"""
+        <div style="padding-left: 24px; margin: -1rem 0 1rem 0; font-size:0.75rem; color:{colors['alert_red']};">
+            {'<br>'.join(lines)}
+        </div>
+        """
+
+
+# --- 查看詳情 (只有打開的那一個才會組) ---
+
+def guide_text_html(act, colors):
+    return f"<p style='font-size:0.9rem; color:{colors['text_primary']};'>{act['guideText']}</p>"
+
+
+def menu_html(menu, notes, colors):
+    # notes: {index: 換算後的價格文字}
+    items = "".join(
+        f"<li>{m}" + (f" <span style='color:{colors['text_secondary']}; font-size:0.8rem;'>≈ {notes[n]}</span>" if n in notes else "") + "</li>"
+        for n, m in enumerate(menu))
+    return f"""
+                <div style="background:#FFF; border:1px solid {colors['line_light']}; padding:12px; border-radius:8px; margin-top:10px;">
+                    <div style="font-size:0.7rem; color:{colors['accent_warm']}; font-weight:600; margin-bottom:5px;">RECOMMENDED</div>
+                    <ul style="margin:0; padding-left:20px; font-size:0.9rem;">{items}</ul>
+                </div>
+                """
+
+
+def detail_links_html(act, nearby, colors):
+    # nearby: [(名稱, 日期, km)]
+    out = ""
+    if nearby:
+        rows = "".join(f"<li>{text} <span style='color:{colors['text_secondary']};'>· {date} · {km:.1f} km</span></li>"
+                       for text, date, km in nearby)
+        out += (f"<div style='font-size:0.75rem; color:{colors['text_secondary']}; margin-top:10px;'>🍴 附近的美食 / 商店</div>"
+                f"<ul style='margin:0; padding-left:20px; font-size:0.85rem;'>{rows}</ul>")
+    if 'mapUrl' in act:
+        out += f'<a href="{act["mapUrl"]}" target="_blank" style="display:flex; align-items:center; justify-content:center; background-color:#FFFFFF; color:{colors["text_primary"]}; border:1px solid {colors["line_light"]}; border-radius:24px; padding:0.5rem 1rem; text-decoration:none; font-weight:500; width:100%; box-shadow:0 1px 2px rgba(0,0,0,0.05); margin:14px 0 10px 0;">📍 Google Map</a>'
+    return out
+
+
+class ItineraryCards:
+    """Memoized card renderers for one itinerary version + theme.
+
+    version 由呼叫端提供 (行程檔的 mtime，或記憶體資料用 content_version 計算)；
+    同一份資料在不同 rerun 得到相同 key。
+    """
+
+    def __init__(self, version, colors, cache=fragment_cache):
+        self.colors = colors
+        self.cache = cache
+        self.version = version
+        self.theme = theme_key(colors)
+
+    def day_header(self, day, forecast_html=""):
+        return self.cache.get((self.version, self.theme, day['id'], "header", forecast_html),
+                              lambda: day_header_html(day, self.colors, forecast_html))
+
+    def hourly(self, day, hours):
+        # 預報隨時間更新，內容本身放進 key
+        return self.cache.get((self.version, self.theme, day['id'], "hourly", tuple(hours)),
+                              lambda: hourly_html(hours, self.colors))
+
+    def hotel(self, day):
+        return self.cache.get((self.version, self.theme, day['id'], "hotel"),
+                              lambda: hotel_card_html(day, self.colors))
+
+    def transit(self, day, i, leg):
+        # leg 由同一版本的行程資料算出，key 不必帶 leg
+        return self.cache.get((self.version, self.theme, day['id'], "transit", i),
+                              lambda: transit_html(leg, self.colors))
+
+    def conflicts(self, day, i, conflicts):
+        # 衝突結果同樣由這個版本的資料算出
+        return self.cache.get((self.version, self.theme, day['id'], "conflicts", i),
+                              lambda: conflict_html(conflicts, day['activities'], self.colors))
+
+    def guide_text(self, day, i):
+        return self.cache.get((self.version, self.theme, day['id'], "guide", i),
+                              lambda: guide_text_html(day['activities'][i], self.colors))
+
+    def menu(self, day, i, notes):
+        # 價格換算隨匯率變動，換算結果放進 key
+        return self.cache.get((self.version, self.theme, day['id'], "menu", i, tuple(sorted(notes.items()))),
+                              lambda: menu_html(day['activities'][i]['menu'], notes, self.colors))
+
+    def detail_links(self, day, i, nearby):
+        # 附近美食取自整個行程 (其他天的檔案也可能改過)，所以內容本身放進 key
+        return self.cache.get((self.version, self.theme, day['id'], "links", i, tuple(nearby)),
+                              lambda: detail_links_html(day['activities'][i], nearby, self.colors))
+
+    def activity(self, day, i):
+        acts = day['activities']
+        return self.cache.get((self.version, self.theme, day['id'], i),
+                              lambda: activity_card_html(acts[i], i == len(acts) - 1, self.colors))
@@ -0,0 +1,234 @@
+# 行程匯出：手機行事曆 (.ics) 與離線版 HTML
+# 兩種匯出都只由行程資料 (trip.json + days/*.json) 與配色決定，所以依內容 hash 快取：
+# 同一份資料不論被下載幾次都只產生一次；任何一天的內容改了，hash 不同才重新產生。
+#   iter_ics(trip)           一次產生一個 VEVENT (串流，寫檔或回應都不必先組好整份)
+#   iter_html(trip, colors)  一次產生一天，卡片沿用 cards.py 的模板 (和行程表是同一份 HTML)
+#   ics_bytes / html_bytes   下載用，經過 export_cache
+import datetime
+import threading
+from collections import OrderedDict
+from zoneinfo import ZoneInfo
+
+from cards import ItineraryCards, content_version, theme_key
+from schedule import parse_duration, parse_time, schedule_checker
+
+# trip.json 可以用 "timezone" 覆寫；時間一律轉成 UTC 輸出，行事曆 app 會換回手機的時區
+TIMEZONE = "Asia/Tokyo"
+PRODID = "-//Hokkaido Trip//Itinerary Export//ZH-TW"
+# process 內最多保留幾個行程的匯出結果 (LRU)，和 trip_store.PACKING_INDEX_LIMIT 一樣
+EXPORT_TRIP_LIMIT = 64
+
+
+# --- iCalendar (RFC 5545) ---
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line):
+    # 每行最多 75 octets，續行以一個空白開頭；不能切在 UTF-8 字元中間
+    data = line.encode("utf-8")
+    parts, start, limit = [], 0, 75
+    while len(data) - start > limit:
+        end = start + limit
+        while data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start, limit = end, 74
+    parts.append(data[start:].decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _ics_time(dt):
+    return dt.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _start(day, act, tz):
+    # time 可能超過 24:00 (深夜的行程)，用分鐘數加上去
+    midnight = datetime.datetime.combine(datetime.date.fromisoformat(day['iso_date']), datetime.time(), tzinfo=tz)
+    return midnight + datetime.timedelta(minutes=parse_time(act['time']))
+
+
+def _updated_at(trip):
+    # DTSTAMP 用資料最後修改的時間，同一份資料每次產生的內容都一樣
+    # version() 的每一項是 (path, trip.json 的 (mtime_ns, size), 當天檔案的 (mtime_ns, size))
+    latest = max(max(index[0], day[0]) for _, index, day in trip.version())
+    return datetime.datetime.fromtimestamp(latest / 1e9, datetime.timezone.utc)
+
+
+def _vevent(trip, day, i, act, tz, stamp):
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{trip.id}-{day['id']}-{i}@hokkaido-trip",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{_ics_time(_start(day, act, tz))}",
+    ]
+    minutes = parse_duration(act.get('stayTime'))
+    if minutes:
+        lines.append(f"DURATION:PT{minutes}M")
+    lines.append(f"SUMMARY:{_escape(act['text'])}")
+    if 'mapUrl' in act:
+        lines.append(f"LOCATION:{_escape(act['mapUrl'])}")
+        lines.append(f"URL:{act['mapUrl']}")
+    if 'coords' in act:
+        lines.append(f"GEO:{act['coords']['lat']};{act['coords']['lon']}")
+    desc = [act['desc']]
+    if 'contact' in act:
+        desc.append(f"☎ {act['contact']}")
+    desc += [f"・{m}" for m in act.get('menu', [])]
+    desc += [f"※ {n}" for n in act.get('notes', [])]
+    lines.append(f"DESCRIPTION:{_escape(chr(10).join(desc))}")
+    lines.append(f"CATEGORIES:{act['type'].upper()}")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def iter_ics(trip):
+    """Yield the trip as an iCalendar feed: the header, then one chunk per activity."""
+    tz = ZoneInfo(trip.index.get('timezone', TIMEZONE))
+    stamp = _ics_time(_updated_at(trip))
+    yield "".join(_fold(line) for line in (
+        "BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}", "CALSCALE:GREGORIAN", "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(trip.index['title'])}"))
+    for day_idx, day in enumerate(trip.days):
+        for i, act in enumerate(trip.activities(day_idx)):
+            yield "".join(_fold(line) for line in _vevent(trip, day, i, act, tz, stamp))
+    yield _fold("END:VCALENDAR")
+
+
+# --- 離線版 HTML ---
+
+# 離線時沒有 Streamlit 的版面與 expander，補上最少的樣式 (字型用系統的 serif)
+_PAGE_CSS = """
+    body { margin: 0; }
+    main { max-width: 720px; margin: 0 auto; padding: 16px 16px 40px; }
+    nav { display: flex; flex-wrap: wrap; gap: 8px; justify-content: center; margin-bottom: 24px; }
+    nav a { padding: 6px 12px; border-radius: 16px; text-decoration: none; font-size: 0.85rem; }
+    details { margin: -0.8rem 0 1.2rem 24px; font-size: 0.85rem; }
+    summary { cursor: pointer; }
+    section { margin-bottom: 48px; }
+"""
+
+
+def iter_html(trip, colors):
+    """Yield a self-contained page with every day, one chunk per day, built from the app's card templates."""
+    # 依賴 NumPy 的 geo 只有真的匯出時才載入
+    from geo import trip_geo
+    from styles import compile_stylesheet
+    css, _ = compile_stylesheet(theme_key(colors), "none", "")
+    geo = trip_geo(trip)
+    title = trip.index['title']
+    links = "".join(f"<a href='#day-{day['id']}' style='background:{colors['surface']}; border:1px solid {colors['line_light']};'>"
+                    f"{day['date']} {day['weekday']}</a>" for day in trip.days)
+    yield f"""<!DOCTYPE html>
+<html lang="zh-Hant">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>{css}{_PAGE_CSS}</style>
+</head>
+<body class="stApp">
+<main>
+<div style="text-align:center; padding: 24px 0 8px;">
+    <h1 style="font-size: 2rem; margin-bottom: 8px; font-weight: 500;">{title}</h1>
+    <p style="color:{colors['text_secondary']}; letter-spacing: 0.3em; font-size: 0.8rem;">{trip.index['subtitle']}</p>
+</div>
+<nav>{links}</nav>
+"""
+    for day_idx in range(len(trip.days)):
+        day = trip.day(day_idx)
+        cards = ItineraryCards(trip.day_version(day_idx), colors)
+        conflicts = schedule_checker.day(trip, day_idx, geo.travel_minutes(day_idx))
+        out = [f"<section id='day-{day['id']}'>", cards.day_header(day), f"<div class='minimal-card'>{cards.hotel(day)}</div>"]
+        for i, act in enumerate(day['activities']):
+            out.append(cards.activity(day, i))
+            if i in conflicts:
+                out.append(cards.conflicts(day, i, conflicts[i]))
+            detail = []
+            if 'guideText' in act:
+                detail.append(cards.guide_text(day, i))
+            if act['type'] == 'food' and 'menu' in act:
+                detail.append(cards.menu(day, i, {}))
+            nearby = [(a['text'], trip.days[d]['full_date'], round(km, 1)) for km, (d, _), a in geo.nearest_food(day_idx, i)]
+            detail.append(cards.detail_links(day, i, nearby))
+            if any(detail):
+                out.append(f"<details><summary>查看詳情</summary>{''.join(detail)}</details>")
+            leg = geo.leg(day_idx, i)
+            if leg:
+                out.append(cards.transit(day, i, leg))
+        out.append("</section>\n")
+        yield "".join(out)
+    yield "</main>\n</body>\n</html>\n"
+
+
+# --- 依內容 hash 快取 ---
+
+class ExportCache:
+    """Rendered exports keyed by the trip's content hash; one entry per (trip, format), LRU over trips."""
+
+    def __init__(self, limit=EXPORT_TRIP_LIMIT):
+        self.limit = limit
+        self._lock = threading.Lock()
+        # trip path -> {"hash": (trip.version(), content hash), "locks": {format: Lock}, format: (digest, bytes)}
+        # locks：同時下載的人只有一個在產生
+        self._trips = OrderedDict()
+        self.renders = 0
+        self.hits = 0
+
+    def _entry(self, trip):
+        # 呼叫端需持有 self._lock
+        entry = self._trips.get(trip.path)
+        if entry is None:
+            entry = self._trips[trip.path] = {"hash": None, "locks": {}}
+            if len(self._trips) > self.limit:
+                self._trips.popitem(last=False)
+        self._trips.move_to_end(trip.path)
+        return entry
+
+    def content_hash(self, trip):
+        # 檔案的 mtime / 大小沒變就不必重新讀檔計算 hash
+        version = trip.version()
+        with self._lock:
+            cached = self._entry(trip)["hash"]
+        if cached and cached[0] == version:
+            return cached[1]
+        digest = content_version({"index": trip.index, "days": [trip.activities(d) for d in range(len(trip.days))]})
+        with self._lock:
+            self._entry(trip)["hash"] = (version, digest)
+        return digest
+
+    def get(self, trip, fmt, render, salt=None):
+        """(digest, bytes) for render() (an iterator of str chunks), rendered only when the digest changes."""
+        digest = self.content_hash(trip)
+        if salt is not None:
+            digest = content_version([digest, salt])
+        with self._lock:
+            lock = self._entry(trip)["locks"].setdefault(fmt, threading.Lock())
+        with lock:
+            with self._lock:
+                cached = self._entry(trip).get(fmt)
+                if cached and cached[0] == digest:
+                    self.hits += 1
+                    return cached
+            data = "".join(render()).encode("utf-8")
+            with self._lock:
+                self._entry(trip)[fmt] = (digest, data)
+                self.renders += 1
+            return digest, data
+
+    def stats(self):
+        with self._lock:
+            entries = sum(len(entry) - 2 for entry in self._trips.values())
+            return {"renders": self.renders, "hits": self.hits, "entries": entries}
+
+
+export_cache = ExportCache()
+
+
+def ics_bytes(trip):
+    return export_cache.get(trip, "ics", lambda: iter_ics(trip))[1]
+
+
+def html_bytes(trip, colors):
+    return export_cache.get(trip, "html", lambda: iter_html(trip, colors), salt=theme_key(colors))[1]
@@ -0,0 +1,70 @@
+# 匯率表與多幣別換算
+# currency-api 一次回傳「1 日圓 = 多少各幣別」的整張表；整張留著，任意兩個幣別都經由日圓交叉換算。
+# 換算吃陣列 (NumPy)，一張卡片上的所有價格一次算完；NumPy 等到第一次換算才載入 (首頁冷啟動用不到)。
+import re
+
+BASE = "jpy"
+SYMBOLS = {"jpy": "¥", "twd": "NT$", "usd": "US$", "hkd": "HK$", "eur": "€", "krw": "₩", "cny": "CN¥", "gbp": "£"}
+# 換算器選單上優先列出的幣別
+COMMON = ("jpy", "twd", "usd", "hkd", "eur", "krw", "cny")
+
+_PRICE_RE = re.compile(r"[¥￥]\s?(\d[\d,]*)|(\d[\d,]*)\s?(?:円|日圓)")
+
+
+class FxTable:
+    """Rates per 1 unit of BASE for every currency in one download."""
+
+    def __init__(self, rates, date=None, fallback=False):
+        clean = {c.lower(): float(r) for c, r in rates.items() if isinstance(r, (int, float)) and r > 0}
+        clean[BASE] = 1.0
+        self.date = date
+        self.fallback = fallback
+        self.codes = sorted(clean)
+        self._index = {c: i for i, c in enumerate(self.codes)}
+        self._values = [clean[c] for c in self.codes]
+        self._array = None
+
+    @property
+    def _rates(self):
+        if self._array is None:
+            import numpy as np
+            self._array = np.array(self._values)
+        return self._array
+
+    def __contains__(self, code):
+        return code.lower() in self._index
+
+    def _idx(self, codes):
+        import numpy as np
+        # 大量代碼時逐一 lower() 的成本比換算本身還高，這裡只接受小寫 (和 codes 一致)
+        return np.fromiter(map(self._index.__getitem__, codes), dtype=np.intp, count=len(codes))
+
+    def rate(self, src, dst):
+        """How many dst for 1 src (cross rate through BASE)."""
+        return self._values[self._index[dst.lower()]] / self._values[self._index[src.lower()]]
+
+    def convert(self, amounts, src, dst):
+        """Convert an array of amounts from one currency to another in one multiply."""
+        import numpy as np
+        return np.asarray(amounts, dtype=float) * self.rate(src, dst)
+
+    def convert_pairs(self, amounts, srcs, dsts):
+        """Element-wise conversion where every amount has its own (lowercase) currency pair."""
+        import numpy as np
+        amounts = np.asarray(amounts, dtype=float)
+        return amounts * (self._rates[self._idx(dsts)] / self._rates[self._idx(srcs)])
+
+    def menu_codes(self):
+        return [c for c in COMMON if c in self._index] + [c for c in self.codes if c not in COMMON]
+
+
+def format_money(amount, code):
+    code = code.lower()
+    symbol = SYMBOLS.get(code, code.upper() + " ")
+    digits = 0 if code in ("jpy", "krw", "twd") else 2
+    return f"{symbol}{amount:,.{digits}f}"
+
+
+def find_prices(text):
+    """Yen amounts written in free text ("¥1,200", "850円")."""
+    return [int((a or b).replace(",", "")) for a, b in _PRICE_RE.findall(text)]
@@ -0,0 +1,300 @@
+# 行程地點之間的距離、交通時間估計，以及「離這裡最近的美食」查詢
+# 距離矩陣用 NumPy 一次算完 (haversine)，之後某個地點新增 / 修改只重算那一列、那一行。
+# 最近鄰查詢用均勻網格索引，只看查詢點附近的格子，不掃全部地點。
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+# 交通時間估計：直線距離 × 繞路係數，短距離步行，其餘以車 / JR / 巴士的平均速度計
+DETOUR = 1.3
+WALK_MAX_KM = 1.5
+WALK_KMH = 4.5
+RIDE_KMH = 45.0
+RIDE_OVERHEAD_MIN = 10
+SAME_PLACE_KM = 0.05
+
+# 「附近美食」查詢的對象 (這份資料裡商店 / 伴手禮也標成 food)
+NEARBY_TYPES = {"food"}
+# process 內最多保留幾個行程的距離矩陣 (LRU)，和 trip_store.PACKING_INDEX_LIMIT 一樣
+GEO_TRIP_LIMIT = 64
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments in degrees, NumPy broadcasting applies."""
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    # 單一點對用純 Python (比 NumPy 純量運算快一個數量級)
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def haversine_matrix(lat, lon):
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return haversine(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def travel_estimate(km):
+    """(mode, minutes) for a straight-line distance, or None when both stops are the same place."""
+    if km < SAME_PLACE_KM:
+        return None
+    road = km * DETOUR
+    if road <= WALK_MAX_KM:
+        return "walk", road / WALK_KMH * 60
+    return "ride", RIDE_OVERHEAD_MIN + road / RIDE_KMH * 60
+
+
+class DistanceMatrix:
+    """Pairwise distances (km) between keyed points, updated one row/column at a time.
+
+    底層陣列預留容量 (加倍成長)，新增一個點只算 1×N 的距離；刪除時把最後一個點搬到空出來的位置。
+    """
+
+    def __init__(self, points=()):
+        points = list(points)  # [(key, lat, lon)]
+        n = len(points)
+        cap = max(8, n)
+        self._keys = [key for key, _, _ in points]
+        self._slot = {key: i for i, key in enumerate(self._keys)}
+        self._lat = np.zeros(cap)
+        self._lon = np.zeros(cap)
+        self._d = np.zeros((cap, cap))
+        if n:
+            self._lat[:n] = [lat for _, lat, _ in points]
+            self._lon[:n] = [lon for _, _, lon in points]
+            self._d[:n, :n] = haversine_matrix(self._lat[:n], self._lon[:n])
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._slot
+
+    @property
+    def keys(self):
+        return list(self._keys)
+
+    @property
+    def matrix(self):
+        n = len(self._keys)
+        return self._d[:n, :n]
+
+    def _grow(self):
+        n, cap = len(self._keys), len(self._lat)
+        if n < cap:
+            return
+        cap *= 2
+        lat, lon, d = np.zeros(cap), np.zeros(cap), np.zeros((cap, cap))
+        lat[:n], lon[:n], d[:n, :n] = self._lat[:n], self._lon[:n], self._d[:n, :n]
+        self._lat, self._lon, self._d = lat, lon, d
+
+    def set_point(self, key, lat, lon):
+        slot = self._slot.get(key)
+        if slot is None:
+            self._grow()
+            slot = self._slot[key] = len(self._keys)
+            self._keys.append(key)
+        n = len(self._keys)
+        self._lat[slot], self._lon[slot] = lat, lon
+        row = haversine(lat, lon, self._lat[:n], self._lon[:n])
+        row[slot] = 0.0
+        self._d[slot, :n] = row
+        self._d[:n, slot] = row
+
+    def remove(self, key):
+        slot = self._slot.pop(key, None)
+        if slot is None:
+            return
+        last = len(self._keys) - 1
+        if slot != last:
+            moved = self._keys[last]
+            self._keys[slot] = moved
+            self._slot[moved] = slot
+            self._lat[slot], self._lon[slot] = self._lat[last], self._lon[last]
+            self._d[slot, :last] = self._d[last, :last]
+            self._d[:last, slot] = self._d[:last, last]
+            self._d[slot, slot] = 0.0
+        self._keys.pop()
+
+    def distance(self, a, b):
+        return float(self._d[self._slot[a], self._slot[b]])
+
+
+class GridIndex:
+    """Uniform lat/lon grid for nearest-neighbour queries.
+
+    從查詢點所在的格子一圈一圈往外找；已找到 k 個且第 k 近的距離
+    小於「還沒看過的格子的最近可能距離」時就停止。
+    """
+
+    def __init__(self, cell_deg=0.02):
+        self.cell_deg = cell_deg
+        self._cells = {}  # (i, j) -> {key: (lat, lon)}
+        self._where = {}  # key -> (i, j)
+        self._bounds = None  # 有資料的格子範圍 (imin, imax, jmin, jmax)；刪除時不縮小，只是比較寬鬆
+
+    def __len__(self):
+        return len(self._where)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def insert(self, key, lat, lon):
+        self.remove(key)
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, {})[key] = (lat, lon)
+        self._where[key] = cell
+        i, j = cell
+        b = self._bounds or (i, i, j, j)
+        self._bounds = (min(b[0], i), max(b[1], i), min(b[2], j), max(b[3], j))
+
+    def remove(self, key):
+        cell = self._where.pop(key, None)
+        if cell is not None:
+            bucket = self._cells[cell]
+            del bucket[key]
+            if not bucket:
+                del self._cells[cell]
+
+    def nearest(self, lat, lon, k=3, exclude=()):
+        """[(km, key)] of the k nearest points, closest first."""
+        if not self._cells:
+            return []
+        ci, cj = self._cell(lat, lon)
+        # 需要走幾圈才能涵蓋所有有資料的格子
+        imin, imax, jmin, jmax = self._bounds
+        max_ring = max(ci - imin, imax - ci, cj - jmin, jmax - cj, 0)
+        found = []
+
+        def visit(cells):
+            for cell in cells:
+                for key, (plat, plon) in self._cells.get(cell, {}).items():
+                    if key not in exclude:
+                        found.append((haversine_km(lat, lon, plat, plon), key))
+
+        for ring in range(max_ring + 1):
+            if 8 * ring > len(self._cells):
+                # 外框的格子比有資料的格子還多：剩下的直接全部看過 (結果一樣精確)
+                visit(c for c in self._cells if max(abs(c[0] - ci), abs(c[1] - cj)) >= ring)
+                found.sort(key=lambda x: x[0])
+                return found[:k]
+            if ring == 0:
+                visit([(ci, cj)])
+            else:
+                visit((i, j) for i in range(ci - ring, ci + ring + 1) for j in (cj - ring, cj + ring))
+                visit((i, j) for i in (ci - ring, ci + ring) for j in range(cj - ring + 1, cj + ring))
+            found.sort(key=lambda x: x[0])
+            del found[k:]
+            # 沒看過的點至少離 ring 個格子寬；經度方向的格子寬度隨緯度變窄，取最窄的
+            far_lat = min(89.9, abs(lat) + (ring + 1) * self.cell_deg)
+            bound = ring * self.cell_deg * KM_PER_DEG * math.cos(math.radians(far_lat))
+            if len(found) == k and found[-1][0] <= bound:
+                break
+        return found
+
+
+class TripGeo:
+    """Distance matrix + food index for every activity with coordinates in one trip.
+
+    key 是 (day_idx, act_idx)。sync() 只重算檔案有變動的那幾天；整個行程的版本沒變就直接返回。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.matrix = DistanceMatrix()
+        self.food = GridIndex()
+        self.stops = {}       # key -> activity
+        self._versions = {}   # day_idx -> day_version
+        self._version = None  # 上次 sync 的 trip.version()
+
+    def sync(self, trip, version=None):
+        # version 由呼叫端先算好 (同一次 rerun 還要給 schedule_checker 用)，省得再 stat 一次
+        version = version or trip.version()
+        with self._lock:
+            if version == self._version:
+                return self
+            for day_idx, day_version in enumerate(version):
+                if self._versions.get(day_idx) != day_version:
+                    self._load_day(day_idx, trip.activities(day_idx))
+                    self._versions[day_idx] = day_version
+            for day_idx in [d for d in self._versions if d >= len(version)]:
+                self._load_day(day_idx, [])
+                del self._versions[day_idx]
+            self._version = version
+        return self
+
+    def _load_day(self, day_idx, acts):
+        for key in [key for key in self.stops if key[0] == day_idx]:
+            self.matrix.remove(key)
+            self.food.remove(key)
+            del self.stops[key]
+        for i, act in enumerate(acts):
+            coords = act.get('coords')
+            if not coords:
+                continue
+            key = (day_idx, i)
+            self.stops[key] = act
+            self.matrix.set_point(key, coords['lat'], coords['lon'])
+            if act['type'] in NEARBY_TYPES:
+                self.food.insert(key, coords['lat'], coords['lon'])
+
+    def leg(self, day_idx, i):
+        """{"km", "mode", "minutes"} from activity i to i + 1 of the same day, or None."""
+        return self.travel(day_idx, i, i + 1)
+
+    def travel(self, day_idx, a, b):
+        """Same as leg() for any two activities of one day."""
+        a, b = (day_idx, a), (day_idx, b)
+        with self._lock:
+            if a not in self.matrix or b not in self.matrix:
+                return None
+            km = self.matrix.distance(a, b)
+        estimate = travel_estimate(km)
+        if estimate is None:
+            return None
+        return {"km": km, "mode": estimate[0], "minutes": estimate[1]}
+
+    def travel_minutes(self, day_idx):
+        """travel(a, b) -> minutes for schedule.find_conflicts (0 for the same place, None if unknown)."""
+        def minutes(a, b):
+            with self._lock:
+                known = (day_idx, a) in self.matrix and (day_idx, b) in self.matrix
+            leg = self.travel(day_idx, a, b)
+            return leg['minutes'] if leg else (0 if known else None)
+        return minutes
+
+    def nearest_food(self, day_idx, i, k=3):
+        """[(km, (day_idx, act_idx), activity)] nearest food stops to activity i (excluding itself)."""
+        key = (day_idx, i)
+        with self._lock:
+            act = self.stops.get(key)
+            if act is None:
+                return []
+            coords = act['coords']
+            hits = self.food.nearest(coords['lat'], coords['lon'], k=k, exclude={key})
+            return [(km, hit, self.stops[hit]) for km, hit in hits]
+
+
+_lock = threading.Lock()
+_trips = OrderedDict()  # trip path -> TripGeo (LRU)
+
+
+def trip_geo(trip, version=None):
+    with _lock:
+        geo = _trips.get(trip.path)
+        if geo is None:
+            geo = _trips[trip.path] = TripGeo()
+            if len(_trips) > GEO_TRIP_LIMIT:
+                _trips.popitem(last=False)
+        _trips.move_to_end(trip.path)
+    return geo.sync(trip, version)
@@ -0,0 +1,348 @@
+# AI 導覽 (google-generativeai)
+# - 一天一個請求：點某個 activity 的「AI 導覽」時，當天所有還沒生成過的 activity 一起送出
+# - 串流：模型輸出依 [[n]] 標記切成各 activity 的段落，誰的段落先到就先顯示
+# - 快取：依 activity 內容 hash 存在 SQLite，同一份內容整個部署只生成一次；生成中的請求共用
+# - 保護：整個 process 共用的速率限制 (每分鐘請求數) 與同時請求上限
+#
+#   GUIDE_CLIENT=gemini|fake|off   預設：有 GEMINI_API_KEY / GOOGLE_API_KEY 就用 gemini，否則關閉
+#   GUIDE_MODEL                    預設 gemini-1.5-flash
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+GUIDE_STORE_PATH = os.environ.get(
+    "GUIDE_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "guide.sqlite3"))
+GUIDE_MODEL = os.environ.get("GUIDE_MODEL", "gemini-1.5-flash")
+# 改了 prompt 就加一，舊的快取自然失效
+PROMPT_VERSION = 1
+RATE_PER_MINUTE = int(os.environ.get("GUIDE_RATE_PER_MINUTE", "10"))
+MAX_CONCURRENCY = int(os.environ.get("GUIDE_MAX_CONCURRENCY", "2"))
+RATE_WAIT = 30  # 排隊等速率限制最多幾秒，超過就放棄這次
+STREAM_POLL = 0.5
+
+GUIDE_FIELDS = ("time", "text", "type", "desc", "guideText", "menu", "notes")
+_MARKER_RE = re.compile(r"\[\[(\d+)\]\]")
+_PARTIAL_RE = re.compile(r"\[(?:\[\d*\]?)?$")
+
+
+class GuideError(RuntimeError):
+    pass
+
+
+# --- 模型 client (可替換) ---
+
+class GeminiClient:
+    """Streams text chunks from google-generativeai."""
+
+    def __init__(self, api_key, model=GUIDE_MODEL):
+        self.name = model
+        self._api_key = api_key
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _loaded(self):
+        # 套件載入要一秒以上：第一次真的要生成時才載入，不算在 server 冷啟動裡
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=self._api_key)
+                self._model = genai.GenerativeModel(self.name)
+            return self._model
+
+    def stream(self, prompt):
+        for chunk in self._loaded().generate_content(prompt, stream=True):
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
+
+
+class FakeClient:
+    """Deterministic local model: echoes each [[n]] item of the prompt back in small chunks."""
+
+    name = "fake"
+
+    def __init__(self, delay=0.02, chunk=6):
+        self.delay = delay
+        self.chunk = chunk
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def stream(self, prompt):
+        with self._lock:
+            self.calls += 1
+        items = re.findall(r"^\[\[(\d+)\]\] (.+)$", prompt, re.MULTILINE)
+        for n, title in items:
+            body = f"[[{n}]]\n{title}：這是測試用的導覽文字，介紹這個地點的特色、建議停留方式與小提醒。\n"
+            for i in range(0, len(body), self.chunk):
+                time.sleep(self.delay)
+                yield body[i:i + self.chunk]
+
+
+def make_client():
+    kind = os.environ.get("GUIDE_CLIENT", "")
+    api_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
+    if kind == "fake":
+        return FakeClient()
+    if kind == "off" or not api_key:
+        return None
+    try:
+        # 只確認套件有安裝，不載入
+        installed = importlib.util.find_spec("google.generativeai") is not None
+    except ImportError:
+        installed = False
+    return GeminiClient(api_key) if installed else None
+
+
+# --- prompt ---
+
+def activity_hash(act, model):
+    content = {k: act[k] for k in GUIDE_FIELDS if k in act}
+    raw = json.dumps([PROMPT_VERSION, model, content], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def build_prompt(day, acts):
+    lines = [
+        "你是熟悉北海道的旅遊導覽。請用繁體中文，為下列每個行程各寫一段 80 到 120 字的導覽，",
+        "內容包含特色、推薦的玩法或點餐、實用提醒。每段開頭只寫標記 [[編號]] 並換行，不要加其他標題。",
+        f"日期：{day['full_date']}　地點：{day['location']}",
+        "",
+    ]
+    for n, act in acts:
+        lines.append(f"[[{n}]] {act['time']} {act['text']}")
+        for key in ("desc", "guideText"):
+            if act.get(key):
+                lines.append(f"  {act[key]}")
+        for key in ("menu", "notes"):
+            if act.get(key):
+                lines.append(f"  {'、'.join(act[key])}")
+    return "\n".join(lines)
+
+
+# --- 持久化快取 ---
+
+class GuideStore:
+    """SQLite table of generated guides keyed by activity hash (read into memory once)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._texts = None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=2)
+        conn.execute("CREATE TABLE IF NOT EXISTS guides (hash TEXT PRIMARY KEY, model TEXT, text TEXT, created_at REAL)")
+        return conn
+
+    def _loaded(self):
+        if self._texts is None:
+            try:
+                with closing(self._connect()) as conn:
+                    self._texts = dict(conn.execute("SELECT hash, text FROM guides"))
+            except sqlite3.Error:
+                self._texts = {}
+        return self._texts
+
+    def get(self, key):
+        with self._lock:
+            return self._loaded().get(key)
+
+    def put(self, key, model, text):
+        with self._lock:
+            self._loaded()[key] = text
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("INSERT OR REPLACE INTO guides VALUES (?, ?, ?, ?)", (key, model, text, time.time()))
+        except sqlite3.Error:
+            pass
+
+
+# --- 速率限制 ---
+
+class RateLimiter:
+    """Token bucket shared by every session in the process."""
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = max(1, per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._stamp = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        deadline = self._clock() + timeout
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate if self.rate else timeout
+            if now + wait > deadline:
+                return False
+            self._sleep(wait)
+
+
+# --- 一天的生成工作 ---
+
+class _DayJob:
+    def __init__(self, keys):
+        self.keys = keys          # 依 prompt 的編號順序
+        self.parts = {k: "" for k in keys}
+        self.done = set()
+        self.finished = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def append(self, key, text):
+        with self.cond:
+            self.parts[key] += text
+            self.cond.notify_all()
+
+    def close(self, key):
+        with self.cond:
+            self.done.add(key)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.error = error
+            self.finished = True
+            self.cond.notify_all()
+
+    def stream(self, key):
+        sent = 0
+        while True:
+            with self.cond:
+                while len(self.parts[key]) == sent and key not in self.done and not self.finished:
+                    self.cond.wait(STREAM_POLL)
+                text, closed, error = self.parts[key], key in self.done or self.finished, self.error
+            if len(text) > sent:
+                yield text[sent:]
+                sent = len(text)
+            if closed:
+                if error and not text.strip():
+                    yield f"⚠️ {error}"
+                return
+
+
+class _SectionParser:
+    """Splits the streamed "[[n]] ..." output into sections without cutting a marker in half."""
+
+    def __init__(self, job, numbers, save):
+        self.job = job
+        self.numbers = numbers  # 編號 -> key
+        self.save = save        # save(key, text)：段落一結束就寫入快取
+        self.current = None
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        while True:
+            m = _MARKER_RE.search(self.buffer)
+            if not m:
+                break
+            self._emit(self.buffer[:m.start()])
+            self._close_current()
+            self.current = self.numbers.get(int(m.group(1)))
+            self.buffer = self.buffer[m.end():].lstrip("\n")
+        # 結尾可能是半個標記 ("[", "[[1", "[[12]")，先留著等下一塊
+        partial = _PARTIAL_RE.search(self.buffer)
+        keep = partial.start() if partial else len(self.buffer)
+        self._emit(self.buffer[:keep])
+        self.buffer = self.buffer[keep:]
+
+    def _emit(self, text):
+        if text and self.current is not None:
+            self.job.append(self.current, text)
+
+    def _close_current(self):
+        # 只存完整結束的段落 (下一個標記已出現，或整個串流正常結束)；
+        # 先寫入快取再標成結束，串流途中 rerun 的人直接從快取拿到這段
+        if self.current is None:
+            return
+        text = self.job.parts[self.current].strip()
+        if text:
+            self.save(self.current, text)
+        self.job.close(self.current)
+
+    def close(self):
+        self._emit(self.buffer)
+        self.buffer = ""
+        self._close_current()
+
+
+class GuideService:
+    def __init__(self, client, store, rate_per_minute=RATE_PER_MINUTE, max_concurrency=MAX_CONCURRENCY):
+        self.client = client
+        self.store = store
+        self.limiter = RateLimiter(rate_per_minute)
+        # 同時最多幾個上游請求；超過的在 pool 裡排隊
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="guide")
+        self._lock = threading.Lock()
+        self._inflight = {}  # hash -> _DayJob
+        self.requests = 0
+
+    @property
+    def enabled(self):
+        return self.client is not None
+
+    def _key(self, act):
+        return activity_hash(act, self.client.name)
+
+    def cached(self, act):
+        return self.store.get(self._key(act)) if self.enabled else None
+
+    def stream(self, day, i):
+        """Generator of text for activity i, starting one batched request for the day if needed."""
+        acts = day['activities']
+        key = self._key(acts[i])
+        text = self.store.get(key)
+        if text is not None:
+            return iter([text])
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is None:
+                batch = []
+                for n, act in enumerate(acts):
+                    k = self._key(act)
+                    if k not in self._inflight and self.store.get(k) is None and k not in (b[2] for b in batch):
+                        batch.append((n + 1, act, k))
+                job = _DayJob([k for _, _, k in batch])
+                for _, _, k in batch:
+                    self._inflight[k] = job
+                self.requests += 1
+                self._pool.submit(self._run, job, day, batch)
+        return job.stream(key)
+
+    def _run(self, job, day, batch):
+        error = None
+        try:
+            if not self.limiter.acquire(RATE_WAIT):
+                raise GuideError("AI 導覽目前請求太多，請稍後再試")
+            parser = _SectionParser(job, {n: k for n, _, k in batch},
+                                    lambda key, text: self.store.put(key, self.client.name, text))
+            for chunk in self.client.stream(build_prompt(day, [(n, act) for n, act, _ in batch])):
+                parser.feed(chunk)
+            parser.close()
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        with self._lock:
+            for key in job.keys:
+                self._inflight.pop(key, None)
+        job.finish(error)
+
+
+guide_service = GuideService(make_client(), GuideStore(GUIDE_STORE_PATH))
@@ -0,0 +1,180 @@
+# 上游 API (天氣 / 匯率) 共用的 HTTP client
+# - 連線池：同一個 host 重用 keep-alive 連線 (requests.Session + HTTPAdapter)，不必每次重新握手
+# - 重試：連線錯誤 / 連線逾時 / 429 / 5xx 最多重試 RETRIES 次，間隔指數成長並加上隨機抖動 (full jitter)，
+#   全部加起來不超過 DEADLINE 秒 (和原本單次請求的 2 秒 timeout 一樣，故障時斷路器跳開前也不會比以前慢)
+# - 斷路器：同一個 host 連續 FAILURE_THRESHOLD 次呼叫失敗就跳開，之後的請求立刻丟 CircuitOpenError
+#   (providers 改用快取或備用值)；背景每隔 reset_timeout 試打一次，成功才恢復，失敗就把間隔加倍
+# requests 等到第一個請求才載入 (和 Session 一起建立)，不算在 app 的冷啟動裡
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+CONNECT_TIMEOUT = 1.0
+READ_TIMEOUT = 2.0
+RETRIES = 2
+BACKOFF_BASE = 0.1
+BACKOFF_MAX = 1.0
+DEADLINE = 2.0
+FAILURE_THRESHOLD = 3
+RESET_TIMEOUT = 15.0
+RESET_TIMEOUT_MAX = 5 * 60.0
+POOL_HOSTS = 4
+POOL_SIZE = 8
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one host (closed -> open -> closed after a good probe)."""
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.threshold = threshold
+        self.base_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.probe_url = None
+        self.trips = 0
+
+    @property
+    def state(self):
+        return "closed" if self.opened_at is None else "open"
+
+    def allow(self):
+        with self._lock:
+            return self.opened_at is None
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.reset_timeout = self.base_timeout
+
+    def failure(self, url):
+        """Record a failed call; True when this failure opened the breaker."""
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is None and self.failures >= self.threshold:
+                self.opened_at = self._clock()
+                self.probe_url = url
+                self.trips += 1
+                return True
+            return False
+
+    def probe_failed(self):
+        with self._lock:
+            self.opened_at = self._clock()
+            self.reset_timeout = min(RESET_TIMEOUT_MAX, self.reset_timeout * 2)
+
+
+class ProviderClient:
+    """Pooled GET client with bounded jittered retries and a circuit breaker per host."""
+
+    def __init__(self, retries=RETRIES, threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT,
+                 sleep=time.sleep, timer=threading.Timer, rng=random.random):
+        self.retries = retries
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._sleep = sleep
+        self._timer = timer
+        self._rng = rng
+        self._session = None
+        self._lock = threading.Lock()
+        self._breakers = {}  # host -> CircuitBreaker
+        self._counters = {"requests": 0, "retries": 0, "fast_fail": 0, "probes": 0}
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE)
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+            return self._session
+
+    def breaker(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.threshold, self.reset_timeout)
+            return breaker
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _attempt(self, url, timeout):
+        import requests
+        self._count("requests")
+        res = self.session.get(url, timeout=timeout)
+        if res.status_code in RETRY_STATUS:
+            raise requests.HTTPError(f"{res.status_code} from {urlsplit(url).netloc}", response=res)
+        res.raise_for_status()
+        return res.json()
+
+    def get_json(self, url):
+        import requests
+        breaker = self.breaker(urlsplit(url).netloc)
+        if not breaker.allow():
+            self._count("fast_fail")
+            raise CircuitOpenError(f"{urlsplit(url).netloc} is unavailable")
+        deadline = time.monotonic() + DEADLINE
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            try:
+                value = self._attempt(url, (max(0.1, min(CONNECT_TIMEOUT, remaining)),
+                                            max(0.1, min(READ_TIMEOUT, remaining))))
+                breaker.success()
+                return value
+            except requests.ReadTimeout as e:
+                error = e  # 上游已經慢到逾時，再試一次只會讓頁面多等一輪
+                break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.HTTPError as e:
+                error = e
+                if e.response is not None and e.response.status_code not in RETRY_STATUS:
+                    break  # 4xx 不會因為重試而變好
+            except ValueError as e:
+                error = e  # 回應不是 JSON
+                break
+            wait = self._rng() * min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+            if attempt == self.retries or time.monotonic() + wait >= deadline:
+                break
+            self._count("retries")
+            self._sleep(wait)
+        if breaker.failure(url):
+            self._schedule_probe(breaker)
+        raise error
+
+    def _schedule_probe(self, breaker):
+        timer = self._timer(breaker.reset_timeout, self._probe, args=(breaker,))
+        timer.daemon = True
+        timer.start()
+
+    def _probe(self, breaker):
+        import requests
+        # 只試一次、不重試；成功後下一個請求就會正常走上游
+        self._count("probes")
+        try:
+            self._attempt(breaker.probe_url, (CONNECT_TIMEOUT, READ_TIMEOUT))
+        except (requests.RequestException, ValueError):
+            breaker.probe_failed()
+            self._schedule_probe(breaker)
+        else:
+            breaker.success()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._counters)
+            out["open"] = sorted(host for host, b in self._breakers.items() if b.state == "open")
+        return out
@@ -0,0 +1,225 @@
+# 熱路徑計時與隱藏的效能面板
+# 預設關閉；沒有任何 session 開啟時 span() / timed() 只做一次判斷。
+# 開啟方式：環境變數 PERF_PANEL=1 (全部 session)，或網址加 ?perf=1 (只有該 session)。
+# 只重跑 fragment 時 (不會經過 begin_run) 另開一筆紀錄，不會算進上一次完整 rerun。
+#   PERF_LOG=1          每次完整 rerun 結束時輸出一行 JSON log (logger: hokkaido.perf)
+#   PERF_METRICS_PATH   Prometheus text 格式的 metrics 寫到這個檔案
+#                       (預設 static/metrics.txt，開啟 static serving 時即為 /app/static/metrics.txt)
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+ENV_ENABLED = os.environ.get("PERF_PANEL", "") not in ("", "0")
+LOG_ENABLED = os.environ.get("PERF_LOG", "") not in ("", "0")
+METRICS_PATH = os.environ.get(
+    "PERF_METRICS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "metrics.txt"))
+METRICS_INTERVAL = 10.0
+WINDOW = 512
+
+log = logging.getLogger("hokkaido.perf")
+
+# 開著面板的 session id；其他 session 的 span() 只查這個 set，不碰 session_state
+# (開面板的只有除錯中的那幾個 session，關掉或不帶 ?perf=1 重跑時移除)
+_sessions = set()
+_SESSION_KEY = "_perf_run"
+
+
+class RollingStats:
+    """Process-wide rolling window of durations per phase (seconds)."""
+
+    def __init__(self, window=WINDOW):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._totals = {}  # name -> [count, sum]
+        self.window = window
+
+    def add(self, name, seconds):
+        with self._lock:
+            dq = self._samples.get(name)
+            if dq is None:
+                dq = self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = [0, 0.0]
+            dq.append(seconds)
+            total = self._totals[name]
+            total[0] += 1
+            total[1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            items = {name: sorted(dq) for name, dq in self._samples.items()}
+            totals = {name: tuple(t) for name, t in self._totals.items()}
+        out = {}
+        for name, xs in items.items():
+            pick = lambda p: xs[min(len(xs) - 1, int(round((len(xs) - 1) * p)))]
+            out[name] = {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99),
+                         "count": totals[name][0], "sum": totals[name][1]}
+        return out
+
+
+stats = RollingStats()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "run", "t0")
+
+    def __init__(self, name, run):
+        self.name = name
+        self.run = run
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        stats.add(self.name, elapsed)
+        self.run["spans"].append((self.name, elapsed))
+        return False
+
+
+def _current_run():
+    import streamlit as st
+    try:
+        return st.session_state.get(_SESSION_KEY)
+    except Exception:
+        return None
+
+
+def _enabled_ctx():
+    # 這個 session 有開計時才回傳它的 ScriptRunContext
+    if not (ENV_ENABLED or _sessions):
+        return None
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None or not (ENV_ENABLED or ctx.session_id in _sessions):
+        return None
+    return ctx
+
+
+def span(name):
+    """Time a block into the current rerun's breakdown (no-op when disabled)."""
+    if _enabled_ctx() is None:
+        return _NULL
+    run = _current_run()
+    return _Span(name, run) if run is not None else _NULL
+
+
+def _new_run(**extra):
+    import streamlit as st
+    run = st.session_state[_SESSION_KEY] = dict(extra, spans=[], t0=time.perf_counter())
+    return run
+
+
+def timed(name):
+    """Decorator form of span(); keeps the wrapped name for st.fragment / st.dialog."""
+    def deco(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            ctx = _enabled_ctx()
+            if ctx is None:
+                return func(*args, **kwargs)
+            fragments = ctx.fragment_ids_this_run
+            run = _current_run()
+            # 只重跑 fragment：每次重跑 Streamlit 都給一個新的 fragment_ids_this_run，第一個進來的另開一筆
+            if not fragments or (run is not None and run.get("fragments") is fragments):
+                with span(name):
+                    return func(*args, **kwargs)
+            run = _new_run(fragments=fragments)
+            try:
+                with span(name):
+                    return func(*args, **kwargs)
+            finally:
+                _finish(run, "fragment_total", "fragment")
+        return wrapper
+    return deco
+
+
+def record_fetch(name, seconds):
+    # 上游請求一律記錄：相較網路延遲，這點成本可以忽略
+    stats.add(f"fetch:{name}", seconds)
+
+
+def begin_run(requested):
+    """Call once at the top of every full script run."""
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    enabled = ENV_ENABLED or bool(requested)
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None and not ENV_ENABLED:
+        if enabled:
+            _sessions.add(ctx.session_id)
+        else:
+            _sessions.discard(ctx.session_id)
+    if enabled:
+        _new_run()
+    elif _SESSION_KEY in st.session_state:
+        del st.session_state[_SESSION_KEY]
+    return enabled
+
+
+def _finish(run, total_name, event):
+    total = time.perf_counter() - run["t0"]
+    stats.add(total_name, total)
+    run["total"] = total
+    if LOG_ENABLED:
+        log.info(json.dumps({"event": event, "total_ms": round(total * 1000, 2),
+                             "spans": {n: round(s * 1000, 2) for n, s in run["spans"]}}))
+    _maybe_write_metrics()
+
+
+def end_run():
+    """Finish the run: total time, optional JSON log and metrics file. Returns the run breakdown."""
+    run = _current_run()
+    if run is None:
+        return None
+    _finish(run, "rerun_total", "rerun")
+    return run
+
+
+_metrics_lock = threading.Lock()
+_metrics_written = 0.0
+
+
+def prometheus_text(snapshot=None):
+    snapshot = snapshot if snapshot is not None else stats.snapshot()
+    lines = ["# HELP hokkaido_phase_seconds Duration of app phases (rolling window quantiles).",
+             "# TYPE hokkaido_phase_seconds summary"]
+    for name, s in sorted(snapshot.items()):
+        for q in ("0.5", "0.95", "0.99"):
+            key = {"0.5": "p50", "0.95": "p95", "0.99": "p99"}[q]
+            lines.append(f'hokkaido_phase_seconds{{phase="{name}",quantile="{q}"}} {s[key]:.6f}')
+        lines.append(f'hokkaido_phase_seconds_sum{{phase="{name}"}} {s["sum"]:.6f}')
+        lines.append(f'hokkaido_phase_seconds_count{{phase="{name}"}} {s["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def _maybe_write_metrics():
+    global _metrics_written
+    now = time.monotonic()
+    with _metrics_lock:
+        if now - _metrics_written < METRICS_INTERVAL:
+            return
+        _metrics_written = now
+    try:
+        os.makedirs(os.path.dirname(METRICS_PATH), exist_ok=True)
+        tmp = f"{METRICS_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(prometheus_text())
+        os.replace(tmp, METRICS_PATH)
+    except OSError:
+        pass
@@ -0,0 +1,151 @@
+# 背景預先抓取 (天氣 / 匯率)
+# 原本只有使用者的 rerun 會觸發上游請求，閒置一段時間後第一個進來的人一定要等網路。
+# 這裡每個 server process 只啟動一個排程執行緒，在快取過期前就把資料刷新進 providers 的共用快取，
+# 頁面讀到的永遠是已經在記憶體裡的值。
+# - 每個工作各自的間隔，加上 ±jitter 的隨機抖動 (多個 process 不會同時打上游)
+# - 同時最多 PREFETCH_CONCURRENCY 個工作在跑；上一輪還沒跑完的工作不會重複排入
+# - clock / rng / executor 都可替換，用假時鐘就能檢查排程 (見 bench/prefetch_bench.py)
+#
+#   PREFETCH=off                     關閉
+#   PREFETCH_WEATHER_INTERVAL 秒     預設 WEATHER_TTL 的 3/4
+#   PREFETCH_FX_INTERVAL 秒          預設 FX_TTL 的 3/4
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import providers
+from trip_data import TripDataError, list_trips, load_trip, trip_dir
+
+PREFETCH = os.environ.get("PREFETCH", "on") != "off"
+WEATHER_INTERVAL = float(os.environ.get("PREFETCH_WEATHER_INTERVAL", providers.WEATHER_TTL * 0.75))
+FX_INTERVAL = float(os.environ.get("PREFETCH_FX_INTERVAL", providers.FX_TTL * 0.75))
+JITTER = 0.1
+CONCURRENCY = int(os.environ.get("PREFETCH_CONCURRENCY", "2"))
+IDLE_WAIT = 60.0  # 沒有工作時最久睡多久
+
+
+class _Job:
+    __slots__ = ("name", "fn", "interval", "jitter", "due", "running", "runs", "failures", "last_error", "last_seconds")
+
+    def __init__(self, name, fn, interval, jitter, due):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.jitter = jitter
+        self.due = due
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_seconds = None
+
+
+class PrefetchScheduler:
+    """Runs registered jobs on jittered intervals with a concurrency limit."""
+
+    def __init__(self, clock=time.monotonic, rng=random.random, executor=None, max_workers=CONCURRENCY):
+        self._clock = clock
+        self._rng = rng
+        self._pool = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._jobs = []
+        self._thread = None
+
+    def add(self, name, fn, interval, jitter=JITTER, delay=0.0):
+        """Register fn to run after delay seconds, then every interval (± jitter as a fraction)."""
+        with self._lock:
+            self._jobs.append(_Job(name, fn, interval, jitter, self._clock() + delay))
+        self._wake.set()
+
+    def _next_interval(self, job):
+        return job.interval * (1 + job.jitter * (2 * self._rng() - 1))
+
+    def run_due(self):
+        """Submit every job that is due and not still running; returns their names."""
+        now = self._clock()
+        started = []
+        with self._lock:
+            for job in self._jobs:
+                if job.due <= now and not job.running:
+                    job.running = True
+                    job.due = now + self._next_interval(job)
+                    started.append(job)
+        for job in started:
+            self._pool.submit(self._run, job)
+        return [job.name for job in started]
+
+    def _run(self, job):
+        t0 = time.perf_counter()
+        error = None
+        try:
+            job.fn()
+        except Exception as e:
+            error = e
+        with self._lock:
+            job.running = False
+            job.runs += 1
+            job.last_seconds = time.perf_counter() - t0
+            if error is not None:
+                job.failures += 1
+                job.last_error = str(error) or type(error).__name__
+
+    def next_due(self):
+        with self._lock:
+            return min((job.due for job in self._jobs), default=None)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        while True:
+            # 先清掉再看排程：之後才加入的 job 會讓 wait 立刻返回，不會漏掉
+            self._wake.clear()
+            self.run_due()
+            due = self.next_due()
+            self._wake.wait(IDLE_WAIT if due is None else min(IDLE_WAIT, max(0.05, due - self._clock())))
+
+    def stats(self):
+        with self._lock:
+            return {job.name: {"runs": job.runs, "failures": job.failures, "running": job.running,
+                               "last_error": job.last_error, "last_seconds": job.last_seconds}
+                    for job in self._jobs}
+
+
+def trips_days():
+    """Day lists of every trip on this server (trips that fail to load are skipped)."""
+    out = []
+    for trip_id in list_trips():
+        try:
+            out.append(load_trip(trip_dir(trip_id)).days)
+        except (OSError, TripDataError):
+            continue
+    return out
+
+
+def add_provider_jobs(scheduler, weather_interval=WEATHER_INTERVAL, fx_interval=FX_INTERVAL):
+    scheduler.add("forecast", lambda: providers.refresh_forecasts(trips_days()), weather_interval)
+    scheduler.add("fx", providers.refresh_fx_table, fx_interval)
+    return scheduler
+
+
+_lock = threading.Lock()
+prefetch_scheduler = None
+
+
+def start_prefetch():
+    """Start the process-wide scheduler once; later calls (every rerun, every session) do nothing."""
+    global prefetch_scheduler
+    if not PREFETCH:
+        return None
+    with _lock:
+        if prefetch_scheduler is None:
+            prefetch_scheduler = add_provider_jobs(PrefetchScheduler()).start()
+    return prefetch_scheduler
@@ -0,0 +1,461 @@
+# 外部資料來源 (天氣 / 匯率) 與跨 session 共用快取
+# Streamlit 每次 rerun 都會重新執行 app.py，但 import 進來的模組只會載入一次，
+# 所以放在這裡的快取是整個 process 共用的。
+# 快取 key 只含地點與日期 (不含行程)，同一個 server 上多個行程查同一地點同一週時只打一次上游。
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from fx import FxTable
+from http_client import ProviderClient
+from perf import record_fetch
+
+# 上游 API (可用環境變數指到本機的 stub，見 bench/stub_providers.py)
+WEATHER_API_URL = os.environ.get("WEATHER_API_URL", "https://api.open-meteo.com/v1/forecast")
+FX_API_URL = os.environ.get("FX_API_URL", "https://cdn.jsdelivr.net/npm/@fawazahmed0/currency-api@latest/v1/currencies/jpy.json")
+
+# 各端點的新鮮時間 / 過期後仍可先回傳舊值的時間 (秒)
+WEATHER_TTL = 10 * 60
+WEATHER_STALE_TTL = 60 * 60
+FX_TTL = 60 * 60
+FX_STALE_TTL = 24 * 60 * 60
+
+WEATHER_FALLBACK = (-2, "雪(預測)")
+FX_FALLBACK = 0.215
+# 本機持久化快取：重啟後先用上次的資料暖機，沒網路時也能顯示最後一次的真實值
+PROVIDER_CACHE_PATH = os.environ.get(
+    "PROVIDER_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "providers.sqlite3"))
+
+# Open-Meteo forecast API 可查的日期範圍 (過去 92 天 ~ 未來 16 天)
+FORECAST_PAST_DAYS = 92
+FORECAST_DAYS = 16
+
+
+class TTLCache:
+    """TTL cache with stale-while-revalidate and request coalescing.
+
+    - fresh: 直接回傳 (hit)
+    - stale: 回傳舊值，並在背景執行緒刷新 (stale)
+    - miss: 同步抓取；同一個 key 同時只會有一個上游請求，其餘等待結果
+    """
+
+    def __init__(self, clock=time.time, store=None):
+        # fetched_at 是 epoch 秒，才能和磁碟上的紀錄比較
+        self._clock = clock
+        self._store = store
+        self._lock = threading.Lock()
+        self._entries = dict(store.load_all()) if store else {}  # key -> (value, fetched_at)
+        self._inflight = {}  # key -> _Flight
+        self._counters = {"hit": 0, "miss": 0, "stale": 0, "coalesced": 0, "refresh": 0, "prefetch": 0, "error": 0}
+
+    def get(self, key, loader, ttl, stale_ttl=0):
+        with self._lock:
+            entry = self._entries.get(key)
+            age = self._clock() - entry[1] if entry else None
+            if entry and age < ttl:
+                self._counters["hit"] += 1
+                return entry[0]
+            if entry and age < ttl + stale_ttl:
+                self._counters["stale"] += 1
+                if key not in self._inflight:
+                    self._inflight[key] = _Flight()
+                    self._counters["refresh"] += 1
+                    threading.Thread(target=self._load, args=(key, loader), daemon=True).start()
+                return entry[0]
+            flight = self._inflight.get(key)
+            if flight is None:
+                self._counters["miss"] += 1
+                flight = self._inflight[key] = _Flight()
+                leader = True
+            else:
+                self._counters["coalesced"] += 1
+                leader = False
+
+        if leader:
+            self._load(key, loader)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            # 上游失敗時，有舊值就先用舊值 (stale-if-error)
+            if entry is not None:
+                return entry[0]
+            raise flight.error
+        return flight.value
+
+    def get_many(self, keys, loader, ttl, stale_ttl=0):
+        """get() for several keys at once; every miss goes into a single loader(missing_keys) call.
+
+        loader 回傳 {key: value}；沒有回傳到的 key 視為失敗。
+        回傳 {key: value}，失敗且沒有舊值的 key 不會出現在結果裡 (不丟例外)。
+        """
+        out, waiting, lead, refresh = {}, {}, [], []
+        with self._lock:
+            now = self._clock()
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                age = now - entry[1] if entry else None
+                if entry and age < ttl:
+                    self._counters["hit"] += 1
+                    out[key] = entry[0]
+                    continue
+                if entry and age < ttl + stale_ttl:
+                    self._counters["stale"] += 1
+                    out[key] = entry[0]
+                    if key not in self._inflight:
+                        self._inflight[key] = _Flight()
+                        self._counters["refresh"] += 1
+                        refresh.append(key)
+                    continue
+                flight = self._inflight.get(key)
+                if flight is None:
+                    self._counters["miss"] += 1
+                    flight = self._inflight[key] = _Flight()
+                    lead.append(key)
+                else:
+                    self._counters["coalesced"] += 1
+                waiting[key] = (flight, entry)
+
+        if refresh:
+            threading.Thread(target=self._load_many, args=(refresh, loader), daemon=True).start()
+        if lead:
+            self._load_many(lead, loader)
+        for key, (flight, entry) in waiting.items():
+            flight.done.wait()
+            if flight.error is None:
+                out[key] = flight.value
+            elif entry is not None:
+                out[key] = entry[0]
+        return out
+
+    def refresh_many(self, keys, loader):
+        """Load keys now whatever their age (background prefetch); keys already in flight are skipped.
+
+        回傳這次載入的錯誤 (沒有就是 None)；失敗時舊值保留不動。
+        """
+        with self._lock:
+            lead = [key for key in dict.fromkeys(keys) if key not in self._inflight]
+            for key in lead:
+                self._inflight[key] = _Flight()
+            self._counters["prefetch"] += len(lead)
+        return self._load_many(lead, loader) if lead else None
+
+    def _load(self, key, loader):
+        self._load_many([key], lambda keys: {key: loader()})
+
+    def _load_many(self, keys, loader):
+        with self._lock:
+            flights = {key: self._inflight[key] for key in keys}
+        try:
+            values, error = loader(keys), None
+        except Exception as e:
+            values, error = {}, e
+        fetched_at = self._clock()
+        saved = []
+        with self._lock:
+            for key, flight in flights.items():
+                if key in values:
+                    flight.value = values[key]
+                    self._entries[key] = (flight.value, fetched_at)
+                    saved.append(key)
+                else:
+                    flight.error = error or KeyError(key)
+                    self._counters["error"] += 1
+                self._inflight.pop(key, None)
+        for flight in flights.values():
+            flight.done.set()
+        if self._store:
+            for key in saved:
+                self._store.save(key, values[key], fetched_at)
+        if error is None and len(saved) < len(flights):
+            error = KeyError(f"{len(flights) - len(saved)} keys missing from the response")
+        return error
+
+    def fetched_at(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def oldest_fetched_at(self, keys):
+        # 多個 key 組成的資料，以最舊的那一筆當作更新時間
+        with self._lock:
+            stamps = [self._entries[k][1] for k in keys if k in self._entries]
+        return min(stamps) if stamps else None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, size=len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for k in self._counters:
+                self._counters[k] = 0
+
+
+def _key_from_json(data):
+    # key 是 str / 數字組成的 tuple，裡面最多再一層 tuple (座標)；JSON 讀回來是 list，轉回 tuple 才比對得到
+    return tuple(tuple(x) if isinstance(x, list) else x for x in data)
+
+
+class ResponseStore:
+    """SQLite-backed persistence for TTLCache entries.
+
+    key 與 value 都存成 JSON (純資料，載入時不會執行任何東西)；讀回來的 tuple 會變成 list。
+    寫入失敗 (唯讀磁碟等) 只會少了持久化，不影響畫面。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._ready = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=2)
+        if not self._ready:
+            # 舊版用 pickle 存的 responses 表不再讀取，直接丟掉
+            conn.execute("DROP TABLE IF EXISTS responses")
+            conn.execute("CREATE TABLE IF NOT EXISTS provider_responses (key TEXT PRIMARY KEY, value TEXT, fetched_at REAL)")
+            self._ready = True
+        return conn
+
+    def load_all(self):
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute("SELECT key, value, fetched_at FROM provider_responses").fetchall()
+        except sqlite3.Error:
+            return []
+        out = []
+        for key, value, fetched_at in rows:
+            try:
+                out.append((_key_from_json(json.loads(key)), (json.loads(value), fetched_at)))
+            except (TypeError, ValueError):
+                continue
+        return out
+
+    def save(self, key, value, fetched_at):
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("INSERT OR REPLACE INTO provider_responses VALUES (?, ?, ?)",
+                             (json.dumps(list(key)), json.dumps(value, ensure_ascii=False), fetched_at))
+        except (sqlite3.Error, TypeError, ValueError):
+            pass
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+provider_cache = TTLCache(store=ResponseStore(PROVIDER_CACHE_PATH))
+# 連線池 + 重試 + 斷路器；上游掛掉時直接失敗，由快取 (stale-if-error) 或備用值接手
+provider_client = ProviderClient()
+# 首頁多個請求同時發出，頁面延遲 = 最慢的一個，而不是加總
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="provider")
+
+
+def weather_text(code):
+    if code == 0: return "晴"
+    if code in [1, 2, 3]: return "多雲"
+    if code in [61, 63, 65, 80, 81, 82]: return "雨"
+    if code in [71, 73, 75, 85, 86]: return "雪"
+    return "陰"
+
+
+def _get_json(name, url):
+    # 每次上游請求的耗時 (含重試) 都記到 perf 的 rolling stats (fetch:<name>)
+    t0 = time.perf_counter()
+    try:
+        return provider_client.get_json(url)
+    finally:
+        record_fetch(name, time.perf_counter() - t0)
+
+
+def _fetch_fx_table():
+    # 整張表都留著 (快取存的是純 dict，持久化不依賴 FxTable 類別)
+    res = _get_json("fx", FX_API_URL)
+    return {"date": res.get("date"), "rates": res['jpy']}
+
+
+FX_KEY = ("fx", "jpy")
+_fx_lock = threading.Lock()
+_fx_built = (None, None)  # (快取裡的原始表, 由它建好的 FxTable)
+
+
+def get_fx_table():
+    """The whole JPY rates table as an FxTable; one download per FX_TTL for the whole process."""
+    global _fx_built
+    try:
+        raw = provider_cache.get(FX_KEY, _fetch_fx_table, ttl=FX_TTL, stale_ttl=FX_STALE_TTL)
+    except Exception:
+        return FxTable({"twd": FX_FALLBACK}, fallback=True)
+    with _fx_lock:
+        # 快取刷新前回傳的是同一個物件，FxTable 只在換表時重建
+        if _fx_built[0] is not raw:
+            _fx_built = (raw, FxTable(raw["rates"], date=raw["date"]))
+        return _fx_built[1]
+
+
+def refresh_fx_table():
+    """Re-download the rates table into the shared cache (prefetch job)."""
+    error = provider_cache.refresh_many([FX_KEY], lambda keys: {FX_KEY: _fetch_fx_table()})
+    if error is not None:
+        raise error
+
+
+def _table_rate(table, src="jpy", dst="twd"):
+    try:
+        return table.rate(src, dst)
+    except KeyError:
+        return FX_FALLBACK if (src, dst) == ("jpy", "twd") else None
+
+
+def coord_key(coords):
+    return (round(coords['lat'], 4), round(coords['lon'], 4))
+
+
+def _forecast_window(start, end, today=None):
+    # 行程日期和 API 可預報範圍的交集，沒有交集就只抓 current
+    today = today or datetime.date.today()
+    start = max(start, today - datetime.timedelta(days=FORECAST_PAST_DAYS))
+    end = min(end, today + datetime.timedelta(days=FORECAST_DAYS - 1))
+    return (start, end) if start <= end else None
+
+
+def _parse_forecast(res):
+    out = {"current": (None, None), "daily": {}, "hourly": {}}
+    if 'current' in res:
+        out["current"] = (res['current']['temperature_2m'], weather_text(res['current']['weather_code']))
+    daily = res.get('daily') or {}
+    for i, date in enumerate(daily.get('time', [])):
+        out["daily"][date] = {
+            "max": daily['temperature_2m_max'][i],
+            "min": daily['temperature_2m_min'][i],
+            "text": weather_text(daily['weather_code'][i]),
+        }
+    hourly = res.get('hourly') or {}
+    for i, stamp in enumerate(hourly.get('time', [])):
+        date, hour = stamp.split("T")
+        out["hourly"].setdefault(date, []).append((hour, hourly['temperature_2m'][i], weather_text(hourly['weather_code'][i])))
+    return out
+
+
+def _week_span(start, end):
+    # 對齊到週一 ~ 週日：同一週的行程 (不論起訖日) 用同一組快取 key
+    first = start - datetime.timedelta(days=start.weekday())
+    last = end + datetime.timedelta(days=6 - end.weekday())
+    return [(first + datetime.timedelta(weeks=n), first + datetime.timedelta(weeks=n, days=6))
+            for n in range((last - first).days // 7 + 1)]
+
+
+def _slice_forecast(forecast, week):
+    first, last = week
+    return {"current": forecast["current"],
+            "daily": {d: v for d, v in forecast["daily"].items() if first <= d <= last},
+            "hourly": {d: v for d, v in forecast["hourly"].items() if first <= d <= last}}
+
+
+def _fetch_trip_forecast(locations, window):
+    lats = ",".join(str(lat) for lat, _ in locations)
+    lons = ",".join(str(lon) for _, lon in locations)
+    url = f"{WEATHER_API_URL}?latitude={lats}&longitude={lons}&current=temperature_2m,weather_code&timezone=Asia%2FTokyo"
+    if window:
+        url += ("&hourly=temperature_2m,weather_code&daily=weather_code,temperature_2m_max,temperature_2m_min"
+                f"&start_date={window[0].isoformat()}&end_date={window[1].isoformat()}")
+    res = _get_json("forecast", url)
+    # 單一地點時 API 回傳 object，多地點時回傳 list (順序與輸入相同)
+    if isinstance(res, dict):
+        res = [res]
+    return {loc: _parse_forecast(r) for loc, r in zip(locations, res)}
+
+
+def _fetch_forecast_weeks(keys):
+    # 所有缺的 (地點, 週) 合成一次批次請求，再切回每個 key
+    locations = tuple(dict.fromkeys(key[1] for key in keys))
+    window = _forecast_window(datetime.date.fromisoformat(min(key[2] for key in keys)),
+                              datetime.date.fromisoformat(max(key[3] for key in keys)))
+    by_location = _fetch_trip_forecast(locations, window)
+    return {key: _slice_forecast(by_location[key[1]], key[2:]) for key in keys if key[1] in by_location}
+
+
+def _forecast_keys(days):
+    locations = tuple(dict.fromkeys(coord_key(day['coords']) for day in days))
+    dates = [datetime.date.fromisoformat(day['iso_date']) for day in days]
+    # key 用行程日期 (對齊到週) 而不是裁切後的 window，隔天離線時仍找得到上次的資料
+    # 日期存成 ISO 字串，key 才能原樣存成 JSON
+    return [("forecast", loc, *(d.isoformat() for d in week)) for loc in locations for week in _week_span(min(dates), max(dates))]
+
+
+def get_trip_forecast(days):
+    """Forecast for every distinct coordinate in the trip; misses go out as one batched Open-Meteo request.
+
+    回傳 {(lat, lon): {"current": (temp, text), "daily": {date: ...}, "hourly": {date: [...]}}}；
+    失敗時回傳空 dict，由呼叫端決定備用值。
+    """
+    weeks = provider_cache.get_many(_forecast_keys(days), _fetch_forecast_weeks,
+                                    ttl=WEATHER_TTL, stale_ttl=WEATHER_STALE_TTL)
+    out = {}
+    for (_, loc, *_week), part in weeks.items():
+        entry = out.setdefault(loc, {"current": part["current"], "daily": {}, "hourly": {}})
+        entry["daily"].update(part["daily"])
+        entry["hourly"].update(part["hourly"])
+    return out
+
+
+def refresh_forecasts(trips_days):
+    """Re-download the forecast of every trip given (list of day lists) in one batched request (prefetch job)."""
+    keys = list(dict.fromkeys(key for days in trips_days for key in _forecast_keys(days)))
+    error = provider_cache.refresh_many(keys, _fetch_forecast_weeks)
+    if error is not None:
+        raise error
+
+
+def current_weather(forecast, coords):
+    entry = forecast.get(coord_key(coords))
+    return entry["current"] if entry else WEATHER_FALLBACK
+
+
+def day_forecast(forecast, day):
+    entry = forecast.get(coord_key(day['coords']))
+    return entry["daily"].get(day['iso_date']) if entry else None
+
+
+# 行程表每天顯示的逐時預報：白天每 HOURLY_STEP 小時一格
+HOURLY_HOURS = range(6, 22)
+HOURLY_STEP = 3
+
+
+def day_hourly(forecast, day):
+    """[(hour, temp, text)] for the day's location on its date, every HOURLY_STEP hours in the daytime."""
+    entry = forecast.get(coord_key(day['coords']))
+    hours = entry["hourly"].get(day['iso_date'], []) if entry else []
+    out = []
+    for hour, temp, text in hours:
+        h = int(hour.split(":")[0])
+        if h in HOURLY_HOURS and (h - HOURLY_HOURS.start) % HOURLY_STEP == 0 and temp is not None:
+            out.append((h, round(temp), text))
+    return out
+
+
+def fetch_home_bundle(days):
+    """Fetch the FX table and the trip forecast concurrently.
+
+    回傳 {"rate", "rate_at", "fx", "forecast", "forecast_at"}；*_at 是資料實際抓取的 epoch 秒，
+    None 表示從未抓到過、畫面上是備用值。
+    """
+    fx = _fetch_pool.submit(get_fx_table)
+    forecast = _fetch_pool.submit(get_trip_forecast, days)
+    fx = fx.result()
+    return {
+        "rate": _table_rate(fx), "rate_at": provider_cache.fetched_at(FX_KEY), "fx": fx,
+        "forecast": forecast.result(), "forecast_at": provider_cache.oldest_fetched_at(_forecast_keys(days)),
+    }
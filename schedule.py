@@ -0,0 +1,123 @@
+# 行程時間衝突檢查
+# 每個 activity 轉成 [開始, 結束) 的分鐘區間 (time + stayTime)，依開始時間排序後掃一次：
+#   overlap  開始時上一段還沒結束
+#   tight    兩段之間的空檔小於預估交通時間 (或最少緩衝)
+# 結果依每天的檔案版本快取，改了某一天只會重算那一天。
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+# 沒有交通時間估計 (缺座標) 時，兩段之間至少要留的緩衝 (分)
+MIN_GAP = 10
+# process 內最多保留幾個行程的檢查結果 (LRU)，和 trip_store.PACKING_INDEX_LIMIT 一樣
+SCHEDULE_TRIP_LIMIT = 64
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(小時|時間|hours?|hrs?|h|分鐘|分|mins?|m)", re.IGNORECASE)
+
+Conflict = namedtuple("Conflict", "kind other minutes needed")
+# kind: "overlap" | "tight"；other: 另一個 activity 的 index；
+# minutes: 重疊的分鐘數 / 實際空檔；needed: tight 時需要的空檔
+
+
+def parse_time(text):
+    hours, minutes = text.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_duration(text):
+    """Minutes for free text like "1.5 小時", "1 小時 30 分", "90 min"; None when unparseable."""
+    if not text:
+        return None
+    total, found = 0.0, False
+    for number, unit in _DURATION_RE.findall(text):
+        found = True
+        value = float(number)
+        total += value * 60 if unit.lower() in ("小時", "時間", "h", "hr", "hrs", "hour", "hours") else value
+    return round(total) if found else None
+
+
+def day_intervals(acts):
+    """(starts, ends) in minutes since midnight, one entry per activity in list order."""
+    starts = [parse_time(act['time']) for act in acts]
+    ends = [start + (parse_duration(act.get('stayTime')) or 0) for start, act in zip(starts, acts)]
+    return starts, ends
+
+
+def find_conflicts(starts, ends, travel=None):
+    """Sorted sweep over one day's intervals.
+
+    travel(a, b) 回傳從 a 到 b 的預估分鐘數 (未知時 None)。
+    回傳 {activity index: [Conflict, ...]}，兩邊的 activity 都會標記。
+    """
+    order = sorted(range(len(starts)), key=lambda i: (starts[i], ends[i]))
+    out = {}
+    latest = None  # 目前結束得最晚的那一段
+    for i in order:
+        if latest is not None:
+            if starts[i] < ends[latest]:
+                # 沒有停留時間的 (出發、抵達) 是時間點：算上一段超過它多久
+                overlap = (min(ends[latest], ends[i]) if ends[i] > starts[i] else ends[latest]) - starts[i]
+                out.setdefault(latest, []).append(Conflict("overlap", i, overlap, 0))
+                out.setdefault(i, []).append(Conflict("overlap", latest, overlap, 0))
+            else:
+                gap = starts[i] - ends[latest]
+                needed = travel(latest, i) if travel else None
+                needed = MIN_GAP if needed is None else round(needed)
+                if gap < needed:
+                    out.setdefault(latest, []).append(Conflict("tight", i, gap, needed))
+                    out.setdefault(i, []).append(Conflict("tight", latest, gap, needed))
+        if latest is None or ends[i] >= ends[latest]:
+            latest = i
+    return out
+
+
+class ScheduleChecker:
+    """Per-day conflict results cached by the day's file version."""
+
+    def __init__(self, limit=SCHEDULE_TRIP_LIMIT):
+        self.limit = limit
+        self._lock = threading.Lock()
+        # trip path -> [(trip.version(), 整趟的結果) 或 None, {day_idx: (day_version, conflicts)}] (LRU)
+        self._trips = OrderedDict()
+        self.rechecks = 0
+
+    def _entry(self, trip):
+        # 呼叫端需持有 self._lock
+        entry = self._trips.get(trip.path)
+        if entry is None:
+            entry = self._trips[trip.path] = [None, {}]
+            if len(self._trips) > self.limit:
+                self._trips.popitem(last=False)
+        self._trips.move_to_end(trip.path)
+        return entry
+
+    def day(self, trip, day_idx, travel=None, version=None):
+        version = version or trip.day_version(day_idx)
+        with self._lock:
+            cached = self._entry(trip)[1].get(day_idx)
+        if cached and cached[0] == version:
+            return cached[1]
+        conflicts = find_conflicts(*day_intervals(trip.activities(day_idx)), travel)
+        with self._lock:
+            self._entry(trip)[1][day_idx] = (version, conflicts)
+            self.rechecks += 1
+        return conflicts
+
+    def trip(self, trip, travel_for_day=None, version=None):
+        """{day_idx: conflicts} for the whole trip; unchanged days come from the cache.
+
+        整個行程的版本 (trip.version()) 沒變就直接回傳上次的結果，不逐天檢查。
+        """
+        version = version or trip.version()
+        with self._lock:
+            cached = self._entry(trip)[0]
+        if cached and cached[0] == version:
+            return cached[1]
+        result = {d: self.day(trip, d, travel_for_day(d) if travel_for_day else None, day_version)
+                  for d, day_version in enumerate(version)}
+        with self._lock:
+            self._entry(trip)[0] = (version, result)
+        return result
+
+
+schedule_checker = ScheduleChecker()
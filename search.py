@@ -0,0 +1,128 @@
+# 行程全文搜尋 (activity 的 text / desc / guideText / menu / notes)
+# 中文、日文不需要斷詞：文字正規化後切成字元 1-gram + 2-gram 建倒排索引，
+# 查詢時取最少筆的 posting 開始交集，再用子字串比對確認，所以不會有 n-gram 湊出來的假命中。
+# 索引依行程版本 (每天檔案的 mtime) 快取在 process 內，資料沒變就不重建。
+import threading
+import unicodedata
+from collections import OrderedDict
+
+SEARCH_FIELDS = ("text", "desc", "guideText", "menu", "notes")
+MAX_RESULTS = 30
+# process 內最多保留幾個行程的索引 (LRU)，和 trip_store.PACKING_INDEX_LIMIT 一樣
+SEARCH_INDEX_LIMIT = 64
+
+
+def normalize(text):
+    # 全形 / 半形、大小寫統一；連續空白壓成一個
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def grams(text):
+    """Character 1-grams and 2-grams of already-normalized text."""
+    out = set(text)
+    out.update(text[i:i + 2] for i in range(len(text) - 1))
+    out.discard(" ")
+    return out
+
+
+def _query_grams(query):
+    # 2 個字以上只用 2-gram (posting 短很多)，單字才用 1-gram
+    if len(query) == 1:
+        return {query}
+    return {query[i:i + 2] for i in range(len(query) - 1)}
+
+
+class SearchIndex:
+    """Inverted n-gram index over documents made of named text fields."""
+
+    def __init__(self):
+        self.docs = []      # doc id -> (ref, {field: original text})
+        self._norm = []     # doc id -> [(field, normalized text)]
+        self._postings = {}  # gram -> set(doc id)
+
+    def add(self, ref, fields):
+        doc_id = len(self.docs)
+        self.docs.append((ref, fields))
+        norm = [(name, normalize(value)) for name, value in fields.items() if value]
+        self._norm.append(norm)
+        for gram in set().union(*(grams(text) for _, text in norm)):
+            self._postings.setdefault(gram, set()).add(doc_id)
+        return doc_id
+
+    def search(self, query, limit=MAX_RESULTS):
+        """[(ref, field, original text)] for docs containing the whole query, in insertion order."""
+        q = normalize(query)
+        if not q:
+            return []
+        postings = []
+        for gram in _query_grams(q):
+            ids = self._postings.get(gram)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        hits = []
+        for doc_id in sorted(candidates):
+            field = next((name for name, text in self._norm[doc_id] if q in text), None)
+            if field is None:
+                continue
+            ref, fields = self.docs[doc_id]
+            hits.append((ref, field, fields[field]))
+            if len(hits) >= limit:
+                break
+        return hits
+
+
+def activity_fields(act):
+    fields = {}
+    for name in SEARCH_FIELDS:
+        value = act.get(name)
+        if isinstance(value, list):
+            value = "\n".join(value)
+        if value:
+            fields[name] = value
+    return fields
+
+
+def build_trip_index(trip):
+    index = SearchIndex()
+    for day_idx in range(len(trip.days)):
+        for act_idx, act in enumerate(trip.activities(day_idx)):
+            index.add((day_idx, act_idx), activity_fields(act))
+    return index
+
+
+_lock = threading.Lock()
+_indexes = OrderedDict()  # trip path -> (version, SearchIndex) (LRU)
+
+
+def trip_index(trip):
+    """The search index for a trip; rebuilt only when one of its files changed."""
+    version = trip.version()
+    with _lock:
+        cached = _indexes.get(trip.path)
+        if cached and cached[0] == version:
+            _indexes.move_to_end(trip.path)
+            return cached[1]
+    index = build_trip_index(trip)
+    with _lock:
+        _indexes[trip.path] = (version, index)
+        _indexes.move_to_end(trip.path)
+        if len(_indexes) > SEARCH_INDEX_LIMIT:
+            _indexes.popitem(last=False)
+    return index
+
+
+def snippet(text, query, width=18):
+    """(before, match, after) around the first match, for highlighting."""
+    q = normalize(query)
+    flat = " ".join(unicodedata.normalize("NFKC", text).split())
+    pos = flat.casefold().find(q)
+    if pos < 0:
+        return flat[:width * 2], "", ""
+    start = max(0, pos - width)
+    before = ("…" if start else "") + flat[start:pos]
+    end = pos + len(q)
+    after = flat[end:end + width] + ("…" if end + width < len(flat) else "")
+    return before, flat[pos:end], after
@@ -0,0 +1,161 @@
+# 閒置 session 的整理
+# Streamlit 只在瀏覽器斷線後 (server.disconnectedSessionTTL) 才回收 session；分頁一直開著卻沒人在用的 session
+# 會一直留著上傳過的檔案 (票券原圖，在記憶體裡) 與所有 widget 狀態。
+# 每次 rerun 記下 session 的最後活動時間，背景每 SWEEP_INTERVAL 秒掃一次：
+#   閒置超過 COMPACT_AFTER  釋放這個 session 上傳過的檔案 (圖片早已壓縮存到磁碟，原檔用不到)
+#   閒置超過 EVICT_AFTER    關閉 session；使用者回來時瀏覽器會自動重連、開新 session
+#                           (票券與行李清單在 SQLite，不會遺失，只是回到首頁)
+#
+#   SESSION_COMPACT_AFTER / SESSION_EVICT_AFTER / SESSION_SWEEP_INTERVAL (秒)，EVICT 設 0 代表不關閉
+# 釋放 / 關閉要用到 Streamlit 的內部 API (requirements.txt 鎖在測過的版本範圍)；
+# 換了版本找不到時就不整理 (記一次 warning)，行為和沒有這個模組時一樣。
+import functools
+import logging
+import os
+import threading
+import time
+
+COMPACT_AFTER = float(os.environ.get("SESSION_COMPACT_AFTER", 15 * 60))
+EVICT_AFTER = float(os.environ.get("SESSION_EVICT_AFTER", 6 * 60 * 60))
+SWEEP_INTERVAL = float(os.environ.get("SESSION_SWEEP_INTERVAL", 60))
+UPLOAD_KEY_PREFIX = "upload_"  # app 裡 file_uploader 的 key 都以此開頭，整理時一併清掉
+
+log = logging.getLogger("hokkaido.sessions")
+_warned = set()
+
+
+def _unsupported(name):
+    if name not in _warned:
+        _warned.add(name)
+        log.warning("streamlit has no %s; idle sessions will not be compacted or closed", name)
+
+
+class StreamlitRuntime:
+    """The parts of streamlit.runtime.Runtime the sweeper uses (pass a fake to SessionTracker to test it)."""
+
+    def _runtime(self):
+        from streamlit.runtime import Runtime
+        return Runtime.instance() if Runtime.exists() else None
+
+    def is_active(self, session_id):
+        runtime = self._runtime()
+        return runtime is not None and runtime.is_active_session(session_id)
+
+    def _eventloop(self, runtime):
+        # session 與 session_state 只能在 runtime 的 event loop 上動，sweep 是在背景執行緒
+        get_async_objs = getattr(runtime, "_get_async_objs", None)
+        loop = getattr(get_async_objs(), "eventloop", None) if get_async_objs else None
+        if loop is None:
+            _unsupported("Runtime._get_async_objs().eventloop")
+        return loop
+
+    def release_uploads(self, session_id):
+        runtime = self._runtime()
+        loop = runtime and self._eventloop(runtime)
+        if not loop:
+            return
+        remove_files = getattr(runtime.uploaded_file_mgr, "remove_session_files", None)
+        get_info = getattr(getattr(runtime, "_session_mgr", None), "get_active_session_info", None)
+        if remove_files is None or get_info is None:
+            _unsupported("UploadedFileManager.remove_session_files / SessionManager.get_active_session_info")
+            return
+        remove_files(session_id)
+        info = get_info(session_id)
+        state = getattr(getattr(info, "session", None), "session_state", None)
+        if state is not None:
+            # file_uploader 的值 (UploadedFile) 也還握著整份原檔
+            loop.call_soon_threadsafe(_drop_uploads, state)
+
+    def close(self, session_id):
+        runtime = self._runtime()
+        loop = runtime and self._eventloop(runtime)
+        if loop:
+            loop.call_soon_threadsafe(runtime.close_session, session_id)
+
+
+def _drop_uploads(state):
+    # st.rerun 會以原本的 widget 狀態重跑，值可能只剩 widget id (以 "-<key>" 結尾) 這一份
+    for key in [k for k in state if k.rsplit("-", 1)[-1].startswith(UPLOAD_KEY_PREFIX)]:
+        del state[key]
+
+
+class SessionTracker:
+    """Last-activity time per session, and the periodic compact / evict sweep."""
+
+    def __init__(self, runtime=None, clock=time.monotonic, compact_after=COMPACT_AFTER, evict_after=EVICT_AFTER):
+        self.runtime = runtime or StreamlitRuntime()
+        self.compact_after = compact_after
+        self.evict_after = evict_after
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._seen = {}         # session id -> 最後一次 rerun 的時間
+        self._compacted = set()
+        self.counters = {"compacted": 0, "evicted": 0, "gone": 0}
+
+    def touch(self, session_id):
+        with self._lock:
+            self._seen[session_id] = self._clock()
+            self._compacted.discard(session_id)
+
+    def __len__(self):
+        return len(self._seen)
+
+    def sweep(self):
+        now = self._clock()
+        with self._lock:
+            seen = list(self._seen.items())
+        for session_id, last in seen:
+            idle = now - last
+            if not self.runtime.is_active(session_id):
+                # Streamlit 已經自己回收了 (斷線逾時)
+                self._forget(session_id, "gone")
+            elif self.evict_after and idle >= self.evict_after:
+                self.runtime.close(session_id)
+                self._forget(session_id, "evicted")
+            elif idle >= self.compact_after and session_id not in self._compacted:
+                self.runtime.release_uploads(session_id)
+                with self._lock:
+                    self._compacted.add(session_id)
+                    self.counters["compacted"] += 1
+
+    def _forget(self, session_id, reason):
+        with self._lock:
+            self._seen.pop(session_id, None)
+            self._compacted.discard(session_id)
+            self.counters[reason] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, tracked=len(self._seen), compacted_now=len(self._compacted))
+
+
+session_tracker = SessionTracker()
+_lock = threading.Lock()
+_sweeper = None
+
+
+def touched(func):
+    """Decorator for st.fragment / st.dialog bodies: a fragment rerun skips the script's top-level touch()."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        touch()
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def touch():
+    """Record activity for the session running this script (call once per rerun)."""
+    global _sweeper
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    session_tracker.touch(ctx.session_id)
+    if _sweeper is None:
+        with _lock:
+            if _sweeper is None:
+                # 和 prefetch 同一套排程器，但獨立一個執行緒 (PREFETCH=off 時也要整理 session)
+                from prefetch import PrefetchScheduler
+                _sweeper = PrefetchScheduler(max_workers=1)
+                _sweeper.add("session_sweep", session_tracker.sweep, SWEEP_INTERVAL, delay=SWEEP_INTERVAL)
+                _sweeper.start()
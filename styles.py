@@ -0,0 +1,343 @@
+# 全域樣式表
+# 原本每次 rerun 都重新 format 一次 ~270 行 CSS 並整段送到瀏覽器；
+# 現在每個配色只編譯一次，有開 static serving 時寫成帶 hash 的靜態檔，
+# rerun 只需要送一個 <link>，瀏覽器會快取檔案本身。
+import functools
+import hashlib
+import os
+import re
+
+from cards import theme_key
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+FONTS_DIR = os.path.join(STATIC_DIR, "fonts")
+# Streamlit static serving 的 URL 前綴 (.streamlit/config.toml: server.enableStaticServing)
+STATIC_URL = "app/static/"
+
+GOOGLE_FONTS_URL = "https://fonts.googleapis.com/css2?family=Noto+Serif+TC:wght@400;600;700&family=Shippori+Mincho:wght@400;500;700&display=swap"
+
+# FONT_SOURCE=google | local；預設有自架字型 (tools/fetch_fonts.py 產生) 就用本機的
+FONT_SOURCE = os.environ.get("FONT_SOURCE") or ("local" if os.path.exists(os.path.join(FONTS_DIR, "fonts.css")) else "google")
+
+# 配色定義 (截圖取色)
+COLORS = {
+    'bg_main': '#F9F8F6',       # 背景
+    'surface': '#FFFFFF',       # 卡片/未選中日期
+    'text_primary': '#4A3B32',  # 深棕色主文字 (截圖風格)
+    'text_secondary': '#9C8E7E',# 淺灰褐
+    'accent_dark': '#3E3A36',   # 底部導覽列背景 / 選中日期背景
+    'accent_gold': '#DEB887',   # 點綴金
+    'line_light': '#E0DCD8',    # 線條
+    'selected_text': '#FFFFFF', # 選中文字色
+    'accent_warm': '#B8860B',   # 推薦菜單標籤
+    'alert_red': '#C0504D',     # 緊急求助
+}
+
+
+def _local_font_faces(font_base):
+    # fonts.css 裡的 url() 只寫檔名，依載入位置補上路徑
+    with open(os.path.join(FONTS_DIR, "fonts.css"), encoding="utf-8") as f:
+        return re.sub(r"url\((['\"]?)", lambda m: f"url({m.group(1)}{font_base}", f.read())
+
+
+def _theme_css(colors):
+    return f"""
+    /* 1. 全局設定 */
+    :root {{
+        --primary-color: {colors['accent_dark']};
+        --background-color: {colors['bg_main']};
+        --secondary-background-color: {colors['surface']};
+        --text-color: {colors['text_primary']};
+    }}
+
+    .stApp {{
+        background-color: {colors['bg_main']} !important;
+        font-family: 'Shippori Mincho', 'Noto Serif TC', serif;
+        color: {colors['text_primary']} !important;
+        padding-bottom: 100px; /* 為了避開底部導覽列 */
+    }}
+    
+    h1, h2, h3, h4, h5, h6, p, div, span, label, li {{
+        color: {colors['text_primary']} !important;
+    }}
+
+    #MainMenu, footer, header {{visibility: hidden;}}
+
+    /* -----------------------------------------
+       ★ 底部固定導覽列 (Floating Bottom Bar) ★
+       ----------------------------------------- */
+    
+    /* 定位容器 */
+    .bottom-nav-container {{
+        position: fixed;
+        bottom: 30px;
+        left: 50%;
+        transform: translateX(-50%);
+        z-index: 9999;
+        width: 90%;
+        max-width: 400px;
+        background-color: {colors['accent_dark']};
+        border-radius: 50px;
+        padding: 10px 20px;
+        box-shadow: 0 10px 25px rgba(0,0,0,0.2);
+        display: flex;
+        justify-content: space-around;
+        align-items: center;
+    }}
+
+    /* 為了讓 Streamlit 的按鈕能放進去，我們需要針對特定的 key 做 CSS Hack */
+    /* 這裡我們會在 Python 端用特殊的容器包裝底部按鈕 */
+
+    div[data-testid="stHorizontalBlock"][gap="large"] {{
+        background-color: {colors['accent_dark']};
+        border-radius: 40px;
+        padding: 10px 15px;
+        position: fixed;
+        bottom: 30px;
+        left: 50%;
+        transform: translateX(-50%);
+        z-index: 999;
+        width: 90%;
+        max-width: 380px;
+        box-shadow: 0 8px 20px rgba(62, 58, 54, 0.3);
+        justify-content: space-around !important;
+    }}
+
+    /* 底部按鈕樣式 */
+    div[data-testid="stHorizontalBlock"][gap="large"] button {{
+        background-color: transparent !important;
+        border: none !important;
+        color: #888 !important; /* 未選中顏色 */
+        font-size: 1.5rem !important;
+        padding: 0 !important;
+        margin: 0 !important;
+        box-shadow: none !important;
+        display: flex;
+        flex-direction: column;
+        align-items: center;
+    }}
+    
+    /* 底部按鈕 - 選中/懸停 */
+    div[data-testid="stHorizontalBlock"][gap="large"] button:hover,
+    div[data-testid="stHorizontalBlock"][gap="large"] button:focus {{
+        color: #FFFFFF !important; /* 選中變白 */
+    }}
+    
+    /* -----------------------------------------
+       ★ 日期選擇器 (In-Page Date Selector) ★
+       ----------------------------------------- */
+    
+    /* 日期捲軸容器 */
+    div[data-testid="stHorizontalBlock"][gap="medium"] {{
+        overflow-x: auto !important;
+        flex-wrap: nowrap !important;
+        padding-bottom: 10px;
+        gap: 10px !important;
+        /* 隱藏捲軸 */
+        -webkit-overflow-scrolling: touch;
+        scrollbar-width: none; 
+    }}
+    div[data-testid="stHorizontalBlock"][gap="medium"]::-webkit-scrollbar {{ 
+        display: none; 
+    }}
+
+    /* 日期按鈕通用樣式 (方圓形) */
+    div[data-testid="stHorizontalBlock"][gap="medium"] button {{
+        border-radius: 16px !important; /* 方圓角 */
+        width: 55px !important;
+        height: 65px !important;
+        min-width: 55px !important;
+        padding: 5px !important;
+        display: flex;
+        flex-direction: column;
+        align-items: center;
+        justify-content: center;
+        border: 1px solid #EEE !important;
+        transition: all 0.2s ease;
+        line-height: 1.2 !important;
+    }}
+
+    /* 日期按鈕 - 未選中 */
+    div[data-testid="stHorizontalBlock"][gap="medium"] button[kind="secondary"] {{
+        background-color: #FFFFFF !important;
+        color: {colors['text_primary']} !important;
+        box-shadow: 0 2px 5px rgba(0,0,0,0.02) !important;
+    }}
+
+    /* 日期按鈕 - 選中 (Primary) - 深色背景 */
+    div[data-testid="stHorizontalBlock"][gap="medium"] button[kind="primary"] {{
+        background-color: {colors['accent_dark']} !important;
+        color: #FFFFFF !important;
+        border: 1px solid {colors['accent_dark']} !important;
+        box-shadow: 0 4px 12px rgba(62, 58, 54, 0.3) !important;
+    }}
+    /* 強制覆蓋內部文字顏色 */
+    div[data-testid="stHorizontalBlock"][gap="medium"] button[kind="primary"] p {{
+        color: #FFFFFF !important;
+    }}
+
+
+    /* -----------------------------------------
+       通用元件樣式 (卡片、按鈕)
+       ----------------------------------------- */
+
+    /* 標題樣式 */
+    .page-title {{
+        font-family: 'Shippori Mincho', serif;
+        font-size: 1.8rem;
+        font-weight: 600;
+        margin-top: 10px;
+        margin-bottom: 20px;
+    }}
+
+    /* 簡約卡片 */
+    .minimal-card {{
+        background: {colors['surface']};
+        border: 1px solid {colors['line_light']};
+        border-radius: 16px;
+        padding: 1.5rem;
+        margin-bottom: 1.2rem;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.02);
+    }}
+
+    /* 住宿卡片容器 */
+    div[data-testid="stVerticalBlockBorderWrapper"] {{
+        border-color: {colors['line_light']} !important;
+        border-radius: 16px !important;
+        background-color: {colors['surface']} !important;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.02);
+    }}
+    
+    /* 一般功能按鈕 */
+    .stButton button {{
+        height: auto !important;
+        padding: 8px 20px !important;
+        background-color: #FFFFFF !important;
+        border: 1px solid {colors['line_light']} !important;
+        color: {colors['text_secondary']} !important;
+        border-radius: 24px;
+        font-weight: 500 !important;
+    }}
+    .stButton button:hover {{
+        border-color: {colors['accent_gold']} !important;
+        color: {colors['accent_gold']} !important;
+    }}
+
+    /* Google Map Link */
+    a[href*="maps.google.com"] {{
+        display: flex;
+        align-items: center;
+        justify-content: center;
+        background-color: #FFFFFF !important;
+        color: {colors['text_primary']} !important;
+        border: 1px solid {colors['line_light']} !important;
+        border-radius: 24px !important;
+        padding: 0.5rem 1rem !important;
+        text-decoration: none !important;
+        font-weight: 500 !important;
+        width: 100%;
+        box-shadow: 0 1px 2px rgba(0,0,0,0.05);
+        margin-bottom: 10px;
+    }}
+
+    /* Expander */
+    div[data-testid="stExpander"] {{
+        background-color: #FFFFFF !important;
+        border: 1px solid {colors['line_light']} !important;
+        color: {colors['text_primary']} !important;
+        box-shadow: none !important;
+        margin-top: 10px;
+    }}
+    div[data-testid="stExpander"] summary {{
+        background-color: transparent !important;
+        color: {colors['text_primary']} !important;
+    }}
+    div[data-testid="stExpander"] svg {{
+        fill: {colors['text_secondary']} !important;
+        color: {colors['text_secondary']} !important;
+    }}
+
+    /* Checkbox */
+    div[data-testid="stCheckbox"] label span[data-baseweb="checkbox"] {{
+        background-color: #FFFFFF !important;
+        border-color: {colors['line_light']} !important;
+    }}
+    div[data-testid="stCheckbox"] label[aria-checked="true"] span[data-baseweb="checkbox"] {{
+        background-color: {colors['accent_gold']} !important;
+        border-color: {colors['accent_gold']} !important;
+    }}
+
+    /* Timeline */
+    .timeline-point {{
+        width: 9px;
+        height: 9px;
+        background-color: {colors['text_primary']};
+        border-radius: 50%;
+        margin-right: 12px;
+        border: 2px solid {colors['bg_main']}; 
+    }}
+    .timeline-line {{
+        position: absolute;
+        left: 3px;
+        top: 24px;
+        bottom: -20px;
+        width: 1px;
+        background-color: {colors['line_light']};
+    }}
+    
+    /* Delete Btn */
+    .delete-btn button {{
+        border: none !important;
+        color: #E57373 !important;
+        padding: 0px 8px !important;
+        background: transparent !important;
+    }}
+
+    /* Packing 進度條 */
+    .stProgress > div > div > div > div {{
+        background-color: {colors['accent_gold']};
+    }}
+    """
+
+
+@functools.lru_cache(maxsize=16)
+def compile_stylesheet(theme, font_source, font_base):
+    css = _theme_css(dict(theme))
+    if font_source == "local":
+        css = _local_font_faces(font_base) + css
+    return css, hashlib.sha1(css.encode("utf-8")).hexdigest()[:12]
+
+
+def _write_static(name, text):
+    path = os.path.join(STATIC_DIR, name)
+    if os.path.exists(path):
+        return
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+@functools.lru_cache(maxsize=16)
+def _stylesheet_tags(theme, static_serving, font_source):
+    tags = ""
+    if font_source == "google":
+        tags += ('<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>'
+                 f'<link rel="stylesheet" href="{GOOGLE_FONTS_URL}">')
+    if static_serving:
+        # 字型與 CSS 同在 static/ 底下，相對路徑即可
+        css, digest = compile_stylesheet(theme, font_source, "fonts/")
+        name = f"theme-{digest}.css"
+        _write_static(name, css)
+        return tags + f'<link rel="stylesheet" href="{STATIC_URL}{name}">'
+    css, _ = compile_stylesheet(theme, font_source, f"{STATIC_URL}fonts/")
+    return tags + f"<style>{css}</style>"
+
+
+def stylesheet_tags(colors, static_serving=None, font_source=None):
+    """HTML to inject the global stylesheet; cached per theme."""
+    if static_serving is None:
+        import streamlit as st
+        static_serving = bool(st.get_option("server.enableStaticServing"))
+    return _stylesheet_tags(theme_key(colors), static_serving, font_source or FONT_SOURCE)
@@ -0,0 +1,80 @@
+# 票券圖片：上傳後縮圖、重新壓縮，依內容 hash 存到磁碟
+# session_state 只保留一個小的 ref dict，不再把原始 UploadedFile (整張手機截圖) 放在記憶體裡。
+import hashlib
+import io
+import os
+import threading
+
+# PIL 只有在真的上傳圖片時才載入 (冷啟動不需要)
+
+TICKET_IMAGE_DIR = os.environ.get(
+    "TICKET_IMAGE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "tickets"))
+
+# 長邊上限 (px) 與 JPEG 品質；QR code / 條碼在這個尺寸下仍可掃描
+MAX_SIDE = 1600
+THUMB_SIDE = 360
+JPEG_QUALITY = 82
+
+
+class TicketImageError(ValueError):
+    pass
+
+
+def image_path(ref, thumb=False):
+    return os.path.join(TICKET_IMAGE_DIR, f"{ref['id']}{'_thumb' if thumb else ''}.jpg")
+
+
+def _encode(img, side):
+    from PIL import Image
+    img = img.copy()
+    img.thumbnail((side, side), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buf.getvalue(), img.size
+
+
+def _write_atomic(path, data):
+    # 同一個 process 裡兩個 session 可能同時存同一張圖，暫存檔名要分到執行緒
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def store_ticket_image(data):
+    """Downscale + recompress an uploaded image and store it by content hash.
+
+    回傳 {"id", "width", "height", "size"}；同一張圖重複上傳只會存一份。
+    無法辨識的檔案會丟出 TicketImageError。
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    ref = {"id": digest}
+    full = image_path(ref)
+    if os.path.exists(full):
+        with Image.open(full) as img:
+            ref.update(width=img.width, height=img.height, size=os.path.getsize(full))
+        return ref
+
+    try:
+        src = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError as e:
+        raise TicketImageError(str(e)) from e
+    with src:
+        img = ImageOps.exif_transpose(src)
+        if img.mode in ("RGBA", "LA", "P"):
+            # 截圖常有透明背景，JPEG 需要鋪白底
+            img = img.convert("RGBA")
+            bg = Image.new("RGB", img.size, (255, 255, 255))
+            bg.paste(img, mask=img.getchannel("A"))
+            img = bg
+        else:
+            img = img.convert("RGB")
+        full_bytes, (w, h) = _encode(img, MAX_SIDE)
+        thumb_bytes, _ = _encode(img, THUMB_SIDE)
+
+    os.makedirs(TICKET_IMAGE_DIR, exist_ok=True)
+    _write_atomic(image_path(ref, thumb=True), thumb_bytes)
+    _write_atomic(full, full_bytes)
+    ref.update(width=w, height=h, size=len(full_bytes))
+    return ref
@@ -0,0 +1,42 @@
+# 把行程匯出成檔案：手機行事曆 (.ics) 與離線版 HTML (和 app 裡下載的是同一份內容)
+#
+#   python tools/export_trip.py [trips/<trip>] [--ics out.ics] [--html out.html]
+#
+# 沒有指定輸出時兩種都寫到目前資料夾 (<trip>.ics / <trip>.html)。逐段寫檔，不經過快取。
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from export import iter_html, iter_ics  # noqa: E402
+from styles import COLORS  # noqa: E402
+from trip_data import TRIP_DIR, load_trip  # noqa: E402
+
+
+def write(path, chunks):
+    # .ics 的換行已經是 CRLF，不要再轉換
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    print(f"{path}: {os.path.getsize(path)} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trip", nargs="?", default=TRIP_DIR)
+    parser.add_argument("--ics")
+    parser.add_argument("--html")
+    args = parser.parse_args()
+
+    trip = load_trip(args.trip)
+    if not args.ics and not args.html:
+        args.ics, args.html = f"{trip.id}.ics", f"{trip.id}.html"
+    if args.ics:
+        write(args.ics, iter_ics(trip))
+    if args.html:
+        write(args.html, iter_html(trip, COLORS))
+
+
+if __name__ == "__main__":
+    main()
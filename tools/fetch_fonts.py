@@ -0,0 +1,62 @@
+# 下載 Noto Serif TC / Shippori Mincho 的子集字型到 static/fonts/，改為自架
+# 只保留 app 實際用到的字元 (Google Fonts 的 text= 參數)，檔案通常只有幾十 KB。
+#
+#   python tools/fetch_fonts.py            # 以 app 原始碼中出現的字元做子集
+#   python tools/fetch_fonts.py --full     # 不做子集 (Google 仍會依 unicode-range 切片)
+#
+# 產生 static/fonts/fonts.css 之後，styles.py 會自動改用本機字型 (也可用 FONT_SOURCE 強制切換)。
+import os
+import re
+import sys
+import urllib.parse
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from styles import FONTS_DIR, GOOGLE_FONTS_URL  # noqa: E402
+
+# woff2 只會回給新版瀏覽器的 UA
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+SOURCE_GLOBS = (".py", ".json", ".toml", ".yaml", ".yml")
+
+
+def used_characters():
+    chars = set()
+    for dirpath, dirnames, filenames in os.walk(ROOT):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".") and d not in ("static", "__pycache__")]
+        for name in filenames:
+            if name.endswith(SOURCE_GLOBS):
+                with open(os.path.join(dirpath, name), encoding="utf-8", errors="ignore") as f:
+                    chars.update(f.read())
+    chars.update(chr(c) for c in range(0x20, 0x7F))
+    return "".join(sorted(c for c in chars if c.isprintable()))
+
+
+def main(full=False):
+    url = GOOGLE_FONTS_URL
+    if not full:
+        url += "&text=" + urllib.parse.quote(used_characters())
+    css = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=30).text
+    os.makedirs(FONTS_DIR, exist_ok=True)
+
+    def localize(match):
+        remote = match.group(1)
+        name = remote.rsplit("/", 1)[-1].split("?")[0]
+        if not name.endswith(".woff2"):
+            name += ".woff2"
+        path = os.path.join(FONTS_DIR, name)
+        if not os.path.exists(path):
+            data = requests.get(remote, headers={"User-Agent": USER_AGENT}, timeout=30).content
+            with open(path, "wb") as f:
+                f.write(data)
+        return f"url('{name}')"
+
+    css = re.sub(r"url\((https://[^)]+)\)", localize, css)
+    with open(os.path.join(FONTS_DIR, "fonts.css"), "w", encoding="utf-8") as f:
+        f.write(css)
+    print(f"wrote {FONTS_DIR}")
+
+
+if __name__ == "__main__":
+    main(full="--full" in sys.argv)
@@ -0,0 +1,71 @@
+# 幫沒有 coords 的 activity 補上座標 (OpenStreetMap Nominatim)
+# 查詢字串取自 mapUrl 的 query= 參數；找不到的會印出來，請手動補。
+#
+#   python tools/geocode_activities.py [trips/<trip>] [--dry-run]
+#
+# Nominatim 的使用規範：每秒最多一個請求，且要帶可辨識的 User-Agent。
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.parse
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from trip_data import TRIP_DIR, load_trip  # noqa: E402
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "hokkaido-trip-planner/1.0 (geocode_activities.py)"
+
+
+def map_query(map_url):
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(map_url).query).get("query")
+    return query[0] if query else None
+
+
+def geocode(query, near=None):
+    params = {"q": query, "format": "jsonv2", "limit": 1}
+    if near:
+        # 以當天的座標為中心限制搜尋範圍 (約 ±1°)，同名地點不會跑到別的縣
+        lat, lon = near['lat'], near['lon']
+        params["viewbox"] = f"{lon - 1},{lat + 1},{lon + 1},{lat - 1}"
+    res = requests.get(NOMINATIM_URL, params=params, headers={"User-Agent": USER_AGENT}, timeout=10).json()
+    if not res:
+        return None
+    return {"lat": round(float(res[0]['lat']), 4), "lon": round(float(res[0]['lon']), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trip", nargs="?", default=TRIP_DIR)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    trip = load_trip(args.trip)
+    for day_idx, day in enumerate(trip.days):
+        path = os.path.join(trip.path, "days", f"{day['id']}.json")
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        changed = False
+        for act in data['activities']:
+            if 'coords' in act or 'mapUrl' not in act:
+                continue
+            query = map_query(act['mapUrl'])
+            coords = geocode(query, day['coords']) if query else None
+            time.sleep(1)
+            if coords is None:
+                print(f"day {day['id']} {act['time']} {act['text']}: not found ({query})")
+                continue
+            print(f"day {day['id']} {act['time']} {act['text']}: {coords['lat']}, {coords['lon']}")
+            act['coords'] = coords
+            changed = True
+        if changed and not args.dry_run:
+            with open(path, "w", encoding="utf-8", newline="\r\n") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
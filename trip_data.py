@@ -0,0 +1,258 @@
+# 行程資料載入
+# 每個行程是一個資料夾：
+#   trips/<trip>/trip.json       標題、航班與每天的摘要 (日期、地點、座標、住宿)
+#   trips/<trip>/days/<id>.json  當天的 activities
+# 啟動時只讀 trip.json 建立索引；某一天的 activities 要顯示時才讀檔。
+# 解析結果依檔案 mtime 快取在 process 內，檔案沒變就不會重新解析。
+# 同一個 server 可以放很多個行程 (trips/ 底下每個資料夾一個)，網址用 ?trip=<資料夾名稱> 選擇。
+# 行李清單範本放在 packing_templates/<name>.json，可一次匯入整份清單。
+import datetime
+import json
+import os
+import re
+import threading
+
+TRIPS_DIR = os.environ.get("TRIPS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "trips"))
+TRIP_DIR = os.environ.get("TRIP_DIR", os.path.join(TRIPS_DIR, "hokkaido-2025"))
+DEFAULT_TRIP_ID = os.path.basename(os.path.normpath(TRIP_DIR))
+PACKING_TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "packing_templates")
+
+ACTIVITY_TYPES = {"transport", "hotel", "food", "activity"}
+_TIME_RE = re.compile(r"^\d{2}:\d{2}$")
+_TRIP_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+# 新行程第一次打開時的行李清單
+DEFAULT_PACKING_LIST = [
+    {"category": "Documents", "items": ["護照", "VJW QR", "機票截圖"]},
+    {"category": "Clothing", "items": ["發熱衣", "防風外套", "毛帽"]},
+    {"category": "Electronics", "items": ["網卡", "行動電源", "充電線"]},
+]
+
+
+class TripDataError(ValueError):
+    pass
+
+
+# --- schema 檢查 ---
+
+def _require(obj, key, types, where, optional=False):
+    if key not in obj:
+        if optional:
+            return None
+        raise TripDataError(f"{where}: missing '{key}'")
+    value = obj[key]
+    # bool 是 int 的子類別，數字欄位要另外排除
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise TripDataError(f"{where}.{key}: expected {types}, got {type(value).__name__}")
+    return value
+
+
+def _validate_flight(flight, where):
+    for leg in ("outbound", "inbound"):
+        leg_data = _require(flight, leg, dict, where)
+        for key in ("code", "time", "arrival"):
+            _require(leg_data, key, str, f"{where}.{leg}")
+
+
+def validate_index(data, where="trip.json"):
+    if not isinstance(data, dict):
+        raise TripDataError(f"{where}: expected an object")
+    _require(data, "title", str, where)
+    _require(data, "subtitle", str, where)
+    _validate_flight(_require(data, "flight", dict, where), f"{where}.flight")
+    # 行程所在地的時區 (IANA 名稱，例 "Asia/Tokyo")，匯出行事曆時用；預設見 export.TIMEZONE
+    _require(data, "timezone", str, where, optional=True)
+    days = _require(data, "days", list, where)
+    if not days:
+        raise TripDataError(f"{where}.days: empty")
+    seen = set()
+    for i, day in enumerate(days):
+        w = f"{where}.days[{i}]"
+        if not isinstance(day, dict):
+            raise TripDataError(f"{w}: expected an object")
+        day_id = _require(day, "id", int, w)
+        if day_id in seen:
+            raise TripDataError(f"{w}.id: duplicate id {day_id}")
+        seen.add(day_id)
+        for key in ("date", "weekday", "full_date", "location", "hotel", "hotel_note"):
+            _require(day, key, str, w)
+        try:
+            datetime.date.fromisoformat(_require(day, "iso_date", str, w))
+        except ValueError:
+            raise TripDataError(f"{w}.iso_date: not an ISO date") from None
+        coords = _require(day, "coords", dict, w)
+        _require(coords, "lat", (int, float), f"{w}.coords")
+        _require(coords, "lon", (int, float), f"{w}.coords")
+    for i, spot in enumerate(_require(data, "home_weather", list, where, optional=True) or []):
+        w = f"{where}.home_weather[{i}]"
+        if not isinstance(spot, dict):
+            raise TripDataError(f"{w}: expected an object")
+        _require(spot, "name", str, w)
+        if not 0 <= _require(spot, "day", int, w) < len(days):
+            raise TripDataError(f"{w}.day: out of range")
+    return data
+
+
+def validate_activities(data, where):
+    if not isinstance(data, dict):
+        raise TripDataError(f"{where}: expected an object")
+    acts = _require(data, "activities", list, where)
+    for i, act in enumerate(acts):
+        w = f"{where}.activities[{i}]"
+        if not isinstance(act, dict):
+            raise TripDataError(f"{w}: expected an object")
+        if not _TIME_RE.match(_require(act, "time", str, w)):
+            raise TripDataError(f"{w}.time: expected HH:MM")
+        _require(act, "text", str, w)
+        _require(act, "desc", str, w)
+        if _require(act, "type", str, w) not in ACTIVITY_TYPES:
+            raise TripDataError(f"{w}.type: must be one of {sorted(ACTIVITY_TYPES)}")
+        for key in ("guideText", "mapUrl", "contact", "stayTime"):
+            _require(act, key, str, w, optional=True)
+        for key in ("menu", "notes"):
+            items = _require(act, key, list, w, optional=True) or []
+            if not all(isinstance(x, str) for x in items):
+                raise TripDataError(f"{w}.{key}: expected a list of strings")
+        coords = _require(act, "coords", dict, w, optional=True)
+        if coords is not None:
+            _require(coords, "lat", (int, float), f"{w}.coords")
+            _require(coords, "lon", (int, float), f"{w}.coords")
+    return acts
+
+
+def validate_packing_template(data, where):
+    if not isinstance(data, dict):
+        raise TripDataError(f"{where}: expected an object")
+    _require(data, "title", str, where)
+    categories = _require(data, "categories", list, where)
+    for i, cat in enumerate(categories):
+        w = f"{where}.categories[{i}]"
+        if not isinstance(cat, dict):
+            raise TripDataError(f"{w}: expected an object")
+        _require(cat, "category", str, w)
+        if not all(isinstance(x, str) for x in _require(cat, "items", list, w)):
+            raise TripDataError(f"{w}.items: expected a list of strings")
+    return data
+
+
+# --- mtime 快取 ---
+
+_cache_lock = threading.Lock()
+_parsed = {}  # path -> (mtime_ns, size, value)
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _load(path, parse):
+    stamp = _stamp(path)
+    with _cache_lock:
+        hit = _parsed.get(path)
+    if hit and hit[:2] == stamp:
+        return hit[2], stamp
+    with open(path, encoding="utf-8") as f:
+        try:
+            value = parse(json.load(f))
+        except json.JSONDecodeError as e:
+            raise TripDataError(f"{path}: {e}") from None
+    with _cache_lock:
+        _parsed[path] = (*stamp, value)
+    return value, stamp
+
+
+class Trip:
+    """A trip directory: eagerly indexed, activities loaded per day on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        self.id = os.path.basename(os.path.normpath(path))
+        self.index, self._index_stamp = _load(os.path.join(path, "trip.json"),
+                                              lambda d: validate_index(d, os.path.join(path, "trip.json")))
+
+    @property
+    def days(self):
+        # 只有摘要，不含 activities
+        return self.index['days']
+
+    @property
+    def flight(self):
+        return self.index['flight']
+
+    @property
+    def home_weather(self):
+        """[(name, coords)] shown on the home page; defaults to the first two distinct places."""
+        spots = self.index.get('home_weather')
+        if spots:
+            return [(s['name'], self.days[s['day']]['coords']) for s in spots]
+        seen = {}
+        for day in self.days:
+            seen.setdefault((day['coords']['lat'], day['coords']['lon']), (day['location'], day['coords']))
+        return list(seen.values())[:2]
+
+    def _day_path(self, day_idx):
+        return os.path.join(self.path, "days", f"{self.days[day_idx]['id']}.json")
+
+    def activities(self, day_idx):
+        path = self._day_path(day_idx)
+        return _load(path, lambda d: validate_activities(d, path))[0]
+
+    def day(self, day_idx):
+        """The day summary merged with its activities (loads that day's file only)."""
+        return dict(self.days[day_idx], activities=self.activities(day_idx))
+
+    def day_version(self, day_idx):
+        # 索引或當天檔案任一改變，版本就不同 (給 HTML 片段快取當 key)
+        return (self.path, self._index_stamp, _stamp(self._day_path(day_idx)))
+
+    def version(self):
+        # 整個行程的版本 (搜尋索引等跨天的資料用)
+        return tuple(self.day_version(i) for i in range(len(self.days)))
+
+    def all_days(self):
+        return [self.day(i) for i in range(len(self.days))]
+
+
+def load_trip(path=TRIP_DIR):
+    return Trip(path)
+
+
+def trip_dir(trip_id):
+    """Directory for ?trip=<id>; raises TripDataError for unknown or malformed ids."""
+    if trip_id == DEFAULT_TRIP_ID:
+        return TRIP_DIR
+    if not _TRIP_ID_RE.match(trip_id):
+        raise TripDataError(f"unknown trip '{trip_id}'")
+    path = os.path.join(TRIPS_DIR, trip_id)
+    if not os.path.isfile(os.path.join(path, "trip.json")):
+        raise TripDataError(f"unknown trip '{trip_id}'")
+    return path
+
+
+def list_trips():
+    """Trip ids under TRIPS_DIR (plus the default trip), sorted."""
+    try:
+        names = os.listdir(TRIPS_DIR)
+    except FileNotFoundError:
+        names = []
+    ids = {n for n in names if _TRIP_ID_RE.match(n) and os.path.isfile(os.path.join(TRIPS_DIR, n, "trip.json"))}
+    return sorted(ids | {DEFAULT_TRIP_ID})
+
+
+def _template_path(name):
+    return os.path.join(PACKING_TEMPLATES_DIR, f"{name}.json")
+
+
+def packing_templates():
+    """{name: title} for every template file."""
+    try:
+        names = sorted(f[:-5] for f in os.listdir(PACKING_TEMPLATES_DIR) if f.endswith(".json"))
+    except FileNotFoundError:
+        return {}
+    return {name: load_packing_template(name)['title'] for name in names}
+
+
+def load_packing_template(name):
+    path = _template_path(name)
+    return _load(path, lambda d: validate_packing_template(d, path))[0]
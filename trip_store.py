@@ -0,0 +1,294 @@
+# 票券與行李清單的持久化儲存 (SQLite, WAL)
+# 兩支手機開同一個行程時看到的是同一份資料；每次變更只寫入變動的那一筆。
+# 行李清單另外在 process 內維護一份索引 (PackingIndex)，勾選 / 新增 / 刪除都是 O(1) 更新，
+# 進度也是累計的計數，不必每次 rerun 掃過整份清單。
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+TRIP_STORE_PATH = os.environ.get(
+    "TRIP_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "trip.sqlite3"))
+
+# 分行程之前的資料都存在這個 namespace，見 TripStore.adopt_legacy
+DEFAULT_TRIP = "default"
+# process 內最多保留幾個行程的行李索引 (LRU)；行程再多記憶體也不會跟著長
+PACKING_INDEX_LIMIT = 64
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    trip TEXT NOT NULL, key TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL,
+    PRIMARY KEY (trip, key)
+);
+CREATE TABLE IF NOT EXISTS packing_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, trip TEXT NOT NULL,
+    category TEXT NOT NULL, name TEXT NOT NULL, checked INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS packing_items_trip ON packing_items (trip, id);
+CREATE TABLE IF NOT EXISTS trip_meta (
+    trip TEXT NOT NULL, key TEXT NOT NULL, value TEXT,
+    PRIMARY KEY (trip, key)
+);
+"""
+
+
+class TripStore:
+    """Thread-safe handle to the SQLite file; one connection per thread.
+
+    Streamlit 每個 session 的 script 跑在自己的 thread，WAL 模式下讀寫互不阻塞。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._index_lock = threading.Lock()
+        self._packing = OrderedDict()  # trip -> PackingIndex (LRU)
+        self._adopted = False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def connect(self, immediate=False):
+        return _Transaction(self._conn(), immediate)
+
+    def adopt_legacy(self, trip):
+        """Move rows saved under the pre-multi-trip namespace to `trip` (once per process, no-op afterwards)."""
+        if self._adopted:
+            return
+        with self._index_lock, self.connect(immediate=True) as conn:
+            for table in ("tickets", "packing_items", "trip_meta"):
+                # 目標行程已有同 key 的資料時保留目標的
+                conn.execute(f"UPDATE OR IGNORE {table} SET trip = ? WHERE trip = ?", (trip, DEFAULT_TRIP))
+            self._packing.clear()
+            self._adopted = True
+
+    def tickets(self, trip=DEFAULT_TRIP):
+        return TicketRepo(self, trip)
+
+    def packing(self, trip=DEFAULT_TRIP):
+        return PackingRepo(self, trip)
+
+
+class _Transaction:
+    # `with store.connect() as conn:` 包成一個交易
+    # immediate=True 一開始就拿寫入鎖 (先讀後寫的交易在 WAL 下才不會 SQLITE_BUSY)
+    def __init__(self, conn, immediate=False):
+        self.conn = conn
+        self.immediate = immediate
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+class TicketRepo:
+    def __init__(self, store, trip):
+        self.store = store
+        self.trip = trip
+
+    def get(self, key, default=None):
+        with self.store.connect() as conn:
+            row = conn.execute("SELECT data FROM tickets WHERE trip = ? AND key = ?", (self.trip, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, key, ticket):
+        with self.store.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?)",
+                         (self.trip, key, json.dumps(ticket, ensure_ascii=False), time.time()))
+
+    def delete(self, key):
+        with self.store.connect() as conn:
+            conn.execute("DELETE FROM tickets WHERE trip = ? AND key = ?", (self.trip, key))
+
+
+class PackingIndex:
+    """One trip's packing list in memory: id -> item, category -> ordered ids, running counts.
+
+    rev 對應 trip_meta 的 packing_rev；每次寫入都會遞增，
+    對不上 (別的 process 寫過) 時 PackingRepo 才整份重讀。
+    """
+
+    def __init__(self, rev, rows):
+        self.rev = rev
+        self.items = {}
+        self.by_category = {}  # category -> {id: None}，dict 保持插入順序且刪除是 O(1)
+        self.category_checked = {}
+        self.total = 0
+        self.checked = 0
+        for row in rows:
+            self.add(*row)
+
+    def add(self, item_id, category, name, checked=False):
+        checked = bool(checked)
+        self.items[item_id] = {"id": item_id, "category": category, "name": name, "checked": checked}
+        self.by_category.setdefault(category, {})[item_id] = None
+        self.category_checked[category] = self.category_checked.get(category, 0) + checked
+        self.total += 1
+        self.checked += checked
+
+    def remove(self, item_id):
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return
+        category = item['category']
+        ids = self.by_category[category]
+        del ids[item_id]
+        self.category_checked[category] -= item['checked']
+        if not ids:
+            del self.by_category[category], self.category_checked[category]
+        self.total -= 1
+        self.checked -= item['checked']
+
+    def set_checked(self, item_id, checked):
+        item = self.items.get(item_id)
+        if item is None or item['checked'] == bool(checked):
+            return
+        delta = 1 if checked else -1
+        item['checked'] = bool(checked)
+        self.category_checked[item['category']] += delta
+        self.checked += delta
+
+    def remove_category(self, category):
+        for item_id in list(self.by_category.get(category, ())):
+            self.remove(item_id)
+
+    def names(self):
+        return {(item['category'], item['name']) for item in self.items.values()}
+
+
+class PackingRepo:
+    def __init__(self, store, trip):
+        self.store = store
+        self.trip = trip
+
+    # --- 索引維護 ---
+
+    def _rev(self, conn):
+        row = conn.execute("SELECT value FROM trip_meta WHERE trip = ? AND key = 'packing_rev'", (self.trip,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def _index(self, conn):
+        # 呼叫端需持有 store._index_lock
+        rev = self._rev(conn)
+        cache = self.store._packing
+        index = cache.get(self.trip)
+        if index is None or index.rev != rev:
+            rows = conn.execute("SELECT id, category, name, checked FROM packing_items WHERE trip = ? ORDER BY id",
+                                (self.trip,)).fetchall()
+            index = cache[self.trip] = PackingIndex(rev, rows)
+            if len(cache) > PACKING_INDEX_LIMIT:
+                cache.popitem(last=False)
+        cache.move_to_end(self.trip)
+        return index
+
+    def _read(self, build):
+        with self.store._index_lock, self.store.connect() as conn:
+            return build(self._index(conn))
+
+    def _write(self, change):
+        """Run change(conn, index) in one write transaction and bump packing_rev."""
+        with self.store._index_lock, self.store.connect(immediate=True) as conn:
+            index = self._index(conn)
+            rev = index.rev + 1
+            index.rev = -1  # 中途失敗時下次讀取會整份重讀
+            result = change(conn, index)
+            conn.execute("INSERT OR REPLACE INTO trip_meta VALUES (?, 'packing_rev', ?)", (self.trip, str(rev)))
+            index.rev = rev
+        return result
+
+    def _insert_many(self, conn, index, pairs):
+        first = conn.execute("SELECT COALESCE(MAX(id), 0) FROM packing_items").fetchone()[0]
+        conn.executemany("INSERT INTO packing_items (trip, category, name) VALUES (?, ?, ?)",
+                         [(self.trip, category, name) for category, name in pairs])
+        # 已持有寫入鎖，新的 id 一定都大於 first
+        for row in conn.execute("SELECT id, category, name, checked FROM packing_items WHERE trip = ? AND id > ? ORDER BY id",
+                                (self.trip, first)):
+            index.add(*row)
+        return len(pairs)
+
+    # --- 讀取 ---
+
+    def categories(self):
+        """[{"category", "checked", "items": [{"id", "name", "checked"}]}] in insertion order."""
+        def build(index):
+            return [{"category": category, "checked": index.category_checked[category],
+                     "items": [{"id": i, "name": index.items[i]['name'], "checked": index.items[i]['checked']} for i in ids]}
+                    for category, ids in index.by_category.items()]
+        return self._read(build)
+
+    def counts(self):
+        """(checked, total) without scanning the list."""
+        return self._read(lambda index: (index.checked, index.total))
+
+    # --- 寫入 ---
+
+    def seed(self, categories):
+        # 只在這個行程第一次使用時放入預設清單；之後全刪光也不會再長回來
+        with self.store._index_lock, self.store.connect() as conn:
+            if conn.execute("SELECT 1 FROM trip_meta WHERE trip = ? AND key = 'packing_seeded'", (self.trip,)).fetchone():
+                return
+
+        def change(conn, index):
+            if conn.execute("SELECT 1 FROM trip_meta WHERE trip = ? AND key = 'packing_seeded'", (self.trip,)).fetchone():
+                return
+            self._insert_many(conn, index, [(cat['category'], item) for cat in categories for item in cat['items']])
+            conn.execute("INSERT INTO trip_meta VALUES (?, 'packing_seeded', '1')", (self.trip,))
+        self._write(change)
+
+    def import_template(self, categories):
+        """Bulk-add a template's items in one transaction, skipping (category, name) pairs already on the list.
+
+        回傳實際新增的數量。
+        """
+        def change(conn, index):
+            seen = index.names()
+            pairs = []
+            for cat in categories:
+                for name in cat['items']:
+                    if (cat['category'], name) not in seen:
+                        seen.add((cat['category'], name))
+                        pairs.append((cat['category'], name))
+            return self._insert_many(conn, index, pairs) if pairs else 0
+        return self._write(change)
+
+    def add_item(self, category, name):
+        def change(conn, index):
+            item_id = conn.execute("INSERT INTO packing_items (trip, category, name) VALUES (?, ?, ?)",
+                                   (self.trip, category, name)).lastrowid
+            index.add(item_id, category, name)
+            return item_id
+        return self._write(change)
+
+    def set_checked(self, item_id, checked):
+        def change(conn, index):
+            conn.execute("UPDATE packing_items SET checked = ? WHERE trip = ? AND id = ?", (int(checked), self.trip, item_id))
+            index.set_checked(item_id, checked)
+        self._write(change)
+
+    def delete_item(self, item_id):
+        def change(conn, index):
+            conn.execute("DELETE FROM packing_items WHERE trip = ? AND id = ?", (self.trip, item_id))
+            index.remove(item_id)
+        self._write(change)
+
+    def delete_category(self, category):
+        def change(conn, index):
+            conn.execute("DELETE FROM packing_items WHERE trip = ? AND category = ?", (self.trip, category))
+            index.remove_category(category)
+        self._write(change)
+
+
+trip_store = TripStore(TRIP_STORE_PATH)